@@ -0,0 +1,79 @@
+"""
+Measure how long "import eztts" takes in a fresh interpreter.
+
+Each run starts a new Python process with -X importtime and reads the cumulative
+import time of the eztts package from its report. Heavy third party modules that
+end up loaded by the import are also listed, since adapters should only load them
+when they are used.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 50 --path /path/to/other/checkout
+
+Pass --path to measure another checkout (for example, an older release) and compare.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["requests", "urllib3", "gtts", "asyncio"]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = (
+    "import sys, eztts; "
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+
+def measure_once(path: str) -> tuple:
+    """
+    Import eztts in a new interpreter.
+    Returns the cumulative import time in microseconds and the heavy modules that were loaded.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = path + os.pathsep + env.get("PYTHONPATH", "")
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        # Run from the checkout, since the working directory comes first on sys.path
+        cwd=path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    import_time = None
+    for line in process.stderr.splitlines():
+        # Lines look like "import time:   self [us] | cumulative | imported package"
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == "eztts":
+            import_time = int(parts[1])
+    loaded = [module for module in process.stdout.strip().split(",") if module]
+    return import_time, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of eztts.")
+    parser.add_argument("--runs", type=int, default=20, help="How many fresh interpreters to measure.")
+    parser.add_argument("--path", default=REPO_ROOT, help="The checkout to import eztts from.")
+    args = parser.parse_args()
+
+    times = []
+    loaded = []
+    for _ in range(args.runs):
+        import_time, loaded = measure_once(args.path)
+        times.append(import_time)
+
+    print(f"eztts from {args.path}")
+    print(f"runs:   {args.runs}")
+    print(f"min:    {min(times) / 1000:.2f} ms")
+    print(f"median: {statistics.median(times) / 1000:.2f} ms")
+    print(f"max:    {max(times) / 1000:.2f} ms")
+    print(f"heavy modules loaded: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
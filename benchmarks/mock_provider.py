@@ -0,0 +1,230 @@
+"""
+A local stand-in for the TTS services used by the shipped adapters.
+
+MockProvider runs an HTTP server on localhost that answers like both providers:
+
+* fromtexttospeech.com (FTTSAdapter): a form POST to "/" returns an HTML page with a
+  <source src=...> tag, and a GET of that src returns the mp3 audio.
+* Google Translate TTS (GTTSAdapter): a POST to the batchexecute endpoint returns
+  the base64 encoded audio in the same framing as Google's endpoint.
+
+Every request waits for a configurable latency, and the audio is a configurable
+number of bytes of valid (silent) MPEG audio frames. With max_concurrent, requests
+over that many in flight are answered with 429 Too Many Requests.
+"""
+import base64
+import contextlib
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GTTS_PATH = "/_/TranslateWebserverUi/data/batchexecute"
+
+# An MPEG-1 Layer III frame header: 128 kbps, 44.1 kHz, no padding, joint stereo.
+# Frames at this bitrate and sample rate are 417 bytes long.
+_FRAME_HEADER = b"\xff\xfb\x90\x64"
+_FRAME_LENGTH = 417
+
+
+def ftts_page(audio_src: str, paragraphs: int=40, quote: str='"') -> bytes:
+    """
+    Build a page shaped like the one fromtexttospeech.com returns after a synthesis,
+    with paragraphs of filler before and after the audio player.
+    """
+    filler = "".join(f"<p>Paragraph {i} of the surrounding page.</p>\n" for i in range(paragraphs))
+    return (
+        "<!DOCTYPE html>\n<html><head><title>From Text To Speech</title></head><body>\n"
+        f"{filler}"
+        '<div id="player"><audio controls="controls">\n'
+        f'<source src={quote}{audio_src}{quote} type="audio/mpeg" />\n'
+        "</audio></div>\n"
+        f"{filler}"
+        "</body></html>\n"
+    ).encode("utf-8")
+
+
+def make_mp3(size: int) -> bytes:
+    """
+    Make at least size bytes of MPEG audio made of whole, silent frames.
+    """
+    frame = _FRAME_HEADER + bytes(_FRAME_LENGTH - len(_FRAME_HEADER))
+    frame_count = max(1, -(-size // _FRAME_LENGTH))
+    return frame * frame_count
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, so don't let Nagle's algorithm hold the body back
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+
+    def _send(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def do_POST(self):
+        self._read_body()
+        with self.server.provider.in_flight() as throttled:
+            if throttled:
+                self._send(429, "text/plain", b"too many requests")
+                return
+            self._answer_post()
+
+
+    def _answer_post(self):
+        self.server.provider.record_request()
+        time.sleep(self.server.provider.latency)
+
+        if self.path == "/":
+            page = ftts_page(f"/texttomp3/{uuid.uuid4().hex}.mp3")
+            self._send(200, "text/html; charset=UTF-8", page)
+        elif self.path.startswith(GTTS_PATH):
+            audio = base64.b64encode(self.server.provider.audio).decode("ascii")
+            body = f')]}}\'\n\n[["wrb.fr","jQ1olc","[\\"{audio}\\"]",null,null,null,"generic"]]\n'
+            self._send(200, "application/json; charset=utf-8", body.encode("ascii"))
+        else:
+            self._send(404, "text/plain", b"not found")
+
+
+    def do_GET(self):
+        with self.server.provider.in_flight() as throttled:
+            if throttled:
+                self._send(429, "text/plain", b"too many requests")
+                return
+            self._answer_get()
+
+
+    def _answer_get(self):
+        self.server.provider.record_request()
+        time.sleep(self.server.provider.latency)
+
+        if self.path.startswith("/texttomp3/"):
+            self._send(200, "audio/mpeg", self.server.provider.audio)
+        else:
+            self._send(404, "text/plain", b"not found")
+
+
+class _Server(ThreadingHTTPServer):
+    # Adapters open many connections at once, and the default backlog of 5 makes
+    # the extra ones wait a second for the connection to be retried
+    request_queue_size = 128
+
+
+class MockProvider:
+    """
+    A local HTTP server that mimics the TTS providers.
+
+    Use as a context manager. While it is running, point the adapters at it with
+    point_adapters_at(provider.url).
+    """
+
+    def __init__(self,
+                 latency: float=0.0,
+                 payload_size: int=16 * 1024,
+                 max_concurrent: int=None,
+                 host: str="127.0.0.1",
+                 port: int=0):
+        """
+        Args:
+        Optional:
+            latency: Seconds to wait before answering each request.
+            payload_size: Bytes of mp3 audio to return for each synthesis.
+            max_concurrent: Answer 429 Too Many Requests while more than this many
+                            requests are in flight, like a throttling provider. No limit if not passed.
+            host: The address to listen on.
+            port: The port to listen on. 0 picks a free port.
+        """
+        self.latency = latency
+        self.audio = make_mp3(payload_size)
+        self.max_concurrent = max_concurrent
+        self.requests = 0
+        self.throttled = 0
+        self._in_flight = 0
+        self._requests_lock = threading.Lock()
+
+        self._server = _Server((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.provider = self
+        self._thread = None
+
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+    def record_request(self) -> None:
+        with self._requests_lock:
+            self.requests += 1
+
+
+    @contextlib.contextmanager
+    def in_flight(self):
+        """
+        Count a request as in flight for the body, which is told whether to throttle it.
+        """
+        with self._requests_lock:
+            self._in_flight += 1
+            throttled = self.max_concurrent is not None and self._in_flight > self.max_concurrent
+            if throttled:
+                self.throttled += 1
+        try:
+            yield throttled
+        finally:
+            with self._requests_lock:
+                self._in_flight -= 1
+
+
+    def start(self) -> "MockProvider":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def point_adapters_at(url: str) -> None:
+    """
+    Send every shipped adapter's requests to url instead of the real providers,
+    and lift their client-side rate limits.
+    """
+    from eztts import set_rate_limit
+    from eztts.adapters.ftts import FTTSAdapter
+    FTTSAdapter.BASE_URL = url
+    # The client-side limits protect the real providers, and would only cap the benchmark here
+    set_rate_limit(FTTSAdapter)
+
+    try:
+        from eztts.adapters.gtts import GTTSAdapter
+    except ImportError:
+        return
+    # The mock answers for every top level domain
+    GTTSAdapter.BASE_URL = url
+    set_rate_limit(GTTSAdapter)
@@ -0,0 +1,71 @@
+"""
+Measure how quickly the audio location is found in fromtexttospeech.com response pages.
+
+Compares the old approach (decode the whole page to str and split it around the
+<source> tag) with eztts.adapters.ftts.parser, on sample pages of different sizes
+and quote styles. Pages are built by mock_provider.ftts_page, and have the same
+structure as the pages the site returns.
+
+Usage:
+    python benchmarks/parse_ftts.py
+    python benchmarks/parse_ftts.py --runs 20000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from eztts.adapters.ftts.parser import find_audio_src, scan_audio_src
+from mock_provider import ftts_page
+
+AUDIO_SRC = "/texttomp3/0123456789abcdef0123456789abcdef.mp3"
+
+# (description, page)
+SAMPLES = [
+    ("small page, double quotes", ftts_page(AUDIO_SRC, paragraphs=10)),
+    ("typical page, double quotes", ftts_page(AUDIO_SRC)),
+    ("typical page, single quotes", ftts_page(AUDIO_SRC, quote="'")),
+    ("large page, double quotes", ftts_page(AUDIO_SRC, paragraphs=1000)),
+]
+
+
+def split_src(content: bytes) -> str:
+    """
+    How FTTSAdapter used to find the audio location.
+    """
+    # requests decodes the page with the detected encoding on every access to .text
+    text = content.decode("utf-8")
+    try:
+        return text.split("<source src=\"")[1].split("\"")[0]
+    except IndexError:
+        return text.split("<source src='")[1].split("'")[0]
+
+
+def chunked(content: bytes, chunk_size: int=1024) -> list:
+    return [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure FTTS response parsing.")
+    parser.add_argument("--runs", type=int, default=5000, help="How many times to parse each page.")
+    args = parser.parse_args()
+
+    for description, page in SAMPLES:
+        chunks = chunked(page)
+        assert split_src(page) == find_audio_src(page) == scan_audio_src(chunks) == AUDIO_SRC
+
+        print(f"{description} ({len(page)} bytes)")
+        for name, function in (
+            ("split", lambda: split_src(page)),
+            ("find_audio_src", lambda: find_audio_src(page)),
+            ("scan_audio_src", lambda: scan_audio_src(chunks)),
+        ):
+            seconds = min(timeit.repeat(function, number=args.runs, repeat=3))
+            print(f"  {name:16}{seconds / args.runs * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Benchmark eztts against a local mock TTS provider.
+
+Starts a MockProvider, points the adapters at it, and drives one of the eztts entry
+points with a fixed number of requests. Reports latency percentiles, requests per
+second, peak resident memory and the mean time spent in each adapter phase, so
+numbers can be compared between releases without touching the real providers.
+
+Usage:
+    python benchmarks/run.py --scenario tts --requests 200 --concurrency 8
+    python benchmarks/run.py --scenario batch --adapter gtts --latency 0.05
+    python benchmarks/run.py --scenario all
+
+Scenarios:
+    tts          eztts.tts() called from a thread pool
+    batch        eztts.tts_many()
+    async        eztts.atts() gathered on one event loop
+    synthesizer  one eztts.Synthesizer shared by a thread pool
+    cli          python -m eztts, one process per request
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+import eztts
+from mock_provider import MockProvider, point_adapters_at
+
+SCENARIOS = ["tts", "batch", "async", "synthesizer", "cli"]
+
+VOICES = {
+    "ftts": "Alice",
+    "gtts": "Google",
+}
+
+CLI_CHILD = """
+import sys
+sys.path[:0] = [{repo_root!r}, {benchmarks_dir!r}]
+from mock_provider import point_adapters_at
+point_adapters_at(sys.argv[1])
+from eztts.__main__ import main
+sys.argv = ["eztts", "-q", "-v", sys.argv[2], "-t", sys.argv[3], "-f", sys.argv[4]]
+main()
+""".format(repo_root=REPO_ROOT, benchmarks_dir=BENCHMARKS_DIR)
+
+
+def get_adapter(name: str) -> type:
+    if name == "ftts":
+        from eztts.adapters.ftts import FTTSAdapter
+        return FTTSAdapter
+    from eztts.adapters.gtts import GTTSAdapter
+    return GTTSAdapter
+
+
+def timed(function, *args, **kwargs) -> float:
+    """
+    Call a function and return how long it took, in seconds.
+    """
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_tts(jobs: list, adapter: type, concurrency: int) -> list:
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(timed, eztts.tts, text, filename, specified_adapter=adapter) for text, filename in jobs]
+        return [future.result() for future in futures]
+
+
+def run_batch(jobs: list, adapter: type, concurrency: int) -> list:
+    results = eztts.tts_many(
+        [eztts.TTSJob(text, filename, specified_adapter=adapter) for text, filename in jobs],
+        max_workers=concurrency,
+    )
+    for result in results:
+        if not result.success:
+            raise result.error
+    return [result.elapsed for result in results]
+
+
+def run_async(jobs: list, adapter: type, concurrency: int) -> list:
+    async def run_one(semaphore, text, filename):
+        async with semaphore:
+            start = time.perf_counter()
+            await eztts.atts(text, filename, specified_adapter=adapter)
+            return time.perf_counter() - start
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*[run_one(semaphore, text, filename) for text, filename in jobs])
+
+    return list(asyncio.run(run_all()))
+
+
+def run_synthesizer(jobs: list, adapter: type, concurrency: int) -> list:
+    with eztts.Synthesizer(specified_adapter=adapter) as synthesizer, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(timed, synthesizer.synthesize, text, filename=filename) for text, filename in jobs]
+        return [future.result() for future in futures]
+
+
+def run_cli(jobs: list, adapter: type, concurrency: int, url: str, voice: str) -> list:
+    def run_one(text, filename):
+        return timed(subprocess.run, [sys.executable, "-c", CLI_CHILD, url, voice, text, filename], check=True)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_one, text, filename) for text, filename in jobs]
+        return [future.result() for future in futures]
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    Nearest-rank percentile.
+    """
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb(children: bool=False) -> float:
+    """
+    Peak resident memory of this process (or of its finished children), in megabytes.
+    """
+    if resource is None:
+        return float("nan")
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, and bytes on macOS
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def run_scenario(scenario: str, args, provider: MockProvider) -> None:
+    adapter = get_adapter(args.adapter)
+    sink = eztts.MetricsSink()
+    eztts.instrumentation.add_listener(sink)
+
+    with tempfile.TemporaryDirectory(prefix="eztts-bench-") as output_dir:
+        jobs = [(f"{args.text} Number {i}.", os.path.join(output_dir, f"{i}.mp3")) for i in range(args.requests)]
+
+        provider_requests = provider.requests
+        start = time.perf_counter()
+        if scenario == "tts":
+            latencies = run_tts(jobs, adapter, args.concurrency)
+        elif scenario == "batch":
+            latencies = run_batch(jobs, adapter, args.concurrency)
+        elif scenario == "async":
+            latencies = run_async(jobs, adapter, args.concurrency)
+        elif scenario == "synthesizer":
+            latencies = run_synthesizer(jobs, adapter, args.concurrency)
+        else:
+            latencies = run_cli(jobs, adapter, args.concurrency, provider.url, VOICES[args.adapter])
+        wall = time.perf_counter() - start
+        eztts.instrumentation.remove_listener(sink)
+
+        for _, filename in jobs:
+            if os.path.getsize(filename) < len(provider.audio):
+                raise RuntimeError(f"{filename} is incomplete")
+
+    print(f"scenario:          {scenario} ({args.adapter}, concurrency {args.concurrency})")
+    print(f"requests:          {len(latencies)} ({provider.requests - provider_requests} to the provider)")
+    print(f"wall time:         {wall:.3f} s")
+    print(f"requests / second: {len(latencies) / wall:.1f}")
+    print(f"latency p50:       {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"latency p95:       {percentile(latencies, 95) * 1000:.1f} ms")
+    print(f"latency p99:       {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"latency mean:      {statistics.mean(latencies) * 1000:.1f} ms")
+    print(f"peak RSS:          {peak_rss_mb(children=scenario == 'cli'):.1f} MB")
+    # Phases run in child processes for the CLI scenario, so there is nothing to show for it
+    for (_, phase), stats in sorted(sink.snapshot()["phases"].items()):
+        print(f"  {phase:17}{stats['seconds'] / stats['count'] * 1000:.2f} ms mean")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark eztts against a local mock TTS provider.")
+    parser.add_argument("--scenario", choices=SCENARIOS + ["all"], default="tts", help="The entry point to drive.")
+    parser.add_argument("--adapter", choices=sorted(VOICES), default="ftts", help="The adapter to benchmark.")
+    parser.add_argument("--requests", type=int, default=100, help="How many syntheses to run.")
+    parser.add_argument("--concurrency", type=int, default=8, help="How many syntheses to run at the same time.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the mock provider waits before each response.")
+    parser.add_argument("--payload-size", type=int, default=16 * 1024, help="Bytes of audio the mock provider returns.")
+    parser.add_argument("--text", default="The quick brown fox jumps over the lazy dog.", help="The text to synthesize.")
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS if args.scenario == "all" else [args.scenario]
+
+    with MockProvider(latency=args.latency, payload_size=args.payload_size) as provider:
+        point_adapters_at(provider.url)
+        for scenario in scenarios:
+            run_scenario(scenario, args, provider)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,39 @@
+import functools
+import io
+
 from .adapters import APIAdapter
 
 from .adapter_importer import valid_adapters, safe_import_all_adapters
+from .cache import DiskCache, MemoryCache
+from .coalescing import Coalescer
+from .instrumentation import instrumentation, configure_logging, MetricsSink, PhaseEvent, CounterEvent
+from .output import open_output, with_format
 
 safe_import_all_adapters()
 
+from .routing import select_adapter, get_routing_index, adapters_for_voice, adapters_for_language
+from .synthesis import synthesize, synthesize_to, synthesize_bytes, asynthesize
+from .chunking import split_text, needs_chunking, synthesize_chunked, synthesize_chunked_to, tts_stream
+from .normalization import normalize_text, strip_markup
+from .batch import tts_many, TTSJob, TTSResult
+from .synthesizer import Synthesizer, SynthesisResult
+from .ratelimit import set_rate_limit, reset_rate_limits, limits_for, TokenBucket, AdaptiveConcurrency
+from .failover import RoutingPolicy, HealthTracker, default_health, candidate_adapters, synthesize_with_policy
+from .audio import PostProcessor, concat_mp3, trim_silence, adjust_gain, loudness, convert_audio
+from .processing import synthesize_processed
+from .prefetch import Prefetcher
+
+
 def tts(text: str,
         filename: str,
         specified_adapter: APIAdapter=None,
         voice_name: str=None,
         speed: str=None,
         language: str=None,
-        debug: bool=False) -> None:
+        debug: bool=False,
+        cache: DiskCache=None,
+        policy: RoutingPolicy=None,
+        postprocess: PostProcessor=None) -> str:
     """
     Generate text to speech and save it to a file.
 
@@ -23,7 +46,18 @@ def tts(text: str,
         voice_name: The name of the voice to use. Uses default if not passed.
         speed: The speed to read the text. Uses default if not passed.
         language: The language of the text. Defaults to English US.
-        debug: Whether or not to print debug messages.
+        debug: Whether or not to log debug messages. Turns on debug logging for the "eztts" logger.
+        cache: A DiskCache or MemoryCache to reuse previously generated audio from.
+               On a hit, no request is made. A Coalescer shares the audio of identical
+               syntheses running at the same time, without caching it.
+        policy: A RoutingPolicy for failing over to, and hedging with, other adapters
+                that support the same language when the selected adapter fails or is slow.
+        postprocess: A PostProcessor to trim silence from, adjust the volume of, or convert
+                     the format of the audio, in memory, before it is saved.
+
+    Returns the filename the audio was saved to. That is filename, unless a policy with
+    any_format failed over to an adapter that makes another audio format, in which case
+    the extension is changed to that format, such as "hello.wav" for "hello.mp3".
 
     Specifying a voice name will automatically set the language and pick the adapter
     that has the voice. If multiple adapters have that voice, it will use the first one
@@ -36,70 +70,117 @@ def tts(text: str,
 
     Speed is independent of language and voice. If not specified, it will be set to the default.
     If the adapter does not support the selected speed, it will override to the default.
+
+    Text longer than the adapter's MAX_TEXT_LENGTH is split into chunks that are
+    generated concurrently and joined, in order, into the output file.
     """
+    if postprocess is not None:
+        _, audio = synthesize_processed(postprocess, text, specified_adapter, voice_name, speed, language, debug, cache, policy)
+        with open_output(filename) as f:
+            f.write(audio)
+        return filename
+
+    if policy is not None:
+        adapter, audio = synthesize_with_policy(policy, text, specified_adapter, voice_name, speed, language, debug, cache)
+        if adapter.AUDIO_FORMAT != select_adapter(specified_adapter, voice_name, language).AUDIO_FORMAT:
+            filename = with_format(filename, adapter.AUDIO_FORMAT)
+        with open_output(filename) as f:
+            f.write(audio)
+        return filename
+
+    adapter = select_adapter(specified_adapter, voice_name, language)
+    if needs_chunking(adapter, text):
+        synthesize_chunked(adapter, text, filename, voice_name, speed, language, debug, cache)
+    else:
+        synthesize(adapter, text, filename, voice_name, speed, language, debug, cache)
+    return filename
+
+
+def tts_to(text: str,
+           fileobj,
+           specified_adapter: APIAdapter=None,
+           voice_name: str=None,
+           speed: str=None,
+           language: str=None,
+           debug: bool=False,
+           cache: DiskCache=None,
+           policy: RoutingPolicy=None,
+           postprocess: PostProcessor=None) -> None:
+    """
+    Generate text to speech and write it into a writable binary file-like object,
+    such as an open file, a socket file, or io.BytesIO.
 
+    Takes the same arguments, and selects the adapter the same way, as the tts function,
+    except that fileobj takes the place of filename. Adapters that support it stream
+    the audio straight into fileobj, without going through a file on disk.
+    With a policy or a postprocess, the audio is buffered until it is complete.
+    """
+    if postprocess is not None:
+        _, audio = synthesize_processed(postprocess, text, specified_adapter, voice_name, speed, language, debug, cache, policy)
+        fileobj.write(audio)
+        return
+
+    if policy is not None:
+        _, audio = synthesize_with_policy(policy, text, specified_adapter, voice_name, speed, language, debug, cache)
+        fileobj.write(audio)
+        return
+
+    adapter = select_adapter(specified_adapter, voice_name, language)
+    if needs_chunking(adapter, text):
+        synthesize_chunked_to(adapter, text, fileobj, voice_name, speed, language, debug, cache)
+    else:
+        synthesize_to(adapter, text, fileobj, voice_name, speed, language, debug, cache)
+
+
+def tts_bytes(text: str,
+              specified_adapter: APIAdapter=None,
+              voice_name: str=None,
+              speed: str=None,
+              language: str=None,
+              debug: bool=False,
+              cache: DiskCache=None,
+              policy: RoutingPolicy=None,
+              postprocess: PostProcessor=None) -> bytes:
+    """
+    Generate text to speech and return the audio as bytes.
+    The audio is mp3, unless postprocess converts it to another format.
 
-    def _unsupported_adapter_error():
-        """Used to raise error of unsupported adapter."""
-        raise ValueError("Language and voice combination not supported by any adapters. This could mean an optional dependency is not installed.")
-
-
-    adapter = None
-
-    if specified_adapter is not None:
-        if not issubclass(specified_adapter, APIAdapter):
-            raise TypeError("Adapter must be an instance of APIAdapter")
-
-        temp_adapter = specified_adapter()
-        if voice_name is not None:
-            if not voice_name in temp_adapter:
-                raise ValueError("Specified voice name not found in specified adapter")
-        if language is not None:
-            if not language in temp_adapter:
-                raise ValueError("Specified language not found in specified adapter")
-
-        adapter = specified_adapter
-
-
-    elif voice_name is not None and language is not None:
-        # Loop through and see if there is a valid adapter for the language and voice
-        for i_adapter in valid_adapters:
-            # Instance temporary adapter so we can check if it has the voice
-            temp_adapter = i_adapter()
-            # If the adapter has the voice and language, use it
-            if voice_name in temp_adapter and \
-                    language in temp_adapter:
-                adapter = i_adapter
-                break
-        # If we didn't find a valid adapter, raise an error
-        if not adapter:
-            _unsupported_adapter_error()
-    
-    elif voice_name is not None:
-        for i_adapter in valid_adapters:
-            temp_adapter = i_adapter()
-            if voice_name in temp_adapter:
-                adapter = i_adapter
-                break
-        if not adapter:
-            _unsupported_adapter_error()
-
-    elif language is not None:
-        for i_adapter in valid_adapters:
-            temp_adapter = i_adapter()
-            if language in temp_adapter:
-                adapter = i_adapter
-                break
-        if not adapter:
-            _unsupported_adapter_error()
+    Takes the same arguments, and selects the adapter the same way, as the tts function,
+    except that there is no filename.
+    """
+    buffer = io.BytesIO()
+    tts_to(text, buffer, specified_adapter, voice_name, speed, language, debug, cache, policy, postprocess)
+    return buffer.getvalue()
+
+
+async def atts(text: str,
+               filename: str,
+               specified_adapter: APIAdapter=None,
+               voice_name: str=None,
+               speed: str=None,
+               language: str=None,
+               debug: bool=False,
+               cache: DiskCache=None,
+               policy: RoutingPolicy=None,
+               postprocess: PostProcessor=None) -> str:
+    """
+    Generate text to speech and save it to a file, without blocking the event loop.
 
-    else:
-        # If no adapter or language is specified, use the first adapter
-        adapter = valid_adapters[0]
+    Takes the same arguments, selects the adapter the same way, and returns the same
+    filename, as the tts function. Adapters without native async support are run in the
+    event loop's default executor.
+    """
+    # asyncio is only needed here, so it is not imported until it is used
+    import asyncio
 
+    if policy is not None or postprocess is not None:
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+            tts, text, filename, specified_adapter, voice_name, speed, language, debug, cache, policy, postprocess))
 
-    tts_adapter = adapter(debug)
-    tts_adapter.configure_voice(voice=voice_name, language=language, speed=speed)
-    tts_adapter.generate_tts(text)
-    tts_adapter.save_tts(filename)
-    tts_adapter.finish()
\ No newline at end of file
+    adapter = select_adapter(specified_adapter, voice_name, language)
+    if needs_chunking(adapter, text):
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+            synthesize_chunked, adapter, text, filename, voice_name, speed, language, debug, cache))
+    else:
+        await asynthesize(adapter, text, filename, voice_name, speed, language, debug, cache)
+    return filename
\ No newline at end of file
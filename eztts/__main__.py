@@ -1,12 +1,127 @@
 from . import tts
+from .instrumentation import configure_logging
 import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+
+PART_SUFFIX = ".part"
+
+
+def run_batch(args) -> int:
+    """
+    Synthesize every job in a manifest, and print a throughput summary.
+
+    Outputs are written to a temporary ".part" file and renamed when complete, so
+    an interrupted batch never leaves a truncated file behind for --resume to trust.
+    Returns the exit code: 0 if every job succeeded, 1 otherwise.
+    """
+    # Only the batch path needs these, so a single synthesis doesn't pay for importing them
+    from .batch import tts_many
+    from .manifest import is_complete_output, read_manifest
+
+    manifest_format = args.manifest_format
+    if args.manifest == "-":
+        batch = read_manifest(sys.stdin, args.output_dir, manifest_format)
+    else:
+        if manifest_format is None and args.manifest.endswith((".csv", ".jsonl", ".ndjson")):
+            manifest_format = "csv" if args.manifest.endswith(".csv") else "jsonl"
+        with open(args.manifest, newline="", encoding="utf-8") as f:
+            batch = read_manifest(f, args.output_dir, manifest_format)
+
+    if args.queue:
+        from .distributed import JobQueue
+        if args.resume:
+            batch = [job for job in batch if not is_complete_output(job.filename)]
+        for job in batch:
+            job.voice_name = job.voice_name or args.voice
+            job.speed = job.speed or args.speed
+            job.language = job.language or args.language
+        added = JobQueue(args.queue).add(batch)
+        print(f"Added {added} jobs to {args.queue}. Run 'eztts worker {args.queue}' on each machine to work through them.")
+        return 0
+
+    skipped = 0
+    if args.resume:
+        pending = [job for job in batch if not is_complete_output(job.filename)]
+        skipped = len(batch) - len(pending)
+        batch = pending
+
+    for job in batch:
+        # -v, -s and -l are the defaults for rows that don't set their own
+        job.voice_name = job.voice_name or args.voice
+        job.speed = job.speed or args.speed
+        job.language = job.language or args.language
+        os.makedirs(os.path.dirname(job.filename) or ".", exist_ok=True)
+        job.filename += PART_SUFFIX
+
+    finished = 0
+    lock = threading.Lock()
+
+    def on_result(result):
+        nonlocal finished
+        filename = result.job.filename[:-len(PART_SUFFIX)]
+        if result.success:
+            os.replace(result.job.filename, filename)
+        elif os.path.exists(result.job.filename):
+            os.remove(result.job.filename)
+        with lock:
+            finished += 1
+            if not args.quiet:
+                status = "done" if result.success else f"failed ({result.error})"
+                print(f"[{finished}/{len(batch)}] {filename} {status}", file=sys.stderr)
+
+    start = time.perf_counter()
+    if args.processes > 1:
+        from .distributed import tts_many_processes
+        results = tts_many_processes(batch, args.processes, args.jobs, normalize=args.normalize, on_result=on_result)
+    else:
+        results = tts_many(batch, max_workers=args.jobs, on_result=on_result, normalize=args.normalize)
+    elapsed = time.perf_counter() - start
+
+    failed = [result for result in results if not result.success]
+    succeeded = len(results) - len(failed)
+    rate = succeeded / elapsed if elapsed else 0.0
+    concurrency = args.jobs * max(1, args.processes)
+    print(f"Synthesized {succeeded} of {len(results)} jobs in {elapsed:.2f} s ({rate:.2f} jobs/s, {concurrency} at a time)")
+    if skipped:
+        print(f"Skipped {skipped} jobs that were already complete")
+    for result in failed:
+        print(f"Failed: {result.job.filename[:-len(PART_SUFFIX)]}: {result.error}")
+
+    return 1 if failed else 0
+
+
+def forward_to_daemon(args) -> bool:
+    """
+    Synthesize on a running eztts daemon, if there is one.
+    Returns False if no daemon is running, so the caller should synthesize locally.
+    """
+    from .client import Client
+    client = Client(timeout=1.0)
+    if not client.is_running():
+        return False
+    # Synthesis can take much longer than the check
+    client.timeout = None
+    client.synthesize_file(args.text, args.filename, args.voice, args.speed, args.language)
+    return True
 
-from .install_dependencies import install_dependencies
 
 def main():
     """
     Entry point for console_scripts
     """
+    if sys.argv[1:2] == ["serve"]:
+        # The daemon has its own arguments, and only it needs the server modules
+        from .server import main as serve
+        return serve(sys.argv[2:])
+    if sys.argv[1:2] == ["worker"]:
+        from .distributed import main as work
+        return work(sys.argv[2:])
+
     parser = argparse.ArgumentParser(description="Generate text to speech and save it to a file.")
     parser.add_argument("-t", "--text", help="The text to get TTS from.")
     parser.add_argument("-f", "--filename", help="The output mp3 file. Include '.mp3'")
@@ -14,15 +129,36 @@ def main():
     parser.add_argument("-s", "--speed", help="The speed to read the text. Uses default if not passed.")
     parser.add_argument("-l", "--language", help="The language of the text. Defaults to English US.")
     parser.add_argument("-q", "--quiet", help="If passed, do not display log messages.", action="store_true")
+    parser.add_argument("-m", "--manifest", help="A CSV or JSONL file of jobs to synthesize in one run. Pass '-' to read it from stdin.")
+    parser.add_argument("--manifest-format", help="The format of the manifest. Detected if not passed.", choices=["csv", "jsonl"])
+    parser.add_argument("-j", "--jobs", help="How many manifest jobs to synthesize at the same time.", type=int, default=4)
+    parser.add_argument("-o", "--output-dir", help="The directory manifest output filenames are relative to.", default=".")
+    parser.add_argument("--resume", help="If passed, skip manifest jobs whose output file is already complete.", action="store_true")
+    parser.add_argument("-p", "--processes", help="How many processes to shard manifest jobs across. Each runs --jobs at a time.", type=int, default=1)
+    parser.add_argument("--queue", help="Add the manifest's jobs to this shared job queue file for 'eztts worker' instead of running them.")
+    parser.add_argument("--normalize", help="If passed, normalize manifest text and synthesize each unique utterance once.", action="store_true")
+    parser.add_argument("--no-daemon", help="If passed, synthesize in this process even if an eztts daemon is running.", action="store_true")
     parser.add_argument("--install-optional-dependencies", help="If passed, install optional dependencies.", action="store_true")
     parser.add_argument("--branch", help="If passed, install optional dependencies from a specific git branch.", default="master")
 
     args = parser.parse_args()
 
+    # Log messages are shown unless --quiet is passed, in which case only warnings and errors are
+    configure_logging(logging.WARNING if args.quiet else logging.DEBUG)
+
     if (args.text and not args.filename) or (not args.text and args.filename):
         print("You must pass both text and filename or neither.")
         return
 
+    if args.manifest and args.text:
+        print("You can't pass both a manifest and text.")
+        return
+
+    if args.manifest:
+        # Per-request debug messages would drown out the progress lines, so batches only log warnings
+        configure_logging(logging.WARNING)
+        return run_batch(args)
+
     if args.text:
             
         # Get the text from the arguments.
@@ -37,7 +173,11 @@ def main():
         speed = args.speed
         language = args.language
         debug = not args.quiet
-        
+
+        # A running daemon (python -m eztts serve) already has warm adapters and caches, so hand the work to it
+        if not args.no_daemon and forward_to_daemon(args):
+            return
+
         # Call the tts function.
         tts(
             text=text,
@@ -49,8 +189,10 @@ def main():
         )
 
     if args.install_optional_dependencies:
+        # The installer needs requests, so only import it when it is asked for
+        from .install_dependencies import install_dependencies
         install_dependencies(args.branch)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -1,24 +1,42 @@
+import importlib
+import importlib.util
+
 from .adapter_manifest import ADAPTER_MANIFEST
 
 valid_adapters = []
 
-IMPORT_TEMPLATE = \
-"""
-try:
-    from {_from} import {_adapter}
-    valid_adapters.append({_adapter})
-except ImportError:
-    pass
-"""
 
-def dynamic_safe_adapter_import(_from: str, _adapter: str):
+def requirements_installed(requires: list) -> bool:
+    """
+    Check if every module in a list of top level module names can be imported,
+    without actually importing any of them.
+    """
+    for module_name in requires:
+        try:
+            if importlib.util.find_spec(module_name) is None:
+                return False
+        except ValueError:
+            return False
+    return True
+
+
+def dynamic_safe_adapter_import(_from: str, _adapter: str, requires: list=()):
     """
-    Dynamically import an adapter class into the module where this was called from.
+    Dynamically import an adapter class and add it to the list of valid adapters.
     Safe in this sense means it will not crash on a failed import. Instead, it will
     continue on with the programming, assuming that the dependencies just aren't
     installed for that adapter.
+
+    Adapters only import their heavy dependencies when they are used, so the
+    dependencies in requires are checked for without importing them.
     """
-    exec(IMPORT_TEMPLATE.format(_from=_from, _adapter=_adapter))
+    if not requirements_installed(requires):
+        return
+    try:
+        module = importlib.import_module(_from, package=__package__)
+    except ImportError:
+        return
+    valid_adapters.append(getattr(module, _adapter))
 
 
 def safe_import_all_adapters():
@@ -27,4 +45,4 @@ def safe_import_all_adapters():
     function.
     """
     for adapter_info in ADAPTER_MANIFEST.values():
-        dynamic_safe_adapter_import(adapter_info["import_location"], adapter_info["class_name"])
\ No newline at end of file
+        dynamic_safe_adapter_import(adapter_info["import_location"], adapter_info["class_name"], adapter_info.get("requires", ()))
@@ -3,10 +3,18 @@ ADAPTER_MANIFEST = {
         "import_location": ".adapters.ftts",
         "class_name": "FTTSAdapter",
         "remote_requirements_txt": False,
+        "requires": ["requests"],
     },
     "gtts": {
         "import_location": ".adapters.gtts",
         "class_name": "GTTSAdapter",
         "remote_requirements_txt": True,
+        "requires": ["gtts", "requests"],
+    },
+    "local": {
+        "import_location": ".adapters.local",
+        "class_name": "LocalAdapter",
+        "remote_requirements_txt": True,
+        "requires": ["pyttsx3"],
     },
 }
\ No newline at end of file
@@ -1,5 +1,61 @@
+import io
+import logging
+import os
+import shutil
+import tempfile
 import urllib.parse
 
+from eztts.instrumentation import configure_logging, instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class VoiceProfile:
+    """
+    A resolved voice configuration of an adapter class: the common voice, language and
+    speed names, the adapter specific names, and their URL encoded forms.
+
+    Profiles are built once per adapter class when the class is defined, and are
+    immutable, so every adapter instance configured the same way shares one profile.
+    """
+
+    __slots__ = ("selector", "voice", "language", "speed",
+                 "adapter_voice", "adapter_language", "adapter_speed",
+                 "encoded_voice", "encoded_language", "encoded_speed")
+
+    def __init__(self, selector: str, voice: str, language: str, speed: str, adapter_voice, adapter_language, adapter_speed):
+        """
+        Args:
+        Required:
+            selector: The voice or language name the profile is looked up by.
+            voice, language, speed: The common names.
+            adapter_voice, adapter_language, adapter_speed: The adapter specific names.
+        """
+        set_field = super().__setattr__
+        set_field("selector", selector)
+        set_field("voice", voice)
+        set_field("language", language)
+        set_field("speed", speed)
+        set_field("adapter_voice", adapter_voice)
+        set_field("adapter_language", adapter_language)
+        set_field("adapter_speed", adapter_speed)
+        set_field("encoded_voice", urllib.parse.quote(str(adapter_voice)))
+        set_field("encoded_language", urllib.parse.quote(str(adapter_language)))
+        set_field("encoded_speed", urllib.parse.quote(str(adapter_speed)))
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("VoiceProfile is immutable")
+
+
+    def __delattr__(self, name):
+        raise AttributeError("VoiceProfile is immutable")
+
+
+    def __repr__(self) -> str:
+        return f"VoiceProfile(voice={self.voice!r}, language={self.language!r}, speed={self.speed!r})"
+
+
 class APIAdapter:
     """
     An abstract class for TTS adapters.
@@ -23,36 +79,141 @@ class APIAdapter:
     #  value: adapter specific speed name
     SPEEDS = {}
 
+    # MAX_TEXT_LENGTH is the most characters the adapter can send in one request.
+    # Longer text is split into chunks by the tts function. None means no limit.
+    MAX_TEXT_LENGTH = None
+
+    # Client-side limits, shared by every user of the adapter in the process (see eztts.ratelimit).
+    #  RATE_LIMIT: the most syntheses to start per second. None means no limit.
+    #  RATE_BURST: how many syntheses may start at once after an idle period. None means RATE_LIMIT.
+    #  MAX_CONCURRENCY: the most syntheses at the same time. The limit is halved when the
+    #   provider throttles (HTTP 429), and grows back as requests succeed. None means no limit.
+    RATE_LIMIT = None
+    RATE_BURST = None
+    MAX_CONCURRENCY = None
+
+    # The format of the audio the adapter makes. Only mp3 audio is cached, post-processed,
+    # joined from chunks, or used in place of another adapter's audio when failing over.
+    AUDIO_FORMAT = "mp3"
+
     DEFAULT_VOICE = None
     DEFAULT_SPEED = None
 
+    # PROFILES structure, built from the dictionaries above by build_profiles:
+    #  key: voice name, or language name (which picks that language's default voice)
+    #  value: dict of common speed name to VoiceProfile
+    PROFILES = {}
+
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.build_profiles()
+
+
+    @classmethod
+    def build_profiles(cls) -> None:
+        """
+        Build the VoiceProfile of every voice, language and speed combination.
+        Called automatically when a subclass is defined. Call it again after changing
+        VOICES, LANGUAGES or SPEEDS at runtime.
+        """
+        profiles = {}
+        for voice, (language, adapter_voice) in cls.VOICES.items():
+            if language in cls.LANGUAGES:
+                profiles[voice] = cls._speed_profiles(voice, voice, language)
+        for language in cls.LANGUAGES:
+            voice = cls._default_voice_for(language)
+            if voice is not None:
+                profiles[language] = cls._speed_profiles(language, voice, language)
+        cls.PROFILES = profiles
+
+
+    @classmethod
+    def _speed_profiles(cls, selector: str, voice: str, language: str) -> dict:
+        adapter_voice = cls.VOICES[voice][1]
+        adapter_language = cls.LANGUAGES[language]
+        return {
+            speed: VoiceProfile(selector, voice, language, speed, adapter_voice, adapter_language, adapter_speed)
+            for speed, adapter_speed in cls.SPEEDS.items()
+        }
+
+
+    @classmethod
+    def _default_voice_for(cls, language: str) -> str:
+        """
+        Get the voice configuring a language picks: its first voice. A language with no voices
+        of its own (an alias, such as "English") picks the first voice of a language that is
+        the same to the adapter, and failing that, the default voice.
+        """
+        for voice, (voice_language, _) in cls.VOICES.items():
+            if voice_language == language:
+                return voice
+        adapter_language = cls.LANGUAGES[language]
+        for voice, (voice_language, _) in cls.VOICES.items():
+            if cls.LANGUAGES.get(voice_language) == adapter_language:
+                return voice
+        return cls.get_default_voice() if cls.VOICES else None
+
+
+    @classmethod
+    def get_profile(cls, voice: str=None, language: str=None, speed: str=None) -> VoiceProfile:
+        """
+        Get the shared VoiceProfile for a voice and/or language and speed, without creating an instance.
+
+        A voice sets the language too. A language alone picks its default voice. With neither,
+        the default voice is used. A missing or unsupported speed falls back to the default speed.
+        Raises a KeyError for an unknown voice or language.
+        """
+        if voice is None:
+            voice = language if language is not None else cls.get_default_voice()
+        profiles = cls.PROFILES[voice]
+        profile = profiles.get(speed)
+        if profile is None:
+            profile = profiles[cls.get_default_speed()]
+        return profile
+
+
     def __init__(self, debug: bool=False):
         """
         Initialize the adapter.
         Calls _setup() on subclass initialization.
         """
         self._debug = debug
+        if self._debug:
+            configure_logging(logging.DEBUG)
 
+        with instrumentation.phase("init", self):
+            logger.debug("Initializing adapter for %s...", type(self).__name__)
 
-        if self._debug:
-            print(f"Initializing adapter for {type(self).__name__}...")
+            logger.debug("Configuring default voice...")
 
-        if self._debug:
-            print("Configuring default voice...")
+            # Set _language, _voice, and _speed to default values
+            self.configure_voice(voice=self.get_default_voice(), speed=self.get_default_speed())
+            self._setup()
 
-        # Set _language, _voice, and _speed to default values (the first option in each dictionary)
-        # If adapter hasn't set them, it will guess the defaults
-        voice = self.DEFAULT_VOICE
-        speed = self.DEFAULT_SPEED
-        if voice is None:
-            voice = list(self.VOICES.keys())[0]
-        if speed is None:
-            speed = list(self.SPEEDS.keys())[0]
-        self.configure_voice(voice=voice, speed=speed)
-        self._setup()
+            logger.debug("Adapter initialized.")
 
-        if self._debug:
-            print("Adapter initialized.")
+
+    @classmethod
+    def get_default_voice(cls) -> str:
+        """
+        Get the common name of the default voice.
+        If the adapter hasn't set DEFAULT_VOICE, the first voice is the default.
+        """
+        if cls.DEFAULT_VOICE is not None:
+            return cls.DEFAULT_VOICE
+        return next(iter(cls.VOICES))
+
+
+    @classmethod
+    def get_default_speed(cls) -> str:
+        """
+        Get the common name of the default speed.
+        If the adapter hasn't set DEFAULT_SPEED, the first speed is the default.
+        """
+        if cls.DEFAULT_SPEED is not None:
+            return cls.DEFAULT_SPEED
+        return next(iter(cls.SPEEDS))
 
 
     def _setup(self):
@@ -81,47 +242,62 @@ class APIAdapter:
 
         All three values take their common name as argument, not the adapter specific name.
         """
-        if self._debug:
-            print("Configuring voice...")
-    
-        if language is not None:
-            self._language = language
-            for key, value in self.VOICES.items():
-                if language == value[0]:
-                    self._voice = key
-                    break
-        if voice is not None:
-            self._voice = voice
-            self._language = self.VOICES[self._voice][0]
-        if speed is not None:
-            self._speed = speed
+        with instrumentation.phase("configure_voice", self):
+            # Unset values keep what is currently configured
+            if voice is None:
+                voice = language if language is not None else self._profile.selector
+            if speed is None:
+                speed = self._profile.speed
+            self._profile = self.get_profile(voice, speed=speed)
 
+            logger.debug("Voice configured to %s in %s at %s speed.", self._profile.voice, self._profile.language, self._profile.speed)
 
-        if self._debug:
-            print(f"Voice configured to {self._voice} in {self._language} at {self._speed} speed.")
-            print("Saving adapter specific voice, language, and speed...")
 
-        self._adapter_specific_voice = self.VOICES[self._voice][1]
-        try:
-            self._adapter_specific_speed = self.SPEEDS[self._speed]
-        except KeyError:
-            if self.DEFAULT_SPEED is not None:
-                self._speed = self.DEFAULT_SPEED
-            else:
-                self._speed = list(self.SPEEDS.keys())[0]
-            self._adapter_specific_speed = self.SPEEDS[self._speed]
-        self._adapter_specific_language = self.LANGUAGES[self._language]
+    # The configured voice, as common names, adapter specific names, and URL encoded adapter specific names
 
+    @property
+    def _voice(self) -> str:
+        return self._profile.voice
 
-        if self._debug:
-            print("Encoding adapter specific voice, language, and speed...")
 
-        self._encoded_voice = self._url_encode(self._adapter_specific_voice)
-        self._encoded_speed = self._url_encode(self._adapter_specific_speed)
-        self._encoded_language = self._url_encode(self._adapter_specific_language)
+    @property
+    def _language(self) -> str:
+        return self._profile.language
 
-        if self._debug:
-            print("Finished configuring voice.")
+
+    @property
+    def _speed(self) -> str:
+        return self._profile.speed
+
+
+    @property
+    def _adapter_specific_voice(self):
+        return self._profile.adapter_voice
+
+
+    @property
+    def _adapter_specific_language(self):
+        return self._profile.adapter_language
+
+
+    @property
+    def _adapter_specific_speed(self):
+        return self._profile.adapter_speed
+
+
+    @property
+    def _encoded_voice(self) -> str:
+        return self._profile.encoded_voice
+
+
+    @property
+    def _encoded_language(self) -> str:
+        return self._profile.encoded_language
+
+
+    @property
+    def _encoded_speed(self) -> str:
+        return self._profile.encoded_speed
 
     
     def finish(self):
@@ -130,14 +306,13 @@ class APIAdapter:
         Implement this method in adapter implementations, 
         and call this method in adapter implementations.
         """
-        if self._debug:
-            print("Cleaning up after adapter...")
+        with instrumentation.phase("finish", self):
+            logger.debug("Cleaning up after adapter...")
 
-        
-        self._take_down()
 
-        if self._debug:
-            print("Finished cleaning up.")
+            self._take_down()
+
+            logger.debug("Finished cleaning up.")
 
     
     def generate_tts(self, text: str) -> None:
@@ -155,6 +330,51 @@ class APIAdapter:
         """
         raise NotImplementedError("save_tts() not implemented")
 
+
+    def save_tts_to(self, fileobj) -> None:
+        """
+        Write TTS to a writable binary file-like object, such as an open file or io.BytesIO.
+        Implement this method in adapter implementations that can stream audio directly.
+        By default, the TTS is saved to a temporary file with save_tts and copied into fileobj.
+        """
+        fd, temp_path = tempfile.mkstemp(suffix=".mp3")
+        os.close(fd)
+        try:
+            self.save_tts(temp_path)
+            with open(temp_path, "rb") as f:
+                shutil.copyfileobj(f, fileobj)
+        finally:
+            os.remove(temp_path)
+
+
+    def get_tts_bytes(self) -> bytes:
+        """
+        Get the generated TTS audio as bytes.
+        """
+        buffer = io.BytesIO()
+        self.save_tts_to(buffer)
+        return buffer.getvalue()
+
+
+    async def agenerate_tts(self, text: str) -> None:
+        """
+        Generate TTS without blocking the event loop.
+        Adapters with native async support can override this method.
+        By default, generate_tts is run in the event loop's default executor.
+        """
+        import asyncio
+        await asyncio.get_running_loop().run_in_executor(None, self.generate_tts, text)
+
+
+    async def asave_tts(self, filename: str) -> None:
+        """
+        Save TTS to file without blocking the event loop.
+        Adapters with native async support can override this method.
+        By default, save_tts is run in the event loop's default executor.
+        """
+        import asyncio
+        await asyncio.get_running_loop().run_in_executor(None, self.save_tts, filename)
+
     
     def get_supported_languages(self) -> list:
         """
@@ -190,15 +410,24 @@ class APIAdapter:
         return urllib.parse.quote(text)
 
 
-    def __contains__(self, item: str) -> bool:
+    @classmethod
+    def supports(cls, item: str) -> bool:
         """
-        Check if a voice/language/speed is included with the adapter.
+        Check if a voice/language/speed is included with the adapter, without creating an instance.
         All categories are checked because there shouldn't be overlap.
         """
-        if item in self.VOICES.keys():
+        if item in cls.VOICES:
             return True
-        if item in self.LANGUAGES.keys():
+        if item in cls.LANGUAGES:
             return True
-        if item in self.SPEEDS.keys():
+        if item in cls.SPEEDS:
             return True
-        return False
\ No newline at end of file
+        return False
+
+
+    def __contains__(self, item: str) -> bool:
+        """
+        Check if a voice/language/speed is included with the adapter.
+        All categories are checked because there shouldn't be overlap.
+        """
+        return self.supports(item)
\ No newline at end of file
@@ -1,5 +1,13 @@
+import atexit
+import logging
+
 from eztts.adapters import APIAdapter
-import requests
+from eztts.adapters.ftts.parser import scan_audio_src
+from eztts.http_session import SharedSession
+from eztts.instrumentation import instrumentation
+
+logger = logging.getLogger(__name__)
+
 
 class FTTSAdapter(APIAdapter):
     """
@@ -56,10 +64,70 @@ class FTTSAdapter(APIAdapter):
         "very fast": 2,
     }
 
+    # Long text is split into chunks of at most this many characters.
+    # This keeps requests well under the site's form limit, and lets chunks be generated concurrently.
+    MAX_TEXT_LENGTH = 1000
+
+    # fromtexttospeech.com is a small free site, so stay well under the rate that gets us throttled.
+    # Each synthesis is two requests: the form post, and the audio download.
+    RATE_LIMIT = 4
+    RATE_BURST = 8
+    MAX_CONCURRENCY = 4
+
 
     DEFAULT_SPEED = "medium"
     DEFAULT_VOICE = "Alice"
 
+    # Where the site is hosted. Can be pointed somewhere else, such as a local stand-in for benchmarks.
+    BASE_URL = "http://www.fromtexttospeech.com"
+
+    # The HTTP session shared by every FTTSAdapter instance in the process.
+    # Change pool size and retry policy with FTTSAdapter.SESSION.configure(...).
+    SESSION = SharedSession(pool_size=10, max_retries=3, backoff_factor=0.5)
+
+    # How many bytes of audio to read from the download at a time.
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+    # How many bytes of the response page to read at a time while looking for the audio location.
+    PAGE_CHUNK_SIZE = 1024
+
+
+    def _setup(self):
+        """
+        Use the shared session unless a session is given with use_session.
+        """
+        self._session = self.SESSION.get()
+        self._owns_session = False
+        self.__response = None
+
+
+    def _take_down(self):
+        """
+        Close the session if this adapter owns it.
+        The shared session stays open for other adapters, and is closed at exit.
+        """
+        if self.__response is not None:
+            # TTS was generated but never saved
+            self.__response.close()
+            self.__response = None
+        if self._owns_session:
+            self._session.close()
+            self._owns_session = False
+
+
+    def use_session(self, session: "requests.Session", close_on_finish: bool=False) -> None:
+        """
+        Use a specific requests.Session instead of the shared one.
+
+        Args:
+        Required:
+            session: The session to send requests with.
+        Optional:
+            close_on_finish: Whether this adapter owns the session, and should close it when finished.
+        """
+        self._session = session
+        self._owns_session = close_on_finish
+
     
     def generate_tts(self, text: str) -> None:
         """
@@ -75,8 +143,7 @@ class FTTSAdapter(APIAdapter):
         # This data is also automatically encoded to support url encoding.
 
 
-        if self._debug:
-            print("Encoding request data...")
+        logger.debug("Encoding request data...")
 
 
         # Encode the text
@@ -96,8 +163,7 @@ class FTTSAdapter(APIAdapter):
         payload = payload.replace(" ", "")
 
 
-        if self._debug:
-            print("Setting up headers...")
+        logger.debug("Setting up headers...")
 
         # The payload is now ready. Set up our headers for the request.
         # I don't know  much about headers. These were all just grabbed from inspect element in Chrome, and Insomnia.
@@ -107,57 +173,71 @@ class FTTSAdapter(APIAdapter):
             "Cache-Control": "max-age=0",
             "Connection": "keep-alive",
             "Content-Type": "application/x-www-form-urlencoded",
-            "Origin": "http://www.fromtexttospeech.com",
-            "Referer": "http://www.fromtexttospeech.com/",
+            "Origin": self.BASE_URL,
+            "Referer": self.BASE_URL + "/",
             "Upgrade-Insecure-Requests": "1",
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0.0.0 Safari/537.36"
         }
 
-        url = "http://www.fromtexttospeech.com/"
+        url = self.BASE_URL + "/"
 
 
-        if self._debug:
-            # print("Logging payload...")
-            # with open("payload.txt", "w") as f:
-            #     f.write(payload)
-            print("Sending request...")
+        logger.debug("Sending request...")
 
-        # Now make the request
-        self.__response = requests.request("POST", url, data=payload, headers=headers)
+        # Now make the request.
+        # The page is streamed, so the audio location can be found as soon as it arrives.
+        self.__response = self._session.request("POST", url, data=payload, headers=headers, stream=True)
+        instrumentation.count("requests", self)
+        # Raise on errors such as 429 Too Many Requests, instead of failing to find the audio in an error page
+        self.__response.raise_for_status()
 
-        if self._debug:
-            print("Response received.")
+        logger.debug("Response received.")
 
 
     def save_tts(self, filename: str) -> None:
         """
         Save TTS to file.
         """
-        if self._debug:
-            print("Saving TTS to file...")
-            print("Getting audio location...")
+        logger.debug("Saving TTS to file...")
 
-        # In the response.text, find the source tag with the mp3 audio
+        with open(filename, "wb") as f:
+            self.save_tts_to(f)
+
+
+    def save_tts_to(self, fileobj) -> None:
+        """
+        Stream TTS into a writable binary file-like object.
+        """
+        logger.debug("Getting audio location...")
+
+        if self.__response is None:
+            raise RuntimeError("There is no generated TTS to save. Call generate_tts first.")
+        response, self.__response = self.__response, None
         try:
-            audio_src = self.__response.text.split("<source src=\"")[1].split("\"")[0]
-        # If it is an index error, this is probably because src= uses single quotes instead of double quotes
-        except IndexError:
-            audio_src = self.__response.text.split("<source src='")[1].split("'")[0]
+            # Find the source tag with the mp3 audio without waiting for, or decoding, the rest of the page
+            audio_src = scan_audio_src(response.iter_content(chunk_size=self.PAGE_CHUNK_SIZE))
 
 
-        if self._debug:
-            print("Downloading audio...")
+            logger.debug("Downloading audio...")
 
-        # Use requests to get the audio at the src url, which is a local url on the server
-        audio_response = requests.get("http://www.fromtexttospeech.com" + audio_src)
+            # Use the session to get the audio at the src url, which is a local url on the server.
+            # Stream it, so the whole clip never has to be held in memory.
+            with self._session.get(self.BASE_URL + audio_src, stream=True) as audio_response:
+                audio_response.raise_for_status()
+                downloaded = 0
+                for block in audio_response.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                    fileobj.write(block)
+                    downloaded += len(block)
+            instrumentation.count("requests", self)
+            instrumentation.count("bytes_downloaded", self, downloaded)
 
+            # Read the rest of the page, so its connection can go back to the pool for reuse
+            for _ in response.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                pass
+        finally:
+            response.close()
 
-        if self._debug:
-            print("Writing audio to file...")
+        logger.debug("Audio saved.")
 
-        # Save audio to a file as mp3
-        with open(filename, "wb") as f:
-            f.write(audio_response.content)
 
-        if self._debug:
-            print("Audio saved.")
\ No newline at end of file
+atexit.register(FTTSAdapter.SESSION.close)
\ No newline at end of file
@@ -0,0 +1,60 @@
+import html
+import re
+
+
+# The src attribute of the <source> tag that holds the mp3 audio, in either quote style.
+# Other attributes may come before src, and tag and attribute names may be in any case.
+_SOURCE_SRC = re.compile(rb"""<source\b[^>]*?\bsrc\s*=\s*(["'])(.*?)\1""", re.IGNORECASE | re.DOTALL)
+
+# The longest <source> tag to expect. A tag split across chunks is found as long as it is shorter than this.
+_MAX_TAG_LENGTH = 4096
+
+
+def _decode_src(match) -> str:
+    return html.unescape(match.group(2).decode("utf-8", errors="replace")).strip()
+
+
+def _missing_source_error(content) -> RuntimeError:
+    preview = bytes(content[:200]).decode("utf-8", errors="replace")
+    return RuntimeError("No <source src=...> tag was found in the fromtexttospeech.com response, "
+                        f"so the audio can't be located. The response started with: {preview!r}")
+
+
+def find_audio_src(content: bytes) -> str:
+    """
+    Find the audio location in a fromtexttospeech.com response page.
+
+    Args:
+    Required:
+        content: The raw bytes of the page.
+
+    Returns the src of the first <source> tag, with HTML entities decoded.
+    Raises a RuntimeError if the page has no <source> tag with a src.
+    """
+    match = _SOURCE_SRC.search(content)
+    if match is None:
+        raise _missing_source_error(content)
+    return _decode_src(match)
+
+
+def scan_audio_src(chunks) -> str:
+    """
+    Same as find_audio_src, but takes the page as an iterable of byte chunks, such as
+    a streamed response's iter_content, and returns as soon as the tag has arrived.
+    The rest of the chunks are left unread.
+    """
+    buffer = bytearray()
+    # The start of the page, for the error message
+    head = b""
+    for chunk in chunks:
+        if len(head) < 200:
+            head += chunk[:200 - len(head)]
+        buffer += chunk
+        match = _SOURCE_SRC.search(buffer)
+        if match is not None:
+            return _decode_src(match)
+        # A tag that has only partly arrived starts at the last "<", so only keep from there on.
+        # Give up on a "<" that has gone on for longer than any tag could.
+        keep_from = max(buffer.rfind(b"<"), len(buffer) - _MAX_TAG_LENGTH, 0)
+        del buffer[:keep_from]
+    raise _missing_source_error(head)
@@ -1,9 +1,22 @@
+import itertools
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 from eztts.adapters import APIAdapter
-from gtts import gTTS
+from eztts.adapters.gtts.rpc import RPC_PATH, package_rpc, parse_audio, split_segments
+from eztts.http_session import SharedSession
+from eztts.instrumentation import instrumentation
+
+logger = logging.getLogger(__name__)
+
+_executor_lock = threading.Lock()
+
 
 class GTTSAdapter(APIAdapter):
     """
-    An adapter for the Google Text-to-Speech API, which depends on the gTTS library.
+    An adapter for the Google Text-to-Speech API, which depends on the gTTS library for splitting text.
     """
 
     # LANGUAGES structure:
@@ -71,41 +84,174 @@ class GTTSAdapter(APIAdapter):
         "medium": False,
     }
 
+    # Long text is split into segments of about 100 characters, which are fetched concurrently.
+    MAX_TEXT_LENGTH = None
+
+    # Google answers with 429 Too Many Requests when it is hit too hard.
+    # Each segment is its own request, so long text uses several requests.
+    RATE_LIMIT = 8
+    RATE_BURST = 16
+    MAX_CONCURRENCY = 8
+
 
     DEFAULT_SPEED = "medium"
     DEFAULT_VOICE = "Google"
 
+    # Where Google Translate is hosted. {tld} is replaced with the top level domain of the language.
+    # Can be pointed somewhere else, such as a local stand-in for benchmarks.
+    BASE_URL = "https://translate.google.{tld}"
+
+    # The HTTP session shared by every GTTSAdapter instance in the process.
+    # Change pool size and retry policy with GTTSAdapter.SESSION.configure(...).
+    SESSION = SharedSession(pool_size=16, max_retries=3, backoff_factor=0.5)
+
+    # How many segments of one text to fetch at the same time.
+    # Set it on the class, or on a single adapter instance. 1 fetches them one after another.
+    SEGMENT_CONCURRENCY = 4
+
+    # The threads segments are fetched on, shared by every GTTSAdapter instance in the process.
+    # Created the first time it is needed, by _get_executor.
+    _executor = None
+    _executor_size = None
+
+    HEADERS = {
+        "Referer": "http://translate.google.com/",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/47.0.2526.106 Safari/537.36",
+        "Content-Type": "application/x-www-form-urlencoded;charset=utf-8",
+    }
+
+
+    def _setup(self):
+        """
+        Use the shared session unless a session is given with use_session.
+        """
+        self._session = self.SESSION.get()
+        self._owns_session = False
+        self.__url = None
+        self.__bodies = None
+
+
+    def _take_down(self):
+        """
+        Close the session if this adapter owns it.
+        The shared session stays open for other adapters, and is closed at exit.
+        """
+        if self._owns_session:
+            self._session.close()
+            self._owns_session = False
+
+
+    def use_session(self, session: "requests.Session", close_on_finish: bool=False) -> None:
+        """
+        Use a specific requests.Session instead of the shared one.
+
+        Args:
+        Required:
+            session: The session to send requests with.
+        Optional:
+            close_on_finish: Whether this adapter owns the session, and should close it when finished.
+        """
+        self._session = session
+        self._owns_session = close_on_finish
+
 
     def generate_tts(self, text: str) -> None:
         """
         Generate TTS.
         """
-        # Voice doesn't matter for gTTS.
-        # Separate self._adapter_specific_language by the "|" character.
-        # The first part goes in the lang parameter.
-        # The second part goes in the tld parameter.
-        # The slow parameter is set to the value of self._adapter_specific_speed.
-        if self._debug:
-            print("Generating TTS...")
-            print("Preparing voice data...")
-        tld = self._adapter_specific_language.split("|")[1]
-        lang = self._adapter_specific_language.split("|")[0]
+        # Voice doesn't matter for Google.
+        # self._adapter_specific_language is "{language code}|{top level domain}".
+        # self._adapter_specific_speed is whether to read slowly.
+        logger.debug("Generating TTS...")
+        lang, tld = self._adapter_specific_language.split("|")
         slow = self._adapter_specific_speed
 
-        if self._debug:
-            print("Generating TTS...")
-        self.__tts = gTTS(text=text, tld=tld, lang=lang, slow=slow)
+        logger.debug("Splitting text into segments...")
+        segments = split_segments(text)
+        if not segments:
+            raise ValueError("There is no text to read")
+
+        self.__url = self.BASE_URL.format(tld=tld) + RPC_PATH
+        self.__bodies = [package_rpc(segment, lang, slow) for segment in segments]
+
+        logger.debug("TTS generated in %d segments.", len(segments))
 
-        if self._debug:
-            print("TTS generated.")
 
     def save_tts(self, filename: str) -> None:
         """
         Save TTS to file.
         """
-        if self._debug:
-            print("Saving TTS to file: " + filename)
-        self.__tts.save(filename)
+        logger.debug("Saving TTS to file: %s", filename)
+
+        with open(filename, "wb") as f:
+            self.save_tts_to(f)
+
+        logger.debug("TTS saved.")
+
+
+    def save_tts_to(self, fileobj) -> None:
+        """
+        Write TTS into a writable binary file-like object.
+        Segments are fetched concurrently, and each is written as soon as it and every segment before it have arrived.
+        """
+        logger.debug("Writing TTS to file object...")
+        if self.__bodies is None:
+            raise RuntimeError("There is no generated TTS to save. Call generate_tts first.")
+
+        for audio in self._fetch_segments(self.__bodies):
+            fileobj.write(audio)
+
+
+    @classmethod
+    def _get_executor(cls) -> ThreadPoolExecutor:
+        """
+        Get the shared executor, creating it the first time.
+
+        It has enough threads for every text that can be read at the same time (MAX_CONCURRENCY)
+        to fetch SEGMENT_CONCURRENCY segments, as set on the class. Threads are only started
+        when they are needed. If either setting changes, a new executor is created, and the old
+        one's threads exit once the fetches already running on it are done.
+        """
+        size = max(1, cls.SEGMENT_CONCURRENCY) * (cls.MAX_CONCURRENCY or 1)
+        with _executor_lock:
+            if GTTSAdapter._executor is None or GTTSAdapter._executor_size != size:
+                GTTSAdapter._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="eztts-gtts")
+                GTTSAdapter._executor_size = size
+            return GTTSAdapter._executor
+
+
+    def _fetch_segments(self, bodies: list):
+        """
+        Fetch the audio of every segment, and yield it in order.
+        At most SEGMENT_CONCURRENCY segments are fetched at a time, on the shared executor.
+        """
+        workers = min(self.SEGMENT_CONCURRENCY, len(bodies))
+        if workers <= 1:
+            for body in bodies:
+                yield self._fetch_segment(body)
+            return
+
+        executor = self._get_executor()
+        remaining = iter(bodies)
+        futures = deque(executor.submit(self._fetch_segment, body) for body in itertools.islice(remaining, workers))
+        try:
+            while futures:
+                audio = futures.popleft().result()
+                # Start the next segment as soon as one is done, so workers segments are always in flight
+                for body in itertools.islice(remaining, 1):
+                    futures.append(executor.submit(self._fetch_segment, body))
+                yield audio
+        finally:
+            # If a segment failed, don't fetch the ones after it
+            for future in futures:
+                future.cancel()
+
 
-        if self._debug:
-            print("TTS saved.")
\ No newline at end of file
+    def _fetch_segment(self, body: str) -> bytes:
+        response = self._session.post(self.__url, data=body, headers=self.HEADERS)
+        instrumentation.count("requests", self)
+        # Raise on errors such as 429 Too Many Requests, so the rate limiter sees them
+        response.raise_for_status()
+        audio = parse_audio(response.content)
+        instrumentation.count("bytes_downloaded", self, len(audio))
+        return audio
@@ -0,0 +1,120 @@
+import base64
+import json
+import re
+import string
+import urllib.parse
+
+
+# The most characters Google's TTS endpoint reads in one request
+MAX_SEGMENT_LENGTH = 100
+
+# The path of the endpoint, on translate.google.<tld>
+RPC_PATH = "/_/TranslateWebserverUi/data/batchexecute"
+
+# The id of the TTS call in the endpoint's request and response framing
+RPC_ID = "jQ1olc"
+
+# The base64 audio in a response line: jQ1olc","[\"<audio>\"]
+_AUDIO = re.compile(rb'jQ1olc","\[\\"(.*?)\\"]')
+
+_tokenize = None
+_pre_processors = None
+_punctuation_or_space = None
+
+
+def _load_tokenizer() -> None:
+    """
+    Build gTTS's pre-processors and tokenizer the first time they are needed.
+    gTTS is imported here, so it is only loaded once segments are split.
+    """
+    global _tokenize, _pre_processors, _punctuation_or_space
+    if _tokenize is not None:
+        return
+    from gtts.tokenizer import Tokenizer, pre_processors, tokenizer_cases
+    from gtts.tokenizer.symbols import ALL_PUNC
+
+    _pre_processors = (
+        pre_processors.tone_marks,
+        pre_processors.end_of_line,
+        pre_processors.abbreviations,
+        pre_processors.word_sub,
+    )
+    _punctuation_or_space = re.compile(f"^[{re.escape(ALL_PUNC + string.whitespace)}]*$")
+    _tokenize = Tokenizer([
+        tokenizer_cases.tone_marks,
+        tokenizer_cases.period_comma,
+        tokenizer_cases.colon,
+        tokenizer_cases.other_punctuation,
+    ]).run
+
+
+def _minimize(text: str, max_length: int) -> list:
+    """
+    Split text into pieces of at most max_length characters, at the last space that fits.
+    Text with no such space is cut at max_length.
+    """
+    pieces = []
+    text = text.lstrip(" ")
+    while len(text) > max_length:
+        cut = text.rfind(" ", 0, max_length)
+        if cut <= 0:
+            cut = max_length
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip(" ")
+    pieces.append(text)
+    return pieces
+
+
+def split_segments(text: str, max_length: int=MAX_SEGMENT_LENGTH) -> list:
+    """
+    Split text into the segments Google reads in separate requests, the same way gTTS does.
+
+    Args:
+    Required:
+        text: The text to read.
+    Optional:
+        max_length: The most characters in one segment.
+
+    Returns the segments in order. Text made only of punctuation and whitespace has none.
+    """
+    _load_tokenizer()
+    text = text.strip()
+    for pre_process in _pre_processors:
+        text = pre_process(text)
+
+    tokens = [text] if len(text) <= max_length else _tokenize(text)
+    segments = []
+    for token in tokens:
+        if _punctuation_or_space.match(token):
+            continue
+        segments.extend(piece for piece in _minimize(token.strip(), max_length) if piece)
+    return segments
+
+
+def package_rpc(segment: str, lang: str, slow: bool) -> str:
+    """
+    Build the form encoded body of the request for one segment.
+
+    Args:
+    Required:
+        segment: The text of the segment.
+        lang: The language code, such as "en".
+        slow: Whether to read slowly.
+    """
+    # Normal speed is sent as null
+    parameter = json.dumps([segment, lang, True if slow else None, "null"], separators=(",", ":"))
+    rpc = json.dumps([[[RPC_ID, parameter, None, "generic"]]], separators=(",", ":"))
+    return f"f.req={urllib.parse.quote(rpc)}&"
+
+
+def parse_audio(content: bytes) -> bytes:
+    """
+    Get the mp3 audio of one segment out of the endpoint's response.
+
+    Raises a RuntimeError if the response holds no audio.
+    """
+    match = _AUDIO.search(content)
+    if match is None:
+        preview = content[:200].decode("utf-8", errors="replace")
+        raise RuntimeError(f"No audio was found in the Google TTS response. The response started with: {preview!r}")
+    return base64.b64decode(match.group(1))
@@ -0,0 +1,245 @@
+import logging
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+from concurrent.futures import Future
+
+from eztts.adapters import APIAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class _Engine:
+    """
+    A pyttsx3 engine, kept running on a thread of its own for the life of the process.
+
+    Starting an engine loads the platform's speech driver, which takes far longer than
+    speaking a sentence, and engines can't be shared between threads. So one engine is
+    started once, and every LocalAdapter hands it work through a queue.
+    """
+
+    def __init__(self):
+        self._requests = queue.Queue()
+        self._voice_ids = {}
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="eztts-local-engine", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise RuntimeError(f"Could not start the local speech engine: {self._error}") from self._error
+
+
+    def synthesize(self, text: str, voice: str, rate: int, filename: str) -> None:
+        """
+        Speak text into an audio file, and wait for it to be written.
+
+        Args:
+        Required:
+            text: The text to speak.
+            voice: The language code of the voice, such as "en-us".
+            rate: The speaking rate, in words per minute.
+            filename: The file to write the audio to.
+        """
+        future = Future()
+        self._requests.put((text, voice, rate, filename, future))
+        future.result()
+
+
+    def _run(self):
+        try:
+            # pyttsx3 is imported here, so it is only loaded once this adapter is used
+            import pyttsx3
+            engine = pyttsx3.init()
+            voices = engine.getProperty("voices")
+            default_voice = engine.getProperty("voice")
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        while True:
+            text, voice, rate, filename, future = self._requests.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                engine.setProperty("voice", self._voice_id(voices, voice) or default_voice)
+                engine.setProperty("rate", rate)
+                engine.save_to_file(text, filename)
+                engine.runAndWait()
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+
+    def _voice_id(self, voices: list, code: str) -> str:
+        """
+        Get the id of the installed voice that best matches a language code, or None if no voice speaks the language.
+        An exact match for the code wins over one for just its language, such as "en" for "en-gb".
+        """
+        if code in self._voice_ids:
+            return self._voice_ids[code]
+
+        exact = partial = None
+        for voice in voices:
+            names = {voice.id.lower().replace("_", "-").rsplit("/", 1)[-1], str(voice.name).lower()}
+            for language in voice.languages or ():
+                if isinstance(language, bytes):
+                    # espeak prefixes each language with its priority as a byte
+                    language = language[1:].decode("utf-8", "replace")
+                names.add(language.lower().replace("_", "-"))
+            if code in names:
+                exact = voice.id
+                break
+            if partial is None and code.split("-")[0] in {name.split("-")[0] for name in names}:
+                partial = voice.id
+
+        voice_id = exact or partial
+        if voice_id is None:
+            logger.warning("No installed voice speaks %s. Using the engine's default voice.", code)
+        self._voice_ids[code] = voice_id
+        return voice_id
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def _get_engine() -> _Engine:
+    """
+    Get the process wide engine, starting it the first time.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = _Engine()
+        return _engine
+
+
+class LocalAdapter(APIAdapter):
+    """
+    An adapter for the speech engine installed on this machine, which depends on the pyttsx3 library.
+    Needs no network connection. Audio is WAV (AIFF on macOS), not mp3.
+    """
+
+    # LANGUAGES structure:
+    #  key: common language name
+    #  value: adapter specific language name
+    LANGUAGES = {
+        "English": "en-us",
+        "US English": "en-us",
+        "UK English": "en-gb",
+        "French": "fr",
+        "Spanish": "es",
+        "German": "de",
+        "Italian": "it",
+        "Portuguese": "pt",
+        "BR Portuguese": "pt-br",
+        "Mandarin": "cmn",
+        "Chinese": "cmn",
+    }
+
+    # VOICES structure:
+    #  key: voice name
+    #  value: (common language name, adapter specific voice name)
+    VOICES = {
+        "Local": ("English", "en-us"),
+        "US English Local": ("US English", "en-us"),
+        "UK English Local": ("UK English", "en-gb"),
+        "French Local": ("French", "fr"),
+        "Spanish Local": ("Spanish", "es"),
+        "German Local": ("German", "de"),
+        "Italian Local": ("Italian", "it"),
+        "Portuguese Local": ("Portuguese", "pt"),
+        "BR Portuguese Local": ("BR Portuguese", "pt-br"),
+        "Mandarin Local": ("Mandarin", "cmn"),
+    }
+
+    # SPEEDS structure:
+    #  key: common speed name
+    #  value: adapter specific speed name, in words per minute
+    SPEEDS = {
+        "slow": 140,
+        "medium": 180,
+        "fast": 230,
+        "very fast": 280,
+    }
+
+    # The engine reads text of any length.
+    MAX_TEXT_LENGTH = None
+
+    # There is no service to overload. The engine speaks one text at a time, and queues the rest.
+    RATE_LIMIT = None
+    RATE_BURST = None
+    MAX_CONCURRENCY = None
+
+    # pyttsx3 saves what the platform's engine makes, which is AIFF on macOS.
+    # It isn't mp3, so this adapter's audio is never cached, post-processed, or used in place of another adapter's.
+    AUDIO_FORMAT = "aiff" if sys.platform == "darwin" else "wav"
+
+
+    DEFAULT_SPEED = "medium"
+    DEFAULT_VOICE = "Local"
+
+
+    def _setup(self):
+        """
+        Start the shared engine, if it isn't running yet.
+        """
+        self.__engine = _get_engine()
+        self.__audio_path = None
+
+
+    def generate_tts(self, text: str) -> None:
+        """
+        Generate TTS.
+        """
+        logger.debug("Generating TTS...")
+        self._remove_audio()
+        fd, self.__audio_path = tempfile.mkstemp(suffix="." + self.AUDIO_FORMAT)
+        os.close(fd)
+        self.__engine.synthesize(text, self._adapter_specific_voice, self._adapter_specific_speed, self.__audio_path)
+
+        if os.path.getsize(self.__audio_path) == 0:
+            raise RuntimeError("The local speech engine did not generate any audio")
+        logger.debug("TTS generated.")
+
+
+    def save_tts(self, filename: str) -> None:
+        """
+        Save TTS to file.
+        """
+        logger.debug("Saving TTS to file: %s", filename)
+        shutil.copyfile(self._audio_path(), filename)
+        logger.debug("TTS saved.")
+
+
+    def save_tts_to(self, fileobj) -> None:
+        """
+        Write TTS into a writable binary file-like object.
+        """
+        logger.debug("Writing TTS to file object...")
+        with open(self._audio_path(), "rb") as f:
+            shutil.copyfileobj(f, fileobj)
+
+
+    def _take_down(self):
+        self._remove_audio()
+
+
+    def _audio_path(self) -> str:
+        if self.__audio_path is None:
+            raise RuntimeError("No TTS has been generated")
+        return self.__audio_path
+
+
+    def _remove_audio(self) -> None:
+        if self.__audio_path is not None:
+            if os.path.exists(self.__audio_path):
+                os.remove(self.__audio_path)
+            self.__audio_path = None
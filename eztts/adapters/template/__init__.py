@@ -20,6 +20,18 @@ class CLASSNAME(APIAdapter):
     #  value: adapter specific speed name
     SPEEDS = {}
 
+    # The most characters that can be sent in one request. None means no limit.
+    MAX_TEXT_LENGTH = None
+
+    # Client-side limits for the service: syntheses started per second, how many may start
+    # at once after an idle period, and how many may run at the same time. None means no limit.
+    RATE_LIMIT = None
+    RATE_BURST = None
+    MAX_CONCURRENCY = None
+
+    # The format of the audio the adapter makes. Keep it "mp3" unless the engine can't make mp3.
+    AUDIO_FORMAT = "mp3"
+
 
     DEFAULT_SPEED = None
     DEFAULT_VOICE = None
@@ -0,0 +1,504 @@
+import shutil
+import subprocess
+import struct
+from collections import namedtuple
+
+
+def strip_id3(data: bytes) -> bytes:
+    """
+    Remove ID3 tags from MP3 data, leaving only the audio frames.
+
+    Leading ID3v2 tags and a trailing ID3v1 tag are removed. Frames from
+    several MP3 files can be joined after their tags are stripped.
+    """
+    return bytes(_strip_id3_view(memoryview(data)))
+
+
+def _strip_id3_view(view: memoryview) -> memoryview:
+    # ID3v2 tags may be stacked, so keep stripping while one is found
+    while len(view) >= 10 and view[:3] == b"ID3":
+        # The tag size is a 28 bit "syncsafe" integer (7 bits per byte), not counting the 10 byte header
+        size = (view[6] << 21) | (view[7] << 14) | (view[8] << 7) | view[9]
+        # Bit 4 of the flags marks a 10 byte footer
+        if view[5] & 0x10:
+            size += 10
+        view = view[10 + size:]
+
+    # An ID3v1 tag is the last 128 bytes of the file, starting with "TAG"
+    if len(view) >= 128 and view[-128:-125] == b"TAG":
+        view = view[:-128]
+
+    return view
+
+
+# Bitrates in kbps, by (MPEG version 1 or not, layer), indexed by the header's bitrate index
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates in Hz, by the header's version bits, indexed by the header's sample rate index
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG 1
+    2: (22050, 24000, 16000),  # MPEG 2
+    0: (11025, 12000, 8000),   # MPEG 2.5
+}
+
+# One MPEG audio frame.
+#  offset, length: where the frame is in the data it was parsed from, in bytes
+#  version: 1 for MPEG 1, 2 for MPEG 2 and 2.5
+#  layer: 1, 2 or 3
+#  sample_rate: in Hz
+#  channels: 1 or 2
+#  protected: whether a 16 bit CRC follows the header
+Frame = namedtuple("Frame", ["offset", "length", "version", "layer", "sample_rate", "channels", "protected"])
+
+
+def parse_frame_header(data, offset: int=0) -> Frame:
+    """
+    Parse the MPEG audio frame header at offset.
+    Returns None if there isn't a valid header there.
+    """
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset], data[offset + 1], data[offset + 2], data[offset + 3]
+    if b0 != 0xFF or b1 & 0xE0 != 0xE0:
+        return None
+
+    version_bits = (b1 >> 3) & 0x03
+    layer = 4 - ((b1 >> 1) & 0x03)
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    # Reserved values, and free format bitrate, which can't be framed without decoding
+    if version_bits == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version_bits == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+
+    if layer == 1:
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and not mpeg1:
+        length = 72 * bitrate // sample_rate + padding
+    else:
+        length = 144 * bitrate // sample_rate + padding
+
+    channels = 1 if b3 >> 6 == 3 else 2
+    return Frame(offset, length, 1 if mpeg1 else 2, layer, sample_rate, channels, not (b1 & 0x01))
+
+
+def iter_frames(data):
+    """
+    Yield every complete MPEG audio frame in MP3 data, in order, skipping ID3 tags
+    and any bytes that aren't part of a frame. Offsets are relative to data.
+
+    A header found after bytes that aren't part of a frame is only trusted if another
+    header follows it, so that sync-like bytes inside tags or junk aren't taken for frames.
+    """
+    view = memoryview(data)
+    stripped = _strip_id3_view(view)
+    start = len(view) - len(stripped) - _trailing_tag_length(view)
+    end = start + len(stripped)
+
+    offset = start
+    in_sync = False
+    while offset + 4 <= end:
+        frame = parse_frame_header(view, offset)
+        if frame is None or offset + frame.length > end:
+            offset += 1
+            in_sync = False
+            continue
+        following = offset + frame.length
+        if not in_sync and following + 4 <= end and parse_frame_header(view, following) is None:
+            offset += 1
+            continue
+        in_sync = True
+        yield frame
+        offset = following
+
+
+def _trailing_tag_length(view: memoryview) -> int:
+    if len(view) >= 128 and view[-128:-125] == b"TAG":
+        return 128
+    return 0
+
+
+def _side_info_length(frame: Frame) -> int:
+    if frame.version == 1:
+        return 17 if frame.channels == 1 else 32
+    return 9 if frame.channels == 1 else 17
+
+
+def _is_info_frame(view: memoryview, frame: Frame) -> bool:
+    """
+    Check for a Xing, Info or VBRI frame, which holds encoder information about the
+    whole file instead of audio, and is wrong once files are joined or trimmed.
+    """
+    if frame.layer != 3:
+        return False
+    tag_offset = frame.offset + 4 + (2 if frame.protected else 0) + _side_info_length(frame)
+    tag = bytes(view[tag_offset:tag_offset + 4])
+    return tag in (b"Xing", b"Info") or bytes(view[frame.offset + 36:frame.offset + 40]) == b"VBRI"
+
+
+class _BitReader:
+    """
+    Reads big-endian bit fields out of a buffer.
+    """
+
+    def __init__(self, data, offset: int):
+        self.data = data
+        self.position = offset * 8
+
+
+    def read(self, bits: int) -> int:
+        value = 0
+        for _ in range(bits):
+            byte = self.data[self.position >> 3]
+            value = (value << 1) | ((byte >> (7 - (self.position & 7))) & 1)
+            self.position += 1
+        return value
+
+
+    def skip(self, bits: int) -> None:
+        self.position += bits
+
+
+def _granule_fields(view, frame: Frame) -> tuple:
+    """
+    Read a Layer III frame's side info.
+    Returns main_data_begin, and a list of (part2_3_length, bit position of global_gain)
+    for every granule and channel.
+    """
+    reader = _BitReader(view, frame.offset + 4 + (2 if frame.protected else 0))
+    granules = []
+    if frame.version == 1:
+        main_data_begin = reader.read(9)
+        # Private bits, then scale factor selection information for each channel
+        reader.skip((5 if frame.channels == 1 else 3) + 4 * frame.channels)
+        for _ in range(2):
+            for _ in range(frame.channels):
+                part2_3_length = reader.read(12)
+                reader.skip(9)
+                granules.append((part2_3_length, reader.position))
+                # global_gain, scalefac_compress, window switching and the rest of the granule
+                reader.skip(8 + 4 + 1 + 22 + 3)
+    else:
+        main_data_begin = reader.read(8)
+        reader.skip(1 if frame.channels == 1 else 2)
+        for _ in range(frame.channels):
+            part2_3_length = reader.read(12)
+            reader.skip(9)
+            granules.append((part2_3_length, reader.position))
+            reader.skip(8 + 9 + 1 + 22 + 2)
+    return main_data_begin, granules
+
+
+def _is_silent(view, frame: Frame) -> bool:
+    """
+    Check whether a frame is digital silence: a Layer III frame whose granules carry
+    no audio data at all. Frames of other layers are never considered silent.
+    """
+    if frame.layer != 3:
+        return False
+    _, granules = _granule_fields(view, frame)
+    return all(part2_3_length == 0 for part2_3_length, _ in granules)
+
+
+def _main_data_length(frame: Frame) -> int:
+    return frame.length - 4 - (2 if frame.protected else 0) - _side_info_length(frame)
+
+
+def _trim_silence(view, frames: list) -> list:
+    """
+    Drop the silent frames at the start and end of a list of frames.
+
+    Layer III frames can take part of their audio data from the frames before them (the
+    bit reservoir, pointed to by main_data_begin), so the silent frames holding data for
+    the first frame that is kept are kept too.
+    """
+    first = 0
+    while first < len(frames) and _is_silent(view, frames[first]):
+        first += 1
+    if first == len(frames):
+        return []
+    last = len(frames)
+    while last > first and _is_silent(view, frames[last - 1]):
+        last -= 1
+
+    if frames[first].layer == 3:
+        needed, _ = _granule_fields(view, frames[first])
+        while needed > 0 and first > 0:
+            first -= 1
+            needed -= _main_data_length(frames[first])
+
+    return frames[first:last]
+
+
+def _audio_frames(view, trim_silence: bool) -> list:
+    frames = [frame for frame in iter_frames(view) if not _is_info_frame(view, frame)]
+    if trim_silence:
+        frames = _trim_silence(view, frames)
+    return frames
+
+
+def concat_mp3(parts: list, trim_silence: bool=False) -> bytes:
+    """
+    Join several MP3 files into one, frame by frame, without re-encoding.
+
+    Args:
+    Required:
+        parts: The MP3 files to join, as bytes-like objects.
+    Optional:
+        trim_silence: Whether to drop the digitally silent frames at the start and
+                      end of every part.
+
+    ID3 tags, encoder information frames (Xing, Info and VBRI), and any bytes that aren't
+    part of a complete frame are dropped. Every part must have the same sample rate and
+    number of channels, or a ValueError is raised.
+    """
+    pieces = []
+    format_ = None
+    for part in parts:
+        view = memoryview(part)
+        for frame in _audio_frames(view, trim_silence):
+            if format_ is None:
+                format_ = (frame.sample_rate, frame.channels)
+            elif (frame.sample_rate, frame.channels) != format_:
+                raise ValueError(f"Can't join MP3 audio at {frame.sample_rate} Hz with {frame.channels} channels "
+                                 f"to audio at {format_[0]} Hz with {format_[1]} channels")
+            pieces.append(view[frame.offset:frame.offset + frame.length])
+    return b"".join(pieces)
+
+
+def trim_silence(data) -> bytes:
+    """
+    Drop the digitally silent frames at the start and end of MP3 audio, without re-encoding.
+    """
+    return concat_mp3([data], trim_silence=True)
+
+
+def loudness(data) -> float:
+    """
+    Estimate the loudness of Layer III MP3 audio, without decoding it, as the mean
+    global gain of the granules that carry audio.
+
+    Global gain is the step size the audio was quantized with, so louder audio tends to
+    have a higher global gain. One step is 1.5 dB. Returns 0.0 if there is no audio.
+    """
+    view = memoryview(data)
+    total = 0
+    count = 0
+    for frame in iter_frames(view):
+        if frame.layer != 3 or _is_info_frame(view, frame):
+            continue
+        _, granules = _granule_fields(view, frame)
+        for part2_3_length, gain_position in granules:
+            if part2_3_length:
+                total += _read_bits(view, gain_position, 8)
+                count += 1
+    return total / count if count else 0.0
+
+
+def _read_bits(data, position: int, bits: int) -> int:
+    reader = _BitReader(data, 0)
+    reader.position = position
+    return reader.read(bits)
+
+
+def _write_bits(data: bytearray, position: int, bits: int, value: int) -> None:
+    for i in range(bits):
+        bit = (value >> (bits - 1 - i)) & 1
+        byte_index = (position + i) >> 3
+        mask = 1 << (7 - ((position + i) & 7))
+        if bit:
+            data[byte_index] |= mask
+        else:
+            data[byte_index] &= ~mask
+
+
+def _crc16(data) -> int:
+    """
+    The CRC-16 used by MPEG audio: polynomial 0x8005, starting at 0xFFFF.
+    """
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return crc
+
+
+def adjust_gain(data, steps: int) -> bytes:
+    """
+    Change the volume of Layer III MP3 audio without re-encoding, by shifting the global
+    gain of every granule. One step is 1.5 dB; positive steps are louder.
+
+    Gains are clamped to the range the format allows, so very large changes may clip or
+    flatten. Frames with a CRC have it recalculated. Frames of other layers are unchanged.
+    """
+    if not steps:
+        return bytes(data)
+
+    # One copy, edited in place
+    buffer = bytearray(data)
+    for frame in iter_frames(buffer):
+        if frame.layer != 3 or _is_info_frame(memoryview(buffer), frame):
+            continue
+        _, granules = _granule_fields(buffer, frame)
+        for _, gain_position in granules:
+            gain = _read_bits(buffer, gain_position, 8)
+            _write_bits(buffer, gain_position, 8, min(255, max(0, gain + steps)))
+        if frame.protected:
+            # The CRC covers the last two bytes of the header and the side info
+            side_info_start = frame.offset + 6
+            crc = _crc16(bytes(buffer[frame.offset + 2:frame.offset + 4])
+                         + bytes(buffer[side_info_start:side_info_start + _side_info_length(frame)]))
+            buffer[frame.offset + 4:frame.offset + 6] = crc.to_bytes(2, "big")
+    return bytes(buffer)
+
+
+def gain_steps(decibels: float) -> int:
+    """
+    Convert a change in decibels to global gain steps of 1.5 dB, rounded to the nearest step.
+    """
+    return round(decibels / 1.5)
+
+
+# Output formats convert_audio can produce, and the ffmpeg output format for each
+OUTPUT_FORMATS = {
+    "mp3": None,
+    "wav": "s16le",
+    "pcm": "s16le",
+    "mulaw": "mulaw",
+}
+
+
+def convert_audio(data, output_format: str="mp3", sample_rate: int=None, channels: int=None) -> bytes:
+    """
+    Convert MP3 audio to another format.
+
+    Args:
+    Required:
+        data: The MP3 audio.
+    Optional:
+        output_format: "mp3", "wav" (16 bit PCM), "pcm" (raw 16 bit little-endian PCM),
+                       or "mulaw" (raw G.711 mu-law, for telephony).
+        sample_rate: The sample rate to resample to. Keeps the MP3's sample rate if not passed.
+        channels: The number of channels to mix to. Keeps the MP3's channels if not passed.
+
+    MP3 audio is returned as it is. Every other format needs decoding, which is done by
+    piping the audio through ffmpeg; a RuntimeError is raised if ffmpeg is not installed.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}")
+    if output_format == "mp3":
+        if sample_rate is not None or channels is not None:
+            raise ValueError("MP3 audio can't be resampled without re-encoding. Use a PCM output format.")
+        return bytes(data)
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError(f"Converting audio to {output_format} needs ffmpeg, which was not found on PATH.")
+
+    if sample_rate is None or channels is None:
+        first = next(iter_frames(data), None)
+        if first is None:
+            raise ValueError("No MP3 frames found in the audio.")
+        sample_rate = sample_rate or first.sample_rate
+        channels = channels or first.channels
+
+    command = [ffmpeg, "-hide_banner", "-loglevel", "error", "-f", "mp3", "-i", "pipe:0",
+               "-ar", str(sample_rate), "-ac", str(channels), "-f", OUTPUT_FORMATS[output_format], "pipe:1"]
+    process = subprocess.run(command, input=bytes(data), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to convert the audio: {process.stderr.decode(errors='replace').strip()}")
+
+    if output_format == "wav":
+        # ffmpeg can't go back and fill in a WAV header's sizes when writing to a pipe, so write the header here
+        return _wav_header(len(process.stdout), sample_rate, channels) + process.stdout
+    return process.stdout
+
+
+def _wav_header(data_length: int, sample_rate: int, channels: int, bits_per_sample: int=16) -> bytes:
+    block_align = channels * bits_per_sample // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_length, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits_per_sample,
+        b"data", data_length,
+    )
+
+
+class PostProcessor:
+    """
+    Post-processing applied to generated audio in memory, before it is written anywhere.
+
+    Parts (such as the chunks of long text) are joined frame by frame, optionally with
+    the silence at the start and end of each part trimmed, and the volume adjusted. The
+    result can then be converted to another format, such as WAV for telephony.
+    """
+
+    def __init__(self,
+                 trim_silence: bool=False,
+                 gain_db: float=0.0,
+                 target_loudness: float=None,
+                 output_format: str="mp3",
+                 sample_rate: int=None,
+                 channels: int=None):
+        """
+        Args:
+        Optional:
+            trim_silence: Whether to drop the digital silence at the start and end of every part.
+            gain_db: Decibels to change the volume by, in steps of 1.5 dB.
+            target_loudness: The loudness (see the loudness function) to bring the audio to,
+                             so clips from different voices and adapters play at similar volumes.
+                             Applied before gain_db.
+            output_format: "mp3", "wav", "pcm" or "mulaw". See convert_audio.
+            sample_rate: The sample rate to resample PCM output to.
+            channels: The number of channels to mix PCM output to.
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}")
+        self.trim_silence = trim_silence
+        self.gain_db = gain_db
+        self.target_loudness = target_loudness
+        self.output_format = output_format
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+
+    def check_adapter(self, adapter) -> None:
+        """
+        Raise a ValueError if an adapter class's audio can't be post-processed, because it isn't mp3.
+        """
+        if adapter.AUDIO_FORMAT != "mp3":
+            raise ValueError(f"Only mp3 audio can be post-processed, and {adapter.__name__} makes {adapter.AUDIO_FORMAT}")
+
+
+    def process(self, audio) -> bytes:
+        """
+        Post-process audio.
+
+        Args:
+        Required:
+            audio: The MP3 audio, as a bytes-like object, or a list of them to join in order.
+        """
+        parts = [audio] if isinstance(audio, (bytes, bytearray, memoryview)) else audio
+        data = concat_mp3(parts, self.trim_silence)
+
+        steps = gain_steps(self.gain_db)
+        if self.target_loudness is not None:
+            current = loudness(data)
+            if current:
+                steps += round(self.target_loudness - current)
+        data = adjust_gain(data, steps)
+
+        return convert_audio(data, self.output_format, self.sample_rate, self.channels)
@@ -0,0 +1,284 @@
+import logging
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from .adapters import APIAdapter
+from .audio import PostProcessor
+from .cache import DiskCache
+from .routing import select_adapter
+from .chunking import needs_chunking, synthesize_chunked
+from .failover import RoutingPolicy, synthesize_with_policy
+from .normalization import normalize_text
+from .output import open_output, output_path, with_format
+from .processing import synthesize_processed
+from .synthesis import synthesize
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TTSJob:
+    """
+    A single synthesis job for tts_many.
+    Fields mirror the arguments of the tts function.
+    """
+    text: str
+    filename: str
+    voice_name: str = None
+    speed: str = None
+    language: str = None
+    specified_adapter: APIAdapter = None
+
+
+@dataclass
+class TTSResult:
+    """
+    The outcome of a single job run by tts_many.
+
+    success is False when the job raised, in which case error holds the exception.
+    adapter is the adapter class that was selected, if selection got that far.
+    elapsed is the wall-clock time spent on the job, in seconds.
+    filename is the file the audio was saved to: job.filename, unless a policy with
+    any_format failed over to an adapter of another audio format, as in the tts function.
+    """
+    job: TTSJob
+    success: bool
+    adapter: type = None
+    error: Exception = None
+    elapsed: float = 0.0
+    filename: str = None
+
+
+def _as_job(job) -> TTSJob:
+    """
+    Convert a job given as a TTSJob, dict or tuple into a TTSJob.
+    Tuples are positional, in the same order as the TTSJob fields.
+    """
+    if isinstance(job, TTSJob):
+        return job
+    if isinstance(job, dict):
+        return TTSJob(**job)
+    return TTSJob(*job)
+
+
+class _AdapterLimiter:
+    """
+    Hands out one semaphore per adapter class so that no adapter runs more than
+    its allowed number of jobs at once.
+    """
+
+    def __init__(self, adapter_limits: dict=None, default_limit: int=None):
+        self._adapter_limits = dict(adapter_limits or {})
+        self._default_limit = default_limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+
+    def get(self, adapter: type):
+        """
+        Get the semaphore for an adapter class, or None if it is unlimited.
+        """
+        with self._lock:
+            if adapter not in self._semaphores:
+                limit = self._adapter_limits.get(adapter, self._default_limit)
+                self._semaphores[adapter] = threading.BoundedSemaphore(limit) if limit else None
+            return self._semaphores[adapter]
+
+
+def _run_job(job: TTSJob,
+             limiter: _AdapterLimiter,
+             debug: bool,
+             cache: DiskCache,
+             policy: RoutingPolicy=None,
+             postprocess: PostProcessor=None) -> TTSResult:
+    """
+    Select an adapter for a job and synthesize it, capturing any error.
+    """
+    start = time.perf_counter()
+    adapter = None
+    filename = job.filename
+    try:
+        adapter = select_adapter(job.specified_adapter, job.voice_name, job.language)
+        semaphore = limiter.get(adapter)
+        if semaphore is not None:
+            semaphore.acquire()
+        try:
+            if postprocess is not None:
+                adapter, audio = synthesize_processed(postprocess, job.text, job.specified_adapter, job.voice_name,
+                                                      job.speed, job.language, debug, cache, policy)
+                with open_output(job.filename) as f:
+                    f.write(audio)
+            elif policy is not None:
+                # The job counts against the limit of the adapter it was routed to first
+                routed, audio = synthesize_with_policy(policy, job.text, job.specified_adapter, job.voice_name,
+                                                       job.speed, job.language, debug, cache)
+                if routed.AUDIO_FORMAT != adapter.AUDIO_FORMAT:
+                    filename = with_format(filename, routed.AUDIO_FORMAT)
+                adapter = routed
+                with open_output(filename) as f:
+                    f.write(audio)
+            elif needs_chunking(adapter, job.text):
+                synthesize_chunked(adapter, job.text, job.filename, job.voice_name, job.speed, job.language, debug, cache)
+            else:
+                synthesize(adapter, job.text, job.filename, job.voice_name, job.speed, job.language, debug, cache)
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+    except Exception as e:
+        return TTSResult(job, False, adapter, e, time.perf_counter() - start, filename)
+    return TTSResult(job, True, adapter, None, time.perf_counter() - start, filename)
+
+
+def _report(on_result, result: TTSResult) -> None:
+    """
+    Pass a result to the caller's on_result callback. An error it raises is logged, so it
+    doesn't stop the batch, whose other jobs would otherwise be left running unreported.
+    """
+    try:
+        on_result(result)
+    except Exception:
+        logger.exception("on_result raised an error for %s", result.job.filename)
+
+
+def _resolve_voice(adapter: type, voice_name: str, language: str) -> tuple:
+    """
+    Pin down the voice an adapter class would use for a job, the same way configure_voice
+    picks it, so that jobs asking for the same voice in different ways can be grouped.
+    Returns the (voice name, language) to configure the adapter with.
+    """
+    profile = adapter.get_profile(voice_name, language)
+    if adapter.VOICES[profile.voice][0] == profile.language:
+        return profile.voice, None
+    # The language has no voice of its own, so configure it by language, as the job did
+    return None, profile.language
+
+
+def _group_jobs(jobs: list) -> list:
+    """
+    Normalize the text of every job, and group jobs that would produce the same audio.
+
+    Returns a list of (job to run, [jobs that share its audio]). The job to run has the
+    normalized text, the first job's filename, and a resolved adapter, voice and speed.
+    Jobs whose adapter or voice can't be resolved are left in groups of their own, so
+    they fail with the usual error when they are run.
+    """
+    groups = {}
+    for job in jobs:
+        try:
+            adapter = select_adapter(job.specified_adapter, job.voice_name, job.language)
+            voice_name, language = _resolve_voice(adapter, job.voice_name, job.language)
+            profile = adapter.get_profile(voice_name, language, job.speed)
+        except (TypeError, ValueError, KeyError):
+            groups[id(job)] = (job, [job])
+            continue
+
+        speed = profile.speed
+        text = normalize_text(job.text, profile.language)
+
+        key = (adapter, voice_name, language, speed, text)
+        if key in groups:
+            groups[key][1].append(job)
+        else:
+            groups[key] = (TTSJob(text, job.filename, voice_name, speed, language, adapter), [job])
+    return list(groups.values())
+
+
+def _run_group(group: tuple,
+               limiter: _AdapterLimiter,
+               debug: bool,
+               cache: DiskCache,
+               policy: RoutingPolicy,
+               postprocess: PostProcessor) -> list:
+    """
+    Run the job for a group, and copy its audio to the files of every other job in the group.
+    Returns a TTSResult for every job in the group.
+    """
+    job, members = group
+    result = _run_job(job, limiter, debug, cache, policy, postprocess)
+
+    results = []
+    for member in members:
+        filename = member.filename
+        if result.filename != job.filename:
+            # The audio is in another format than asked for, so every copy gets its extension
+            filename = with_format(filename, result.adapter.AUDIO_FORMAT)
+        if result.success and filename != result.filename:
+            start = time.perf_counter()
+            try:
+                with output_path(filename) as temp_path:
+                    shutil.copyfile(result.filename, temp_path)
+            except OSError as e:
+                results.append(TTSResult(member, False, result.adapter, e, result.elapsed + time.perf_counter() - start, filename))
+                continue
+            results.append(TTSResult(member, True, result.adapter, None, result.elapsed + time.perf_counter() - start, filename))
+        else:
+            results.append(TTSResult(member, result.success, result.adapter, result.error, result.elapsed, filename))
+    return results
+
+
+def tts_many(jobs,
+             max_workers: int=4,
+             adapter_limits: dict=None,
+             default_adapter_limit: int=None,
+             debug: bool=False,
+             cache: DiskCache=None,
+             on_result=None,
+             policy: RoutingPolicy=None,
+             normalize: bool=False,
+             postprocess: PostProcessor=None) -> list:
+    """
+    Generate text to speech for many jobs concurrently.
+
+    Args:
+    Required:
+        jobs: An iterable of jobs. Each job is a TTSJob, a dict of TTSJob fields,
+              or a tuple of (text, filename, voice_name, speed, language, specified_adapter),
+              where everything after filename is optional.
+    Optional:
+        max_workers: The number of jobs to run at the same time.
+        adapter_limits: A dict mapping adapter classes to the maximum number of jobs
+                        that may use that adapter at the same time.
+        default_adapter_limit: The limit for adapters not in adapter_limits.
+                               Unlimited (bounded only by max_workers) if not passed.
+        debug: Whether or not to log debug messages.
+        cache: A DiskCache or MemoryCache shared by all jobs.
+        on_result: A callable that is passed each TTSResult as soon as its job finishes,
+                   on the worker thread that ran the job. Useful for progress reporting.
+                   Errors it raises are logged, and don't stop the batch.
+        policy: A RoutingPolicy that every job follows, as in the tts function.
+        normalize: Whether to normalize the text of every job with normalize_text first,
+                   and synthesize each unique utterance only once. Jobs that end up with the
+                   same adapter, voice, speed and normalized text share one synthesis, whose
+                   audio is copied to each of their filenames.
+        postprocess: A PostProcessor that the audio of every job is run through, as in the tts function.
+
+    Adapter selection for each job follows the same rules as the tts function.
+
+    Returns a list of TTSResult, one per job, in the same order as the jobs.
+    A failing job does not stop the others; its exception is stored on its result.
+    """
+    jobs = [_as_job(job) for job in jobs]
+    limiter = _AdapterLimiter(adapter_limits, default_adapter_limit)
+
+    if normalize:
+        groups = _group_jobs(jobs)
+    else:
+        groups = [(job, [job]) for job in jobs]
+
+    def run(group):
+        results = _run_group(group, limiter, debug, cache, policy, postprocess)
+        if on_result is not None:
+            for result in results:
+                _report(on_result, result)
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run, group) for group in groups]
+        results = {}
+        for future in futures:
+            for result in future.result():
+                results[id(result.job)] = result
+    return [results[id(job)] for job in jobs]
@@ -0,0 +1,525 @@
+import collections
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from .adapters import APIAdapter
+from .coalescing import Coalescer
+from .keys import digest_key, normalize_cache_text, resolve_key
+from .output import open_output
+
+# How often, in seconds, a DiskCache recounts the size of its directory, to see audio
+# that other processes sharing the directory have added
+_RESCAN_INTERVAL = 5.0
+
+
+class DiskCache:
+    """
+    A content-addressed, size-bounded cache of generated audio on the local disk.
+
+    Entries are keyed on the adapter class, the adapter specific voice, language and speed,
+    and the normalized text. Audio files are stored once per unique content under
+    objects/, and keys under keys/ point at them. When the cache grows past max_bytes,
+    the least recently used audio files are evicted, along with their keys.
+
+    Several processes can share a directory, such as the workers of tts_many_processes.
+    Each recounts the directory's size before evicting, and at least every few seconds,
+    so the size limit holds for all of them together, give or take what was stored in
+    the last few seconds. Audio evicted by another process is treated as a miss.
+    """
+
+    def __init__(self, directory: str, max_bytes: int=512 * 1024 * 1024, link: bool=False):
+        """
+        Args:
+        Required:
+            directory: The directory to store the cache in. Created if it does not exist.
+        Optional:
+            max_bytes: The maximum total size of cached audio, in bytes.
+            link: Whether to hard-link cached audio to the output file instead of copying it.
+                  Falls back to copying when a hard link is not possible. eztts replaces
+                  output files instead of writing into them, so the cached audio is safe,
+                  but don't modify linked output files in place yourself.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.link = link
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._objects_dir = os.path.join(directory, "objects")
+        self._keys_dir = os.path.join(directory, "keys")
+        os.makedirs(self._objects_dir, exist_ok=True)
+        os.makedirs(self._keys_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._size = 0
+        self._scanned = 0.0
+        self._scan()
+
+
+    def make_key(self, adapter: APIAdapter, text: str) -> str:
+        """
+        Make the cache key for a configured adapter instance and the text it will read.
+        """
+        return digest_key(resolve_key(adapter, text))
+
+
+    def fetch(self, key: str, filename: str) -> bool:
+        """
+        Copy (or hard-link) the cached audio for a key to filename.
+        Returns True on a hit, and False on a miss.
+        """
+        with self._lock:
+            object_path = self._lookup(key)
+            if object_path is not None and self.link:
+                try:
+                    if os.path.lexists(filename):
+                        os.remove(filename)
+                    os.utime(object_path)
+                    os.link(object_path, filename)
+                    self.hits += 1
+                    return True
+                except FileNotFoundError:
+                    object_path = None
+                except OSError:
+                    pass
+            source = self._open(object_path)
+            if source is None:
+                return False
+
+        with source, open_output(filename) as f:
+            shutil.copyfileobj(source, f)
+        return True
+
+
+    def fetch_to(self, key: str, fileobj) -> bool:
+        """
+        Write the cached audio for a key into a writable binary file-like object.
+        Returns True on a hit, and False on a miss.
+        """
+        with self._lock:
+            source = self._open(self._lookup(key))
+            if source is None:
+                return False
+
+        with source:
+            shutil.copyfileobj(source, fileobj)
+        return True
+
+
+    def _open(self, object_path: str):
+        """
+        Open a looked up audio file for reading, mark it as recently used, and count the hit or miss.
+        Call with the lock held. The open file can still be read if the audio is evicted afterwards.
+        Returns None on a miss, including when another process evicted the audio after the lookup.
+        """
+        if object_path is not None:
+            try:
+                source = open(object_path, "rb")
+            except FileNotFoundError:
+                pass
+            else:
+                self.hits += 1
+                # Mark the entry as recently used
+                try:
+                    os.utime(source.fileno())
+                except (OSError, NotImplementedError):
+                    pass
+                return source
+        self.misses += 1
+        return None
+
+
+    def store(self, key: str, filename: str) -> None:
+        """
+        Add the audio in filename to the cache under a key.
+        The audio is written to a temporary file and renamed into place, so a
+        partially written file is never visible in the cache.
+        """
+        with open(filename, "rb") as f:
+            self._store_blocks(key, iter(lambda: f.read(1024 * 1024), b""))
+
+
+    def store_bytes(self, key: str, data: bytes) -> None:
+        """
+        Add audio held in memory to the cache under a key.
+        """
+        self._store_blocks(key, [data])
+
+
+    def abandon(self, key: str) -> None:
+        """
+        Called instead of store when generating the audio for a missed key failed.
+        DiskCache doesn't track misses that are being generated, so there is nothing to do.
+        """
+        pass
+
+
+    def _store_blocks(self, key: str, blocks) -> None:
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self._objects_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for block in blocks:
+                    digest.update(block)
+                    temp_file.write(block)
+                    size += len(block)
+
+            content_hash = digest.hexdigest()
+            object_path = self._object_path(content_hash)
+
+            with self._lock:
+                try:
+                    os.utime(object_path)
+                    os.remove(temp_path)
+                except FileNotFoundError:
+                    os.replace(temp_path, object_path)
+                    self._size += size
+                self._write_key(key, content_hash)
+                self._evict()
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters and current size.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+    def clear(self) -> None:
+        """
+        Remove every entry from the cache.
+        """
+        with self._lock:
+            for path in self._object_paths() + self._key_paths():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._size = 0
+
+
+    def _object_path(self, content_hash: str) -> str:
+        return os.path.join(self._objects_dir, content_hash + ".mp3")
+
+
+    def _key_path(self, key: str) -> str:
+        return os.path.join(self._keys_dir, key)
+
+
+    def _object_paths(self) -> list:
+        return [entry.path for entry in os.scandir(self._objects_dir) if entry.name.endswith(".mp3")]
+
+
+    def _key_paths(self) -> list:
+        return [entry.path for entry in os.scandir(self._keys_dir)]
+
+
+    def _lookup(self, key: str) -> str:
+        """
+        Get the audio file path for a key, or None if the key is missing or its audio was evicted.
+        """
+        key_path = self._key_path(key)
+        try:
+            with open(key_path, "r") as f:
+                content_hash = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        object_path = self._object_path(content_hash)
+        if not os.path.exists(object_path):
+            # The audio was evicted, so the key is stale
+            try:
+                os.remove(key_path)
+            except FileNotFoundError:
+                pass
+            return None
+        return object_path
+
+
+    def _write_key(self, key: str, content_hash: str) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=self._keys_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(content_hash)
+        os.replace(temp_path, self._key_path(key))
+
+
+    def _scan(self) -> list:
+        """
+        Recount the size of the audio in the directory, including audio other processes added.
+        Returns the (modification time, size, path) of every audio file.
+        """
+        entries = []
+        for entry in os.scandir(self._objects_dir):
+            if not entry.name.endswith(".mp3"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        self._size = sum(size for _, size, _ in entries)
+        self._scanned = time.monotonic()
+        return entries
+
+
+    def _evict(self) -> None:
+        """
+        Remove least recently used audio files until the cache fits in max_bytes,
+        and the keys pointing at them.
+        """
+        if self._size <= self.max_bytes and time.monotonic() - self._scanned < _RESCAN_INTERVAL:
+            return
+
+        entries = self._scan()
+        if self._size <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            if self._size <= self.max_bytes:
+                break
+            self._size -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process evicted it first
+                continue
+            self.evictions += 1
+        self._remove_stale_keys()
+
+
+    def _remove_stale_keys(self) -> None:
+        """
+        Remove every key whose audio is gone, so the keys directory doesn't outgrow the audio.
+        """
+        for entry in os.scandir(self._keys_dir):
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                with open(entry.path, "r") as f:
+                    content_hash = f.read().strip()
+                if not os.path.exists(self._object_path(content_hash)):
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+class MemoryCache:
+    """
+    A size-bounded, in-process cache of generated audio, for phrases that are
+    synthesized over and over.
+
+    Audio is held as immutable bytes, keyed on the adapter class, the adapter specific
+    voice, language and speed, and the normalized text. When the cache grows past
+    max_bytes, the least recently used audio is evicted.
+
+    Misses are de-duplicated with a Coalescer: while one caller is generating the audio
+    for a key, other callers that miss the same key wait for it instead of calling the
+    provider too.
+
+    A DiskCache can be passed as backing, in which case memory misses are looked up
+    on disk before anything is generated, and new audio is stored in both.
+    Thread-safe.
+    """
+
+    def __init__(self, max_bytes: int=64 * 1024 * 1024, backing: DiskCache=None):
+        """
+        Args:
+        Optional:
+            max_bytes: The maximum total size of cached audio, in bytes.
+            backing: A DiskCache to fall back to on a miss, and to store new audio in.
+        """
+        self.max_bytes = max_bytes
+        self.backing = backing
+
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._coalescer = Coalescer()
+        self._lock = threading.Lock()
+
+
+    def make_key(self, adapter: APIAdapter, text: str) -> tuple:
+        """
+        Make the cache key for a configured adapter instance and the text it will read.
+        """
+        return resolve_key(adapter, text)
+
+
+    def get(self, key: tuple) -> bytes:
+        """
+        Get the cached audio for a key.
+
+        On a miss, returns None, and the caller is expected to generate the audio and
+        then call store_bytes, or abandon if generating failed. Until then, other callers
+        that miss the same key wait, and get the stored audio once it is there.
+        """
+        with self._lock:
+            audio = self._hit(key)
+        if audio is not None:
+            return audio
+
+        audio = self._coalescer.join(key)
+        if audio is not None:
+            # Another caller generated it while this one waited
+            with self._lock:
+                self.waits += 1
+            return audio
+
+        # This caller leads. The audio may have been stored between the lookup and joining.
+        with self._lock:
+            audio = self._hit(key)
+            if audio is None:
+                self.misses += 1
+        if audio is not None:
+            self._coalescer.publish(key, audio)
+            return audio
+
+        if self.backing is not None:
+            buffer = io.BytesIO()
+            try:
+                found = self.backing.fetch_to(digest_key(key), buffer)
+            except BaseException:
+                self.abandon(key)
+                raise
+            if found:
+                audio = buffer.getvalue()
+                self._put(key, audio)
+                return audio
+        return None
+
+
+    def fetch(self, key: tuple, filename: str) -> bool:
+        """
+        Write the cached audio for a key to filename.
+        Returns True on a hit, and False on a miss.
+        """
+        audio = self.get(key)
+        if audio is None:
+            return False
+        with open_output(filename) as f:
+            f.write(audio)
+        return True
+
+
+    def fetch_to(self, key: tuple, fileobj) -> bool:
+        """
+        Write the cached audio for a key into a writable binary file-like object.
+        Returns True on a hit, and False on a miss.
+        """
+        audio = self.get(key)
+        if audio is None:
+            return False
+        fileobj.write(audio)
+        return True
+
+
+    def store(self, key: tuple, filename: str) -> None:
+        """
+        Add the audio in filename to the cache under a key.
+        """
+        try:
+            with open(filename, "rb") as f:
+                data = f.read()
+        except BaseException:
+            # Don't leave callers waiting for audio that isn't coming
+            self.abandon(key)
+            raise
+        self.store_bytes(key, data)
+
+
+    def store_bytes(self, key: tuple, data: bytes) -> None:
+        """
+        Add audio to the cache under a key, and wake up callers waiting for it.
+        """
+        data = bytes(data)
+        try:
+            if self.backing is not None:
+                self.backing.store_bytes(digest_key(key), data)
+        finally:
+            self._put(key, data)
+
+
+    def abandon(self, key: tuple) -> None:
+        """
+        Called instead of store_bytes when generating the audio for a missed key failed.
+        Wakes up the callers waiting for it, so one of them can try instead.
+        """
+        self._coalescer.abandon(key)
+
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters and current size.
+        waits counts lookups that waited for another caller to generate the audio.
+        hit_rate is the fraction of lookups that didn't generate audio: hits and waits.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses + self.waits
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "hit_rate": (self.hits + self.waits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+    def clear(self) -> None:
+        """
+        Remove every entry from the cache. The backing cache, if any, is not cleared.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+    def _hit(self, key: tuple) -> bytes:
+        """
+        Get the audio for a key and mark it as recently used. Called with the lock held.
+        """
+        audio = self._entries.get(key)
+        if audio is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return audio
+
+
+    def _put(self, key: tuple, audio: bytes) -> None:
+        with self._lock:
+            # Audio bigger than the whole cache would only evict everything else
+            if len(audio) <= self.max_bytes:
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self._size -= len(previous)
+                self._entries[key] = audio
+                self._size += len(audio)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+                    self.evictions += 1
+        self._coalescer.publish(key, audio)
@@ -0,0 +1,203 @@
+import functools
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .adapters import APIAdapter
+from .audio import concat_mp3
+from .cache import DiskCache
+from .output import open_output
+from .routing import select_adapter
+from .synthesis import synthesize_bytes
+
+
+# Sentence ends are followed by whitespace, except in languages that don't put spaces between sentences
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|(?<=[。！？])")
+_CLAUSE_BOUNDARY = re.compile(r"(?<=[,;:])\s+|(?<=[，；：、])")
+
+
+def _split_words(text: str, max_length: int) -> list:
+    """
+    Split text at whitespace, cutting any single word longer than max_length.
+    """
+    words = []
+    for word in text.split():
+        while len(word) > max_length:
+            words.append(word[:max_length])
+            word = word[max_length:]
+        if word:
+            words.append(word)
+    return words
+
+
+def _pack(pieces: list, max_length: int) -> list:
+    """
+    Greedily join consecutive pieces with spaces into chunks no longer than max_length.
+    """
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if not current:
+            current = piece
+        elif len(current) + 1 + len(piece) <= max_length:
+            current += " " + piece
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_text(text: str, max_length: int=None) -> list:
+    """
+    Split text into chunks no longer than max_length.
+
+    Text is split at sentence ends first. Sentences that are still too long are split
+    at clause punctuation, then at spaces. Small pieces are joined back together, so
+    each chunk is as long as it can be without going over max_length.
+    If max_length is None, the text is returned as a single chunk.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if max_length is None or len(text) <= max_length:
+        return [text]
+
+    pieces = []
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        if len(sentence) <= max_length:
+            pieces.append(sentence)
+            continue
+        for clause in _CLAUSE_BOUNDARY.split(sentence):
+            if len(clause) <= max_length:
+                pieces.append(clause)
+            else:
+                pieces.extend(_split_words(clause, max_length))
+
+    return _pack([piece for piece in pieces if piece], max_length)
+
+
+def split_sentences(text: str, max_length: int=None) -> list:
+    """
+    Split text into its sentences, for synthesizing one at a time.
+    Sentences longer than max_length are split further, the same way split_text splits them.
+    """
+    sentences = []
+    for sentence in _SENTENCE_BOUNDARY.split(text.strip()):
+        sentences.extend(split_text(sentence, max_length))
+    return sentences
+
+
+def needs_chunking(adapter: APIAdapter, text: str) -> bool:
+    """
+    Check if text is longer than an adapter class accepts in one request.
+    Raises a ValueError if it is, and the adapter's audio can't be joined, because it isn't mp3.
+    """
+    if adapter.MAX_TEXT_LENGTH is None or len(text) <= adapter.MAX_TEXT_LENGTH:
+        return False
+    if adapter.AUDIO_FORMAT != "mp3":
+        raise ValueError(f"The text is longer than {adapter.__name__} accepts ({adapter.MAX_TEXT_LENGTH} characters), "
+                         f"and its {adapter.AUDIO_FORMAT} audio can't be joined from chunks")
+    return True
+
+
+def render_chunks(adapter: APIAdapter,
+                  text: str,
+                  voice_name: str=None,
+                  speed: str=None,
+                  language: str=None,
+                  debug: bool=False,
+                  cache: DiskCache=None,
+                  max_workers: int=4,
+                  render=None,
+                  chunks: list=None):
+    """
+    Split text into chunks for an adapter class and synthesize them concurrently.
+
+    This is a generator. It yields the MP3 frames of each chunk in text order, as soon
+    as that chunk and every chunk before it are done. Each chunk's ID3 tags and encoder
+    information frames (Xing, Info and VBRI), which describe only that chunk, are dropped,
+    so joining everything it yields gives a playable MP3 of the whole text whose length
+    players can tell.
+
+    render is an optional function that takes the text of one chunk and returns its
+    audio as bytes. By default, each chunk is synthesized with synthesize_bytes.
+    chunks is an optional list of the chunks of text to synthesize. By default, the text
+    is split with split_text, to the adapter's MAX_TEXT_LENGTH.
+    """
+    if chunks is None:
+        chunks = split_text(text, adapter.MAX_TEXT_LENGTH)
+    if render is None:
+        render = functools.partial(synthesize_bytes, adapter, voice_name=voice_name, speed=speed,
+                                   language=language, debug=debug, cache=cache)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(render, chunk) for chunk in chunks]
+        try:
+            for future in futures:
+                yield concat_mp3([future.result()])
+        finally:
+            # If the caller stops early, don't synthesize chunks nobody will read
+            for future in futures:
+                future.cancel()
+
+
+def synthesize_chunked(adapter: APIAdapter,
+                       text: str,
+                       filename: str,
+                       voice_name: str=None,
+                       speed: str=None,
+                       language: str=None,
+                       debug: bool=False,
+                       cache: DiskCache=None,
+                       max_workers: int=4) -> None:
+    """
+    Synthesize text that may be longer than the adapter accepts, and save it to filename.
+    Chunks are synthesized concurrently and written in order, to a temporary file that
+    replaces filename once every chunk is done, so a failed chunk leaves no partial file.
+    """
+    with open_output(filename) as f:
+        synthesize_chunked_to(adapter, text, f, voice_name, speed, language, debug, cache, max_workers)
+
+
+def synthesize_chunked_to(adapter: APIAdapter,
+                          text: str,
+                          fileobj,
+                          voice_name: str=None,
+                          speed: str=None,
+                          language: str=None,
+                          debug: bool=False,
+                          cache: DiskCache=None,
+                          max_workers: int=4) -> None:
+    """
+    Same as synthesize_chunked, but writes into a writable binary file-like object.
+    """
+    for audio in render_chunks(adapter, text, voice_name, speed, language, debug, cache, max_workers):
+        fileobj.write(audio)
+
+
+def tts_stream(text: str,
+               specified_adapter: APIAdapter=None,
+               voice_name: str=None,
+               speed: str=None,
+               language: str=None,
+               debug: bool=False,
+               cache: DiskCache=None,
+               max_workers: int=4):
+    """
+    Generate text to speech one chunk at a time.
+
+    Takes the same arguments, and selects the adapter the same way, as the tts function,
+    except that there is no filename. The text is split into sentences, even for adapters
+    that read text of any length, which are synthesized concurrently, and the MP3 audio
+    of each is yielded, in order, as soon as it is ready. Playback can start after the
+    first sentence. Adapters that don't make mp3 audio can't be joined from sentences,
+    so their audio is yielded whole.
+    """
+    adapter = select_adapter(specified_adapter, voice_name, language)
+    if adapter.AUDIO_FORMAT != "mp3":
+        needs_chunking(adapter, text)
+        yield synthesize_bytes(adapter, text, voice_name, speed, language, debug, cache)
+        return
+    chunks = split_sentences(text, adapter.MAX_TEXT_LENGTH)
+    yield from render_chunks(adapter, text, voice_name, speed, language, debug, cache, max_workers, chunks=chunks)
@@ -0,0 +1,182 @@
+import getpass
+import http.client
+import io
+import json
+import os
+import socket
+import tempfile
+
+from .output import open_output
+
+# The TCP port the daemon's HTTP front end listens on by default
+DEFAULT_PORT = 5577
+
+# How many bytes of audio to read from the daemon at a time
+_READ_SIZE = 64 * 1024
+
+
+def default_socket_path() -> str:
+    """
+    Get the Unix socket path the daemon listens on, and the client connects to, by default.
+
+    Uses the EZTTS_SOCKET environment variable if it is set. Otherwise the socket is
+    eztts-<user id>.sock in XDG_RUNTIME_DIR, or in the temporary directory.
+    """
+    path = os.environ.get("EZTTS_SOCKET")
+    if path:
+        return path
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    user = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+    return os.path.join(directory, f"eztts-{user}.sock")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    An HTTP connection over a Unix domain socket instead of TCP.
+    """
+
+    def __init__(self, path: str, timeout: float=None):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class Client:
+    """
+    A thin client for a running eztts daemon (python -m eztts serve).
+
+    Syntheses are sent to the daemon, which keeps adapters, HTTP sessions and caches
+    warm between requests, and the audio is streamed back as it is generated.
+
+        client = Client()
+        if client.is_running():
+            client.synthesize_file("Hello, world!", "hello.mp3", voice_name="Harry")
+    """
+
+    def __init__(self, socket_path: str=None, host: str=None, port: int=DEFAULT_PORT, timeout: float=None):
+        """
+        Args:
+        Optional:
+            socket_path: The daemon's Unix socket. Uses default_socket_path() if neither
+                         socket_path nor host is passed.
+            host: The host of the daemon's HTTP front end, to connect over TCP instead.
+            port: The port of the daemon's HTTP front end.
+            timeout: Seconds to wait for the daemon on each socket operation. No limit if not passed.
+        """
+        if host is None and socket_path is None:
+            if not hasattr(socket, "AF_UNIX"):
+                host = "127.0.0.1"
+            else:
+                socket_path = default_socket_path()
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+
+    def is_running(self) -> bool:
+        """
+        Check whether a daemon is answering at this client's address.
+        """
+        try:
+            return self.health().get("status") == "ok"
+        except (OSError, http.client.HTTPException, ValueError):
+            return False
+
+
+    def health(self) -> dict:
+        """
+        Get the daemon's status, including its cache statistics if it has a cache.
+        """
+        connection = self._connect()
+        try:
+            connection.request("GET", "/health")
+            response = connection.getresponse()
+            return json.loads(response.read())
+        finally:
+            connection.close()
+
+
+    def synthesize_to(self,
+                      text: str,
+                      fileobj,
+                      voice_name: str=None,
+                      speed: str=None,
+                      language: str=None,
+                      adapter: str=None) -> None:
+        """
+        Synthesize text on the daemon and stream the audio into a writable binary file-like object.
+
+        Args:
+        Required:
+            text: The text to get TTS from.
+            fileobj: Where to write the audio, which is mp3 unless the adapter makes another format.
+        Optional:
+            voice_name: The name of the voice to use.
+            speed: The speed to read the text.
+            language: The language of the text.
+            adapter: The name of the adapter to use, such as "ftts" or "FTTSAdapter".
+
+        Adapter selection follows the same rules as the tts function.
+        Raises a ValueError if the daemon rejects the request (such as an unknown voice),
+        and a RuntimeError if the synthesis fails, or the daemon stops before all the audio arrived.
+        """
+        body = {"text": text, "voice": voice_name, "speed": speed, "language": language, "adapter": adapter}
+        body = json.dumps({key: value for key, value in body.items() if value is not None}).encode("utf-8")
+
+        connection = self._connect()
+        try:
+            connection.request("POST", "/tts", body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            if response.status != 200:
+                try:
+                    message = json.loads(response.read()).get("error", response.reason)
+                except ValueError:
+                    message = response.reason
+                error = ValueError if response.status == 400 else RuntimeError
+                raise error(f"The eztts daemon could not synthesize the text: {message}")
+            try:
+                while True:
+                    block = response.read(_READ_SIZE)
+                    if not block:
+                        break
+                    fileobj.write(block)
+            except http.client.IncompleteRead as e:
+                raise RuntimeError("The eztts daemon stopped before all the audio was sent") from e
+        finally:
+            connection.close()
+
+
+    def synthesize(self, text: str, voice_name: str=None, speed: str=None, language: str=None, adapter: str=None) -> bytes:
+        """
+        Same as synthesize_to, but returns the audio as bytes.
+        """
+        buffer = io.BytesIO()
+        self.synthesize_to(text, buffer, voice_name, speed, language, adapter)
+        return buffer.getvalue()
+
+
+    def synthesize_file(self,
+                        text: str,
+                        filename: str,
+                        voice_name: str=None,
+                        speed: str=None,
+                        language: str=None,
+                        adapter: str=None) -> None:
+        """
+        Same as synthesize_to, but saves the audio to a file.
+        The file is left as it was if the synthesis fails partway through.
+        """
+        with open_output(filename) as f:
+            self.synthesize_to(text, f, voice_name, speed, language, adapter)
+
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.host is not None:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return _UnixHTTPConnection(self.socket_path, self.timeout)
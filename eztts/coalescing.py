@@ -0,0 +1,165 @@
+import threading
+
+from .adapters import APIAdapter
+from .keys import resolve_key
+from .output import open_output
+
+
+class _Flight:
+    """
+    One piece of work in progress, and the callers waiting for it.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.waiters = 0
+
+
+class Coalescer:
+    """
+    Shares the result of in-flight work between callers that ask for the same key.
+
+    The first caller for a key leads: it does the work and publishes the result. Callers
+    that ask for the key while the work is in progress wait, and all get the same result.
+    Nothing is kept once the work is done, so later callers lead again. If the leader
+    abandons the key, one of the waiters leads instead. Thread-safe.
+
+    A Coalescer can be passed as the cache of the tts functions, to coalesce identical
+    syntheses that run at the same time without caching their audio. Every waiter gets
+    the leader's audio, written to its own file, or returned as the same bytes object.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.followers = 0
+
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+
+    def join(self, key):
+        """
+        Join the work for a key.
+
+        Returns None if the caller leads, in which case it must call publish with the
+        result, or abandon if the work failed. Otherwise, waits for the leader and
+        returns the published result.
+        """
+        while True:
+            with self._lock:
+                flight = self._in_flight.get(key)
+                if flight is None:
+                    self._in_flight[key] = _Flight()
+                    self.leaders += 1
+                    return None
+                self.followers += 1
+                flight.waiters += 1
+            flight.done.wait()
+            if flight.value is not None:
+                return flight.value
+
+
+    def publish(self, key, value) -> None:
+        """
+        Hand the result of the work for a key to everyone waiting for it.
+        """
+        with self._lock:
+            flight = self._in_flight.pop(key, None)
+        if flight is not None:
+            flight.value = value
+            flight.done.set()
+
+
+    def abandon(self, key) -> None:
+        """
+        Give up on the work for a key, so one of the callers waiting for it leads instead.
+        """
+        with self._lock:
+            flight = self._in_flight.pop(key, None)
+        if flight is not None:
+            flight.done.set()
+
+
+    def run(self, key, function):
+        """
+        Call function() and return its result, unless the same key is already in
+        flight, in which case wait for that result instead.
+        """
+        value = self.join(key)
+        if value is not None:
+            return value
+        try:
+            value = function()
+        except BaseException:
+            self.abandon(key)
+            raise
+        self.publish(key, value)
+        return value
+
+
+    def stats(self) -> dict:
+        """
+        Get how many callers led and how many waited for a leader.
+        """
+        with self._lock:
+            return {"leaders": self.leaders, "followers": self.followers, "in_flight": len(self._in_flight)}
+
+
+    # The rest of the methods let a Coalescer be passed as a cache to the tts functions.
+
+    def make_key(self, adapter: APIAdapter, text: str) -> tuple:
+        """
+        Make the key for a configured adapter instance and the text it will read.
+        """
+        return resolve_key(adapter, text)
+
+
+    def fetch(self, key: tuple, filename: str) -> bool:
+        """
+        Write the audio of an identical synthesis in flight to filename, waiting for it if needed.
+        Returns False if there is none, and the caller should generate the audio.
+        """
+        audio = self.join(key)
+        if audio is None:
+            return False
+        with open_output(filename) as f:
+            f.write(audio)
+        return True
+
+
+    def fetch_to(self, key: tuple, fileobj) -> bool:
+        """
+        Same as fetch, but writes into a writable binary file-like object.
+        """
+        audio = self.join(key)
+        if audio is None:
+            return False
+        fileobj.write(audio)
+        return True
+
+
+    def store(self, key: tuple, filename: str) -> None:
+        """
+        Hand the audio in filename to everyone waiting for the key.
+        The file is only read if someone is waiting.
+        """
+        with self._lock:
+            flight = self._in_flight.pop(key, None)
+        if flight is None:
+            return
+        # Callers that join from here on lead their own synthesis, so the count can't grow
+        try:
+            if flight.waiters:
+                with open(filename, "rb") as f:
+                    flight.value = f.read()
+        finally:
+            # If the file couldn't be read, the value is left as None, so a waiter leads instead
+            flight.done.set()
+
+
+    def store_bytes(self, key: tuple, data: bytes) -> None:
+        """
+        Hand audio to everyone waiting for the key.
+        """
+        self.publish(key, bytes(data))
@@ -0,0 +1,584 @@
+import argparse
+import json
+import logging
+import os
+import pickle
+import random
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .batch import TTSJob, TTSResult, _as_job, _report, _resolve_voice, tts_many
+from .cache import DiskCache
+from .chunking import needs_chunking, synthesize_chunked
+from .instrumentation import configure_logging
+from .routing import adapter_by_name, select_adapter
+from .synthesis import synthesize
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before retrying a queue operation that failed, such as while another
+# worker holds the database lock. Doubled on each failure in a row, up to the maximum.
+_RETRY_DELAY = 0.5
+_MAX_RETRY_DELAY = 30.0
+
+
+def _portable_result(result: TTSResult) -> TTSResult:
+    """
+    Make a result safe to send back from a worker process.
+    Exceptions that can't be pickled are replaced by a RuntimeError describing them.
+    """
+    if result.error is not None:
+        try:
+            pickle.dumps(result.error)
+        except Exception:
+            result.error = RuntimeError(f"{type(result.error).__name__}: {result.error}")
+    return result
+
+
+def _run_shard(jobs: list, threads: int, cache_dir: str, debug: bool, normalize: bool) -> list:
+    """
+    Run a shard of jobs in a worker process.
+    """
+    cache = DiskCache(cache_dir) if cache_dir else None
+    results = tts_many(jobs, max_workers=threads, debug=debug, cache=cache, normalize=normalize)
+    return [_portable_result(result) for result in results]
+
+
+def tts_many_processes(jobs,
+                       processes: int=None,
+                       threads: int=4,
+                       shard_size: int=None,
+                       cache_dir: str=None,
+                       debug: bool=False,
+                       normalize: bool=False,
+                       on_result=None) -> list:
+    """
+    Generate text to speech for many jobs, sharded across worker processes.
+
+    Args:
+    Required:
+        jobs: An iterable of jobs, in any form tts_many takes.
+    Optional:
+        processes: The number of worker processes. Defaults to the number of CPUs.
+        threads: The number of jobs each process runs at the same time.
+        shard_size: How many jobs to send to a process at a time. Smaller shards spread
+                    the work more evenly and report progress sooner. Defaults to about
+                    four shards per process.
+        cache_dir: The directory of a DiskCache shared by every process.
+        debug: Whether or not to log debug messages.
+        normalize: Whether to normalize text and synthesize each unique utterance only once,
+                   as in tts_many. Jobs are only grouped with others in the same shard.
+        on_result: A callable that is passed each TTSResult, in this process, as soon as its
+                   shard finishes. Errors it raises are logged, and don't stop the batch.
+
+    Each process runs tts_many on its shards, so adapter selection is the same as in the tts
+    function. Returns a list of TTSResult, one per job, in the same order as the jobs.
+    """
+    jobs = [_as_job(job) for job in jobs]
+    if not jobs:
+        return []
+    processes = processes or os.cpu_count() or 1
+    if shard_size is None:
+        shard_size = max(1, -(-len(jobs) // (processes * 4)))
+
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {}
+        for start in range(0, len(jobs), shard_size):
+            shard = jobs[start:start + shard_size]
+            futures[executor.submit(_run_shard, shard, threads, cache_dir, debug, normalize)] = start
+
+        for future in as_completed(futures):
+            start = futures[future]
+            shard = jobs[start:start + shard_size]
+            try:
+                shard_results = future.result()
+            except Exception as e:
+                # The process died, such as from running out of memory
+                shard_results = [TTSResult(job, False, None, e) for job in shard]
+            for offset, (job, result) in enumerate(zip(shard, shard_results)):
+                # Hand back the caller's own job objects, not the copies the process got
+                result.job = job
+                results[start + offset] = result
+                if on_result is not None:
+                    _report(on_result, result)
+    return results
+
+
+# Job states in a JobQueue
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    job TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+
+class JobQueue:
+    """
+    A queue of synthesis jobs in an SQLite file, for coordinating workers in several
+    processes, or on several machines that share a filesystem.
+
+    Workers lease one job at a time. A lease lasts lease_seconds and is kept alive by
+    heartbeats; if a worker dies, its lease expires and the job is leased to another
+    worker. A job that fails is retried until it has been tried max_attempts times.
+
+    Output is committed exactly once: workers synthesize into a file of their own, and
+    commit renames it to the job's filename only while still holding the lease, inside
+    the same database transaction that marks the job done. A worker that lost its lease
+    discards its output instead.
+
+    Every job's adapter and voice are pinned when it is added, so workers on every machine
+    synthesize it the same way. Relative filenames are relative to each worker's working
+    directory. SQLite's locking needs a filesystem with working file locks; some network
+    filesystems don't have them.
+    """
+
+    def __init__(self, path: str, lease_seconds: float=60.0, max_attempts: int=3):
+        """
+        Args:
+        Required:
+            path: The SQLite file. Created if it doesn't exist.
+        Optional:
+            lease_seconds: How long a lease lasts without a heartbeat.
+            max_attempts: How many times a job is tried before it is marked failed.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+
+    def add(self, jobs) -> int:
+        """
+        Add jobs to the queue.
+
+        Args:
+        Required:
+            jobs: An iterable of jobs, in any form tts_many takes.
+
+        The adapter and voice for each job are picked now, following the same rules as the
+        tts function, and stored with the job. Raises a ValueError, and adds nothing, if any
+        job has a voice or language no valid adapter supports.
+        Returns the number of jobs added.
+        """
+        rows = [(json.dumps(_pin_job(_as_job(job))),) for job in jobs]
+        connection = self._connection()
+        with _transaction(connection):
+            connection.executemany("INSERT INTO jobs (job) VALUES (?)", rows)
+        return len(rows)
+
+
+    def lease(self, worker: str) -> tuple:
+        """
+        Lease the next pending job, or a job whose lease expired.
+        Returns a tuple of (job id, TTSJob), or None if there is nothing to lease right now.
+        """
+        connection = self._connection()
+        now = time.time()
+        with _transaction(connection):
+            # A job whose worker keeps dying (such as by running out of memory) never gets to fail, so give up on it here
+            connection.execute(
+                "UPDATE jobs SET state = ?, lease_owner = NULL, error = ? WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, "The lease expired on every attempt", LEASED, now, self.max_attempts),
+            )
+            row = connection.execute(
+                "SELECT id, job FROM jobs WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                (PENDING, LEASED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, job = row
+            connection.execute(
+                "UPDATE jobs SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                (LEASED, worker, now + self.lease_seconds, job_id),
+            )
+        return job_id, _unpin_job(json.loads(job))
+
+
+    def heartbeat(self, worker: str) -> int:
+        """
+        Renew every lease a worker holds. Returns how many leases were renewed.
+        """
+        connection = self._connection()
+        with _transaction(connection):
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE state = ? AND lease_owner = ?",
+                (time.time() + self.lease_seconds, LEASED, worker),
+            )
+        return cursor.rowcount
+
+
+    def commit(self, job_id: int, worker: str, part_filename: str, filename: str) -> bool:
+        """
+        Move a finished job's output into place and mark the job done, if the worker still holds its lease.
+        Otherwise, the output is removed. Returns whether the output was committed.
+
+        Can be retried after an error. If the database failed after the output was moved
+        into place, the output is already there, and the job is only marked done.
+        """
+        connection = self._connection()
+        with _transaction(connection):
+            if not self._holds(connection, job_id, worker):
+                committed = False
+            else:
+                if os.path.exists(part_filename) or not os.path.exists(filename):
+                    os.replace(part_filename, filename)
+                connection.execute("UPDATE jobs SET state = ?, lease_owner = NULL, error = NULL WHERE id = ?",
+                                   (DONE, job_id))
+                committed = True
+        if not committed:
+            logger.warning("Lost the lease on job %s, so its output was discarded", job_id)
+            if os.path.exists(part_filename):
+                os.remove(part_filename)
+        return committed
+
+
+    def fail(self, job_id: int, worker: str, error: BaseException) -> None:
+        """
+        Record a failed attempt. The job goes back in the queue, unless it has been tried max_attempts times.
+        """
+        connection = self._connection()
+        with _transaction(connection):
+            if not self._holds(connection, job_id, worker):
+                return
+            connection.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, lease_owner = NULL, error = ? WHERE id = ?",
+                (self.max_attempts, FAILED, PENDING, f"{type(error).__name__}: {error}", job_id),
+            )
+
+
+    def release(self, worker: str) -> int:
+        """
+        Put every job a worker holds a lease on back in the queue, for a worker that is stopping
+        partway through. The attempts are not counted. Returns how many leases were released.
+        """
+        connection = self._connection()
+        with _transaction(connection):
+            cursor = connection.execute(
+                "UPDATE jobs SET state = ?, lease_owner = NULL, attempts = attempts - 1 WHERE state = ? AND lease_owner = ?",
+                (PENDING, LEASED, worker),
+            )
+        return cursor.rowcount
+
+
+    def stats(self) -> dict:
+        """
+        Get how many jobs are in each state: {"pending", "leased", "done", "failed"}
+        """
+        counts = dict.fromkeys((PENDING, LEASED, DONE, FAILED), 0)
+        for state, count in self._connection().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+            counts[state] = count
+        return counts
+
+
+    def failures(self) -> list:
+        """
+        Get the filename and last error of every job that failed for good.
+        """
+        rows = self._connection().execute("SELECT job, error FROM jobs WHERE state = ? ORDER BY id", (FAILED,))
+        return [(json.loads(job)["filename"], error) for job, error in rows]
+
+
+    def unfinished(self) -> int:
+        """
+        Get how many jobs are pending or leased.
+        """
+        (count,) = self._connection().execute("SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)",
+                                              (PENDING, LEASED)).fetchone()
+        return count
+
+
+    def _holds(self, connection, job_id: int, worker: str) -> bool:
+        row = connection.execute("SELECT state, lease_owner FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is not None and row[0] == LEASED and row[1] == worker
+
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Get this thread's connection. sqlite3 connections can't be shared between threads.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Transactions are managed explicitly, and other workers may hold the lock for a while
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+        return connection
+
+
+class _transaction:
+    """
+    A write transaction, taken up front so two workers can't both read a job as free.
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+def _pin_job(job: TTSJob) -> dict:
+    """
+    Pick the adapter and voice for a job now, and describe it as JSON.
+    """
+    adapter = select_adapter(job.specified_adapter, job.voice_name, job.language)
+    voice_name, language = _resolve_voice(adapter, job.voice_name, job.language)
+    return {
+        "text": job.text,
+        "filename": job.filename,
+        "voice_name": voice_name,
+        "speed": job.speed,
+        "language": language,
+        "adapter": adapter.__name__,
+    }
+
+
+def _unpin_job(fields: dict) -> TTSJob:
+    fields = dict(fields)
+    fields["specified_adapter"] = adapter_by_name(fields.pop("adapter"))
+    return TTSJob(**fields)
+
+
+def _synthesize_file(job: TTSJob, filename: str, debug: bool, cache: DiskCache) -> None:
+    """
+    Synthesize a job into filename, the same way the tts function would.
+    """
+    adapter = select_adapter(job.specified_adapter, job.voice_name, job.language)
+    if needs_chunking(adapter, job.text):
+        synthesize_chunked(adapter, job.text, filename, job.voice_name, job.speed, job.language, debug, cache)
+    else:
+        synthesize(adapter, job.text, filename, job.voice_name, job.speed, job.language, debug, cache)
+
+
+def default_worker_id() -> str:
+    """
+    Get a worker id that is unique across machines and processes: host:pid.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(queue_path: str,
+               threads: int=4,
+               worker: str=None,
+               cache_dir: str=None,
+               debug: bool=False,
+               lease_seconds: float=60.0,
+               max_attempts: int=3,
+               poll_interval: float=1.0,
+               wait: bool=False) -> dict:
+    """
+    Work through the jobs in a JobQueue until it is finished.
+
+    Args:
+    Required:
+        queue_path: The JobQueue's SQLite file.
+    Optional:
+        threads: How many jobs to run at the same time.
+        worker: This worker's id. Must be unique across every worker. Uses default_worker_id() if not passed.
+        cache_dir: The directory of a DiskCache to use.
+        debug: Whether or not to log debug messages.
+        lease_seconds: How long a lease lasts without a heartbeat. Heartbeats are sent three times as often.
+        max_attempts: How many times a job is tried before it is marked failed.
+        poll_interval: Seconds to wait before checking again, when every unfinished job is leased by another worker.
+        wait: Whether to keep waiting for new jobs once the queue is finished, instead of returning.
+
+    Returns how many jobs this worker committed, failed, and lost the lease on:
+        {"committed", "failed", "lost"}
+
+    Queue operations that fail, such as when the database stays locked, are retried with
+    backoff. If the heartbeat can't renew the leases before they would expire, the worker
+    stops taking jobs, puts the ones it holds back in the queue, and raises a RuntimeError.
+    """
+    worker = worker or default_worker_id()
+    queue = JobQueue(queue_path, lease_seconds, max_attempts)
+    cache = DiskCache(cache_dir) if cache_dir else None
+    counts = {"committed": 0, "failed": 0, "lost": 0}
+    counts_lock = threading.Lock()
+    stop = threading.Event()
+    heartbeat_error = []
+    # Part files are named after the worker, so two workers never write to the same one
+    part_suffix = "." + "".join(c if c.isalnum() else "-" for c in worker) + ".part"
+
+    def beat():
+        interval = lease_seconds / 3
+        delay = _RETRY_DELAY
+        renewed = time.monotonic()
+        wait_seconds = interval
+        while not stop.wait(wait_seconds):
+            started = time.monotonic()
+            try:
+                queue.heartbeat(worker)
+            except sqlite3.Error as e:
+                # Give up while a third of the last renewed lease is left, so the worker stops
+                # before other workers can lease its jobs
+                remaining = renewed + lease_seconds * 2 / 3 - time.monotonic()
+                if remaining <= 0:
+                    logger.error("Could not renew the leases for %.0f s, so stopping the worker: %s",
+                                 time.monotonic() - renewed, e)
+                    heartbeat_error.append(e)
+                    stop.set()
+                    return
+                wait_seconds = min(random.uniform(delay / 2, delay), remaining)
+                delay = min(delay * 2, interval)
+                logger.warning("The heartbeat failed, retrying in %.1f s: %s", wait_seconds, e)
+            else:
+                renewed = started
+                wait_seconds = interval
+                delay = _RETRY_DELAY
+
+    def attempt(operation, *args):
+        """
+        Run a queue operation, retrying it with backoff until it succeeds.
+        Raises its last error if the worker stops first.
+        """
+        delay = _RETRY_DELAY
+        while True:
+            try:
+                return operation(*args)
+            except sqlite3.Error as e:
+                wait_seconds = random.uniform(delay / 2, delay)
+                logger.warning("%s failed, retrying in %.1f s: %s", operation.__name__.capitalize(), wait_seconds, e)
+                if stop.wait(wait_seconds):
+                    raise
+                delay = min(delay * 2, _MAX_RETRY_DELAY)
+
+    def work():
+        while not stop.is_set():
+            try:
+                leased = attempt(queue.lease, worker)
+                if leased is None:
+                    if not wait and attempt(queue.unfinished) == 0:
+                        return
+                    stop.wait(poll_interval)
+                    continue
+            except sqlite3.Error:
+                # Only raised once the worker is stopping
+                return
+
+            job_id, job = leased
+            part_filename = job.filename + part_suffix
+            error = None
+            try:
+                os.makedirs(os.path.dirname(job.filename) or ".", exist_ok=True)
+                _synthesize_file(job, part_filename, debug, cache)
+            except Exception as e:
+                error = e
+            try:
+                if error is None:
+                    try:
+                        outcome = "committed" if attempt(queue.commit, job_id, worker, part_filename, job.filename) else "lost"
+                    except OSError as e:
+                        # Such as when the output can't be moved into place
+                        error = e
+                if error is not None:
+                    logger.warning("Job %s (%s) failed: %s", job_id, job.filename, error)
+                    if os.path.exists(part_filename):
+                        os.remove(part_filename)
+                    attempt(queue.fail, job_id, worker, error)
+                    outcome = "failed"
+            except sqlite3.Error:
+                # The worker is stopping, and its leases are released once every thread is done
+                if os.path.exists(part_filename):
+                    os.remove(part_filename)
+                return
+            with counts_lock:
+                counts[outcome] += 1
+
+    heartbeat = threading.Thread(target=beat, name="eztts-worker-heartbeat", daemon=True)
+    heartbeat.start()
+    workers = [threading.Thread(target=work, name=f"eztts-worker-{i}") for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    try:
+        for thread in workers:
+            thread.join()
+    finally:
+        stop.set()
+        heartbeat.join()
+        try:
+            released = queue.release(worker)
+        except sqlite3.Error as e:
+            logger.error("Could not put this worker's jobs back in the queue, so they wait for their leases to expire: %s", e)
+        else:
+            if released:
+                logger.warning("Put %s unfinished jobs back in the queue", released)
+    if heartbeat_error:
+        raise RuntimeError(f"The worker stopped, as it could not renew its leases: {heartbeat_error[0]}")
+    return counts
+
+
+def run_workers(queue_path: str, processes: int=None, **kwargs) -> dict:
+    """
+    Run a worker in each of several processes on this machine, and wait for them all.
+    Takes the same keyword arguments as run_worker, except worker. Returns the summed counts.
+    """
+    processes = processes or os.cpu_count() or 1
+    totals = {"committed": 0, "failed": 0, "lost": 0}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(run_worker, queue_path, **kwargs) for _ in range(processes)]
+        for future in futures:
+            for outcome, count in future.result().items():
+                totals[outcome] += count
+    return totals
+
+
+def main(argv: list=None) -> int:
+    """
+    Entry point for "python -m eztts worker".
+    """
+    parser = argparse.ArgumentParser(prog="python -m eztts worker",
+                                     description="Work through the jobs in a shared eztts job queue.")
+    parser.add_argument("queue", help="The job queue's SQLite file, created with 'eztts -m manifest --queue FILE'.")
+    parser.add_argument("-p", "--processes", help="How many worker processes to run on this machine.", type=int, default=1)
+    parser.add_argument("-j", "--threads", help="How many jobs each process runs at the same time.", type=int, default=4)
+    parser.add_argument("--cache-dir", help="A directory for a disk cache.")
+    parser.add_argument("--lease", help="How many seconds a lease lasts without a heartbeat.", type=float, default=60.0)
+    parser.add_argument("--max-attempts", help="How many times a job is tried before it is marked failed.", type=int, default=3)
+    parser.add_argument("--wait", help="If passed, keep waiting for new jobs instead of exiting when the queue is finished.", action="store_true")
+    parser.add_argument("-q", "--quiet", help="If passed, only log errors.", action="store_true")
+    args = parser.parse_args(argv)
+
+    configure_logging(logging.ERROR if args.quiet else logging.WARNING)
+
+    options = {"threads": args.threads, "cache_dir": args.cache_dir, "lease_seconds": args.lease,
+               "max_attempts": args.max_attempts, "wait": args.wait}
+    start = time.perf_counter()
+    try:
+        if args.processes > 1:
+            counts = run_workers(args.queue, args.processes, **options)
+        else:
+            counts = run_worker(args.queue, **options)
+    except (RuntimeError, sqlite3.Error) as e:
+        print(f"The worker stopped: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    queue = JobQueue(args.queue)
+    print(f"Committed {counts['committed']} jobs in {elapsed:.2f} s "
+          f"({counts['failed']} failed attempts, {counts['lost']} lost leases)")
+    print("Queue: " + ", ".join(f"{count} {state}" for state, count in queue.stats().items()))
+    for filename, error in queue.failures():
+        print(f"Failed: {filename}: {error}")
+    return 1 if queue.failures() else 0
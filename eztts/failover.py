@@ -0,0 +1,329 @@
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .adapters import APIAdapter
+from .cache import DiskCache
+from .chunking import needs_chunking, render_chunks
+from .routing import adapters_for_language, adapters_for_voice, select_adapter
+from .synthesis import synthesize_bytes
+
+
+class HealthTracker:
+    """
+    Tracks the rolling error rate and latency of each adapter class.
+
+    An adapter whose error rate or mean latency over its last few attempts goes over
+    the limits is taken out of the rotation for a cooldown period. After the cooldown
+    it is tried again with a clean record. Thread-safe.
+    """
+
+    def __init__(self,
+                 window: int=20,
+                 min_samples: int=5,
+                 max_error_rate: float=0.5,
+                 max_latency: float=None,
+                 cooldown: float=30.0):
+        """
+        Args:
+        Optional:
+            window: How many recent attempts to keep per adapter.
+            min_samples: How many attempts an adapter needs before it can be taken out of the rotation.
+            max_error_rate: The fraction of failed attempts (0 to 1) above which an adapter is unhealthy.
+            max_latency: The mean latency, in seconds, above which an adapter is unhealthy.
+                         Latency is not checked if not passed.
+            cooldown: How long, in seconds, an unhealthy adapter is kept out of the rotation.
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self.cooldown = cooldown
+
+        self._samples = {}
+        self._ejected_until = {}
+        self._lock = threading.Lock()
+
+
+    def record(self, adapter: type, success: bool, seconds: float) -> None:
+        """
+        Record the outcome of one attempt with an adapter.
+        """
+        with self._lock:
+            samples = self._samples.get(adapter)
+            if samples is None:
+                samples = self._samples[adapter] = collections.deque(maxlen=self.window)
+            samples.append((success, seconds))
+
+            if len(samples) >= self.min_samples and not self._within_limits(samples):
+                self._ejected_until[adapter] = time.monotonic() + self.cooldown
+                # Start from a clean record when the cooldown is over
+                samples.clear()
+
+
+    def is_healthy(self, adapter: type) -> bool:
+        """
+        Check whether an adapter is in the rotation.
+        """
+        with self._lock:
+            return time.monotonic() >= self._ejected_until.get(adapter, 0.0)
+
+
+    def stats(self, adapter: type) -> dict:
+        """
+        Get an adapter's current numbers:
+            {"samples", "error_rate", "mean_latency", "healthy"}
+        """
+        with self._lock:
+            samples = list(self._samples.get(adapter, ()))
+            healthy = time.monotonic() >= self._ejected_until.get(adapter, 0.0)
+        return {
+            "samples": len(samples),
+            "error_rate": _error_rate(samples),
+            "mean_latency": _mean_latency(samples),
+            "healthy": healthy,
+        }
+
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._ejected_until.clear()
+
+
+    def _within_limits(self, samples) -> bool:
+        if _error_rate(samples) > self.max_error_rate:
+            return False
+        if self.max_latency is not None and _mean_latency(samples) > self.max_latency:
+            return False
+        return True
+
+
+def _error_rate(samples) -> float:
+    if not samples:
+        return 0.0
+    return sum(1 for success, _ in samples if not success) / len(samples)
+
+
+def _mean_latency(samples) -> float:
+    if not samples:
+        return 0.0
+    return sum(seconds for _, seconds in samples) / len(samples)
+
+
+# The health tracker shared by every RoutingPolicy that isn't given its own,
+# so adapter health carries over between calls.
+default_health = HealthTracker()
+
+
+class RoutingPolicy:
+    """
+    How the tts functions should route around slow or failing adapters.
+
+    With a policy, the adapter picked by the usual rules is tried first. If it raises,
+    or takes longer than timeout, the next adapter that supports the same language is
+    tried, using its own voice for that language. With hedge_after, a second adapter is
+    also started if the first hasn't answered after that many seconds, and whichever
+    answers first wins. Adapters the health tracker has taken out of the rotation are
+    only tried after every healthy one.
+
+    An adapter the caller specified is the only one tried, unless fallback is passed.
+    Then it is only tried first, like an adapter the usual rules picked.
+
+    Only adapters that make the same audio format as the first one are tried, unless
+    any_format is passed. Then adapters of other formats, such as LocalAdapter, which
+    needs no network, are tried after the ones of the same format.
+    """
+
+    def __init__(self,
+                 failover: bool=True,
+                 timeout: float=None,
+                 hedge_after: float=None,
+                 health: HealthTracker=None,
+                 any_format: bool=False,
+                 fallback: bool=False):
+        """
+        Args:
+        Optional:
+            failover: Whether to try the next capable adapter when one fails or times out.
+            timeout: Seconds to wait for an adapter before giving up on it. No limit if not passed.
+            hedge_after: Seconds to wait for the first adapter before also starting the next one.
+                         No hedging if not passed.
+            health: The HealthTracker to record attempts in and route by.
+                    Uses the shared default_health if not passed.
+            any_format: Whether to also fail over to adapters that make another audio format.
+                        tts then saves their audio with its filename's extension changed to the
+                        format, and tts_to and tts_bytes write it as it is.
+            fallback: Whether to also fail over and hedge to other adapters when the caller
+                      specified an adapter. Otherwise, only the specified adapter is tried.
+        """
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive")
+        if hedge_after is not None and hedge_after < 0:
+            raise ValueError("hedge_after can't be negative")
+
+        self.failover = failover
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.health = health if health is not None else default_health
+        self.any_format = any_format
+        self.fallback = fallback
+
+
+def candidate_adapters(specified_adapter: APIAdapter=None,
+                       voice_name: str=None,
+                       language: str=None,
+                       health: HealthTracker=None,
+                       any_format: bool=False,
+                       fallback: bool=False) -> list:
+    """
+    Get the adapters that could handle a request, in the order they should be tried.
+
+    The first candidate is the adapter the tts function would pick. It is followed by
+    the other valid adapters that have the voice, and then by the ones that support the
+    language (the voice's language, if no language is given). Healthy adapters come
+    before unhealthy ones; otherwise the order of valid_adapters is kept. Only adapters that
+    make the same audio format as the first candidate are included, unless any_format is
+    passed, in which case the others follow them. A specified_adapter is the only
+    candidate, unless fallback is passed.
+
+    Returns a list of (adapter class, voice name, language) tuples, where voice name and
+    language are the values to configure that adapter with.
+    """
+    primary = select_adapter(specified_adapter, voice_name, language)
+    candidates = [(primary, voice_name, language)]
+    if specified_adapter is not None and not fallback:
+        return candidates
+
+    if language is None:
+        language = primary.VOICES[voice_name if voice_name is not None else primary.get_default_voice()][0]
+
+    seen = {primary}
+    if voice_name is not None:
+        for adapter in adapters_for_voice(voice_name):
+            if adapter in seen:
+                continue
+            if language is None or adapter.VOICES[voice_name][0] == language:
+                seen.add(adapter)
+                candidates.append((adapter, voice_name, None))
+    if language is not None:
+        for adapter in adapters_for_language(language):
+            if adapter not in seen:
+                seen.add(adapter)
+                candidates.append((adapter, None, language))
+
+    if any_format:
+        # Other formats are a last resort, such as a local engine for when the network is down
+        candidates.sort(key=lambda candidate: candidate[0].AUDIO_FORMAT != primary.AUDIO_FORMAT)
+    else:
+        candidates = [candidate for candidate in candidates if candidate[0].AUDIO_FORMAT == primary.AUDIO_FORMAT]
+    if health is not None:
+        # sorted is stable, so the preference order is kept within healthy and unhealthy adapters
+        candidates.sort(key=lambda candidate: not health.is_healthy(candidate[0]))
+    return candidates
+
+
+def _render(adapter: type, text: str, voice_name: str, speed: str, language: str, debug: bool, cache: DiskCache) -> bytes:
+    """
+    Synthesize text with an adapter class and return the audio.
+    """
+    if needs_chunking(adapter, text):
+        return b"".join(render_chunks(adapter, text, voice_name, speed, language, debug, cache))
+    return synthesize_bytes(adapter, text, voice_name, speed, language, debug, cache)
+
+
+def synthesize_with_policy(policy: RoutingPolicy,
+                           text: str,
+                           specified_adapter: APIAdapter=None,
+                           voice_name: str=None,
+                           speed: str=None,
+                           language: str=None,
+                           debug: bool=False,
+                           cache: DiskCache=None) -> tuple:
+    """
+    Synthesize text following a RoutingPolicy.
+
+    Args:
+    Required:
+        policy: The RoutingPolicy to follow.
+        text: The text to get TTS from.
+    Optional:
+        The rest of the arguments are the same as for the tts function.
+
+    Returns a tuple of (adapter class that answered, audio bytes). The audio is in the
+    adapter's AUDIO_FORMAT, which can differ from the first adapter's with any_format.
+    If every attempt fails, the error is raised. When more than one adapter was tried,
+    a RuntimeError listing every failure is raised, chained to the last one.
+
+    An adapter that times out or loses a hedge can't be interrupted, so it is left to
+    finish in the background and its result is discarded.
+    """
+    health = policy.health
+    candidate_list = candidate_adapters(specified_adapter, voice_name, language, health,
+                                        policy.any_format, policy.fallback)
+    candidates = iter(candidate_list)
+    attempts = {}
+    errors = []
+
+    def launch() -> bool:
+        candidate = next(candidates, None)
+        if candidate is None:
+            return False
+        adapter, candidate_voice, candidate_language = candidate
+        future = executor.submit(_render, adapter, text, candidate_voice, speed, candidate_language, debug, cache)
+        attempts[future] = (adapter, time.monotonic())
+        return True
+
+    def give_up():
+        if len(errors) == 1:
+            raise errors[0][1]
+        summary = "; ".join(f"{adapter.__name__}: {error!r}" for adapter, error in errors)
+        raise RuntimeError(f"Every adapter failed: {summary}") from errors[-1][1]
+
+    # One thread per candidate, so a new attempt never queues behind an abandoned one.
+    # Threads of abandoned attempts finish on their own, so don't wait for them on the way out.
+    executor = ThreadPoolExecutor(max_workers=len(candidate_list))
+    try:
+        launch()
+        hedged = False
+        while True:
+            if not attempts:
+                if not policy.failover or not launch():
+                    give_up()
+                # The hedge budget is for the first attempt; failovers take over from here
+                hedged = True
+
+            now = time.monotonic()
+            deadlines = []
+            if policy.timeout is not None:
+                deadlines.append(min(start for _, start in attempts.values()) + policy.timeout)
+            if policy.hedge_after is not None and not hedged:
+                deadlines.append(min(start for _, start in attempts.values()) + policy.hedge_after)
+            wait_for = max(0.0, min(deadlines) - now) if deadlines else None
+
+            done, _ = wait(attempts, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                adapter, start = attempts.pop(future)
+                try:
+                    audio = future.result()
+                except Exception as e:
+                    health.record(adapter, False, time.monotonic() - start)
+                    errors.append((adapter, e))
+                    continue
+                health.record(adapter, True, time.monotonic() - start)
+                return adapter, audio
+
+            now = time.monotonic()
+            if policy.timeout is not None:
+                for future, (adapter, start) in list(attempts.items()):
+                    if now - start >= policy.timeout:
+                        del attempts[future]
+                        health.record(adapter, False, now - start)
+                        errors.append((adapter, TimeoutError(f"{adapter.__name__} took longer than {policy.timeout} s")))
+            if policy.hedge_after is not None and not hedged and attempts:
+                if now - min(start for _, start in attempts.values()) >= policy.hedge_after:
+                    hedged = True
+                    launch()
+    finally:
+        executor.shutdown(wait=False)
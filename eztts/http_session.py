@@ -0,0 +1,107 @@
+import threading
+
+
+class SharedSession:
+    """
+    A lazily created requests.Session that is shared by every user in the process.
+
+    The session has a sized connection pool and a retry/backoff policy, so that
+    adapters reuse warm connections instead of opening new ones for every request.
+    requests is only imported when the session is first used.
+    """
+
+    def __init__(self,
+                 pool_size: int=10,
+                 max_retries: int=3,
+                 backoff_factor: float=0.5,
+                 status_forcelist: tuple=(500, 502, 503, 504)):
+        """
+        Args:
+        Optional:
+            pool_size: The number of connections to keep open per host.
+            max_retries: How many times to retry a failed request.
+            backoff_factor: Retries wait backoff_factor * 2 ** (retry number - 1) seconds.
+            status_forcelist: HTTP status codes that should be retried.
+                              429 is left out, so throttling reaches the adaptive
+                              concurrency limit in eztts.ratelimit instead of being
+                              made worse by retries.
+        """
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self._session = None
+        self._lock = threading.Lock()
+
+
+    def configure(self,
+                  pool_size: int=None,
+                  max_retries: int=None,
+                  backoff_factor: float=None,
+                  status_forcelist: tuple=None) -> None:
+        """
+        Change the pool and retry settings.
+        The current session, if any, is closed and a new one is created on next use.
+        """
+        with self._lock:
+            if pool_size is not None:
+                self.pool_size = pool_size
+            if max_retries is not None:
+                self.max_retries = max_retries
+            if backoff_factor is not None:
+                self.backoff_factor = backoff_factor
+            if status_forcelist is not None:
+                self.status_forcelist = status_forcelist
+            self._close()
+
+
+    def get(self) -> "requests.Session":
+        """
+        Get the shared session, creating it if necessary.
+        """
+        with self._lock:
+            if self._session is None:
+                self._session = build_session(self.pool_size, self.max_retries, self.backoff_factor, self.status_forcelist)
+            return self._session
+
+
+    def close(self) -> None:
+        """
+        Close the shared session and its pooled connections.
+        A new session is created if the shared session is used again.
+        """
+        with self._lock:
+            self._close()
+
+
+    def _close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+def build_session(pool_size: int=10,
+                  max_retries: int=3,
+                  backoff_factor: float=0.5,
+                  status_forcelist: tuple=(500, 502, 503, 504)) -> "requests.Session":
+    """
+    Build a requests.Session with a sized connection pool and a retry/backoff policy.
+    POST is retried along with the idempotent methods, since TTS requests are safe to repeat.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        allowed_methods=frozenset(["GET", "HEAD", "POST"]),
+        raise_on_status=False,
+    )
+    http_adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", http_adapter)
+    session.mount("https://", http_adapter)
+    return session
@@ -0,0 +1,200 @@
+import contextlib
+import logging
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger("eztts")
+
+
+# Emitted when an adapter lifecycle phase ends.
+#  phase: "init", "configure_voice", "generate_tts", "save_tts" or "finish"
+#  adapter: the adapter class name
+#  seconds: how long the phase took
+#  error: the exception the phase raised, or None
+PhaseEvent = namedtuple("PhaseEvent", ["phase", "adapter", "seconds", "error"])
+
+# Emitted when an adapter counts something.
+#  name: "requests" or "bytes_downloaded"
+#  adapter: the adapter class name
+#  value: how much to add to the counter
+CounterEvent = namedtuple("CounterEvent", ["name", "adapter", "value"])
+
+
+def configure_logging(level: int=logging.DEBUG) -> None:
+    """
+    Set the level of eztts's logger, and make sure its messages are printed somewhere.
+    A plain handler that writes messages to stderr is added if eztts's logger has none
+    and the root logger isn't configured either.
+    """
+    logger.setLevel(level)
+    if not logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+
+
+class Instrumentation:
+    """
+    Sends timing and counter events from adapters to registered listeners.
+
+    Listeners are callables that take a PhaseEvent or a CounterEvent. When there are
+    no listeners, phases are not timed and counters are not emitted, so instrumentation
+    costs next to nothing on the hot path.
+    """
+
+    def __init__(self):
+        self._listeners = ()
+        self._lock = threading.Lock()
+
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._listeners)
+
+
+    def add_listener(self, listener) -> None:
+        """
+        Register a callable to receive every PhaseEvent and CounterEvent.
+        """
+        with self._lock:
+            self._listeners = self._listeners + (listener,)
+
+
+    def remove_listener(self, listener) -> None:
+        """
+        Stop sending events to a listener.
+        """
+        with self._lock:
+            self._listeners = tuple(l for l in self._listeners if l is not listener)
+
+
+    def phase(self, phase: str, adapter):
+        """
+        A context manager that times an adapter lifecycle phase and emits a PhaseEvent.
+        adapter may be an adapter instance or class.
+        """
+        if not self._listeners:
+            return contextlib.nullcontext()
+        return self._timed_phase(phase, _adapter_name(adapter))
+
+
+    def count(self, name: str, adapter, value: int=1) -> None:
+        """
+        Emit a CounterEvent. adapter may be an adapter instance or class.
+        """
+        listeners = self._listeners
+        if not listeners:
+            return
+        event = CounterEvent(name, _adapter_name(adapter), value)
+        for listener in listeners:
+            listener(event)
+
+
+    @contextlib.contextmanager
+    def _timed_phase(self, phase: str, adapter_name: str):
+        error = None
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            event = PhaseEvent(phase, adapter_name, time.perf_counter() - start, error)
+            for listener in self._listeners:
+                listener(event)
+
+
+def _adapter_name(adapter) -> str:
+    if isinstance(adapter, type):
+        return adapter.__name__
+    return type(adapter).__name__
+
+
+class MetricsSink:
+    """
+    A listener that aggregates events into per-adapter phase timings and counters.
+
+    Register it with instrumentation.add_listener(sink), then read the numbers
+    with snapshot(), or export them in the Prometheus text format with to_prometheus().
+    """
+
+    def __init__(self):
+        self._phases = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+
+    def __call__(self, event) -> None:
+        with self._lock:
+            if isinstance(event, PhaseEvent):
+                key = (event.adapter, event.phase)
+                stats = self._phases.get(key)
+                if stats is None:
+                    stats = self._phases[key] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0}
+                stats["count"] += 1
+                stats["seconds"] += event.seconds
+                stats["max_seconds"] = max(stats["max_seconds"], event.seconds)
+                if event.error is not None:
+                    stats["errors"] += 1
+            else:
+                key = (event.adapter, event.name)
+                self._counters[key] = self._counters.get(key, 0) + event.value
+
+
+    def snapshot(self) -> dict:
+        """
+        Get a copy of the aggregated numbers:
+            {"phases": {(adapter, phase): {"count", "seconds", "max_seconds", "errors"}},
+             "counters": {(adapter, name): value}}
+        """
+        with self._lock:
+            return {
+                "phases": {key: dict(stats) for key, stats in self._phases.items()},
+                "counters": dict(self._counters),
+            }
+
+
+    def reset(self) -> None:
+        with self._lock:
+            self._phases.clear()
+            self._counters.clear()
+
+
+    def to_prometheus(self) -> str:
+        """
+        Export the aggregated numbers in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP eztts_phase_seconds Time spent in each adapter lifecycle phase.",
+            "# TYPE eztts_phase_seconds summary",
+        ]
+        for (adapter, phase), stats in sorted(snapshot["phases"].items()):
+            labels = f'adapter="{adapter}",phase="{phase}"'
+            lines.append(f"eztts_phase_seconds_count{{{labels}}} {stats['count']}")
+            lines.append(f"eztts_phase_seconds_sum{{{labels}}} {stats['seconds']:.6f}")
+
+        lines.append("# HELP eztts_phase_max_seconds Longest time spent in each adapter lifecycle phase.")
+        lines.append("# TYPE eztts_phase_max_seconds gauge")
+        for (adapter, phase), stats in sorted(snapshot["phases"].items()):
+            lines.append(f'eztts_phase_max_seconds{{adapter="{adapter}",phase="{phase}"}} {stats["max_seconds"]:.6f}')
+
+        lines.append("# HELP eztts_phase_errors_total Adapter lifecycle phases that raised.")
+        lines.append("# TYPE eztts_phase_errors_total counter")
+        for (adapter, phase), stats in sorted(snapshot["phases"].items()):
+            lines.append(f'eztts_phase_errors_total{{adapter="{adapter}",phase="{phase}"}} {stats["errors"]}')
+
+        names = sorted({name for _, name in snapshot["counters"]})
+        for name in names:
+            lines.append(f"# TYPE eztts_{name}_total counter")
+            for (adapter, counter_name), value in sorted(snapshot["counters"].items()):
+                if counter_name == name:
+                    lines.append(f'eztts_{name}_total{{adapter="{adapter}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+
+# The instrumentation used by every adapter in the process.
+instrumentation = Instrumentation()
@@ -0,0 +1,36 @@
+import hashlib
+import json
+
+from .adapters import APIAdapter
+
+
+def normalize_cache_text(text: str) -> str:
+    """
+    Normalize text for use in a cache key.
+    Collapses runs of whitespace, so that texts that only differ in spacing share an entry.
+    """
+    return " ".join(text.split())
+
+
+def resolve_key(adapter: APIAdapter, text: str) -> tuple:
+    """
+    Get what identifies a synthesis, for a configured adapter instance and the text it will read:
+    (adapter class, adapter specific voice, language and speed, normalized text).
+    """
+    profile = adapter._profile
+    return (
+        type(adapter),
+        profile.adapter_voice,
+        profile.adapter_language,
+        profile.adapter_speed,
+        normalize_cache_text(text),
+    )
+
+
+def digest_key(resolved_key: tuple) -> str:
+    """
+    Hash a resolved key into a string that is stable between processes.
+    """
+    adapter_type = resolved_key[0]
+    key_data = [f"{adapter_type.__module__}.{adapter_type.__qualname__}", *resolved_key[1:]]
+    return hashlib.sha256(json.dumps(key_data).encode("utf-8")).hexdigest()
@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+import os
+
+from .batch import TTSJob
+
+# Manifest columns (CSV) or keys (JSONL), and the TTSJob field each one fills
+MANIFEST_FIELDS = {
+    "text": "text",
+    "filename": "filename",
+    "voice": "voice_name",
+    "voice_name": "voice_name",
+    "speed": "speed",
+    "language": "language",
+}
+
+
+def read_manifest(fileobj, output_dir: str=".", manifest_format: str=None) -> list:
+    """
+    Read batch jobs from a CSV or JSONL manifest.
+
+    Args:
+    Required:
+        fileobj: A text file-like object to read the manifest from.
+    Optional:
+        output_dir: The directory that output filenames are relative to.
+        manifest_format: "csv" or "jsonl". Detected from the content if not passed:
+                         a manifest whose first non-blank character is "{" is JSONL.
+
+    CSV manifests need a header row, and quoted fields can span lines; a job's line number
+    is the line its row ends on. Both formats use the keys text, filename, voice
+    (or voice_name), speed and language. Only text is required; jobs without a filename
+    are saved as <line number>.mp3. Blank lines are skipped.
+
+    Returns a list of TTSJob, in manifest order.
+    """
+    content = fileobj.read()
+    if manifest_format is None:
+        manifest_format = "jsonl" if content.lstrip().startswith("{") else "csv"
+
+    if manifest_format == "jsonl":
+        rows = _read_jsonl(content)
+    elif manifest_format == "csv":
+        rows = _read_csv(content)
+    else:
+        raise ValueError(f"Unknown manifest format: {manifest_format}. Use 'csv' or 'jsonl'.")
+
+    return [_as_job(row, line_number, output_dir) for line_number, row in rows]
+
+
+def _read_jsonl(content: str):
+    for line_number, line in enumerate(content.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Manifest line {line_number} is not valid JSON: {e}") from None
+        if not isinstance(row, dict):
+            raise ValueError(f"Manifest line {line_number} must be a JSON object.")
+        yield line_number, row
+
+
+def _read_csv(content: str):
+    # Quoted fields can hold newlines, such as text of several sentences, so the
+    # content is read as a whole instead of line by line
+    reader = csv.DictReader(io.StringIO(content, newline=""))
+    for row in reader:
+        # Skip blank rows, which DictReader reads as all empty
+        if not any(row.values()):
+            continue
+        yield reader.line_num, row
+
+
+def _as_job(row: dict, line_number: int, output_dir: str) -> TTSJob:
+    """
+    Turn one manifest row into a TTSJob.
+    """
+    fields = {}
+    for key, value in row.items():
+        if key not in MANIFEST_FIELDS:
+            raise ValueError(f"Manifest line {line_number} has an unknown column: {key}")
+        # Empty CSV cells mean "use the default"
+        if value is not None and value != "":
+            fields[MANIFEST_FIELDS[key]] = value
+
+    if not fields.get("text"):
+        raise ValueError(f"Manifest line {line_number} has no text.")
+
+    filename = fields.pop("filename", f"{line_number}.mp3")
+    return TTSJob(filename=os.path.join(output_dir, filename), **fields)
+
+
+def is_complete_output(filename: str) -> bool:
+    """
+    Check whether a batch output file exists and holds mp3 audio,
+    so that resuming a batch can skip it.
+    """
+    try:
+        with open(filename, "rb") as f:
+            head = f.read(3)
+    except OSError:
+        return False
+    # An ID3 tag, or the 11 bit frame sync that starts every MPEG audio frame
+    return head[:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0)
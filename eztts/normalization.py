@@ -0,0 +1,406 @@
+import html
+import re
+import unicodedata
+
+from .adapters import APIAdapter
+
+
+# Abbreviations and symbols to spell out, per language family.
+# Abbreviations are matched as whole words, with their trailing period if they have one.
+_ABBREVIATIONS = {
+    "English": {
+        "Mr.": "Mister",
+        "Mrs.": "Missus",
+        "Ms.": "Miz",
+        "Dr.": "Doctor",
+        "Prof.": "Professor",
+        "Jr.": "Junior",
+        "Sr.": "Senior",
+        "Mt.": "Mount",
+        "e.g.": "for example",
+        "i.e.": "that is",
+        "etc.": "et cetera",
+        "vs.": "versus",
+        "approx.": "approximately",
+        "&": "and",
+        "%": "percent",
+    },
+    "French": {
+        "M.": "Monsieur",
+        "MM.": "Messieurs",
+        "Mme": "Madame",
+        "Mmes": "Mesdames",
+        "Mlle": "Mademoiselle",
+        "Dr": "Docteur",
+        "Pr": "Professeur",
+        "St": "Saint",
+        "Ste": "Sainte",
+        "etc.": "et cetera",
+        "&": "et",
+        "%": "pour cent",
+    },
+    "Spanish": {
+        "Sr.": "Señor",
+        "Sra.": "Señora",
+        "Srta.": "Señorita",
+        "Dr.": "Doctor",
+        "Dra.": "Doctora",
+        "Ud.": "usted",
+        "Uds.": "ustedes",
+        "etc.": "etcétera",
+        "&": "y",
+        "%": "por ciento",
+    },
+    "German": {
+        "Hr.": "Herr",
+        "Fr.": "Frau",
+        "Dr.": "Doktor",
+        "Prof.": "Professor",
+        "z.B.": "zum Beispiel",
+        "d.h.": "das heißt",
+        "usw.": "und so weiter",
+        "bzw.": "beziehungsweise",
+        "ca.": "circa",
+        "&": "und",
+        "%": "Prozent",
+    },
+}
+
+# How numbers are written, per language family: (thousands separator, decimal separator, word for the decimal point)
+_NUMBER_FORMATS = {
+    "English": (",", ".", "point"),
+    "French": (" ", ",", "virgule"),
+    "Spanish": (".", ",", "coma"),
+    "German": (".", ",", "Komma"),
+}
+
+# Only real tag syntax: a name right after "<" (or "</"), then name="value" attributes, so
+# comparisons such as "x < 5 and y > 3" are left alone. Also comments, and <?xml ...?> and
+# <!DOCTYPE ...> declarations.
+_TAG = re.compile(
+    r"<!--.*?-->"
+    r"|<[?!][A-Za-z][^<>]*>"
+    r"|</?[A-Za-z][\w:.-]*(?:\s+[A-Za-z_:][\w:.-]*(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'<>=`]+))?)*\s*/?>",
+    re.DOTALL,
+)
+_MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_MARKDOWN_EMPHASIS = re.compile(r"(\*\*|__|\*|`)(.+?)\1")
+_MARKDOWN_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+", re.MULTILINE)
+
+_abbreviation_patterns = {}
+_number_patterns = {}
+
+
+def language_family(language: str) -> str:
+    """
+    Get the language family of a common language name, such as "English" for "UK English".
+    Regional variants are named "<region> <language>", so the family is the last word.
+    """
+    return language.split()[-1]
+
+
+def strip_markup(text: str) -> str:
+    """
+    Remove HTML, XML and SSML tags and simple Markdown formatting, and decode HTML entities.
+    """
+    text = _TAG.sub(" ", text)
+    text = _MARKDOWN_LINK.sub(r"\1", text)
+    text = _MARKDOWN_EMPHASIS.sub(r"\2", text)
+    text = _MARKDOWN_HEADING.sub("", text)
+    return html.unescape(text)
+
+
+def normalize_text(text: str, language: str="English") -> str:
+    """
+    Canonicalize text before it is synthesized.
+
+    Args:
+    Required:
+        text: The text to normalize.
+    Optional:
+        language: The common name of the language the text will be read in.
+
+    Markup is stripped, Unicode is normalized to NFKC (so full width digits, ligatures
+    and the like become their plain forms), abbreviations, symbols and numbers are
+    spelled out for the language, and runs of whitespace are collapsed.
+    Abbreviations and numbers are only spelled out for English, French, Spanish and
+    German; text in other languages is otherwise left as it is.
+    """
+    family = language_family(language) if language else "English"
+
+    text = strip_markup(text)
+    text = unicodedata.normalize("NFKC", text)
+    text = _expand_abbreviations(text, family)
+    text = _expand_numbers(text, family)
+    return " ".join(text.split())
+
+
+def resolve_language(adapter: APIAdapter, voice_name: str=None, language: str=None) -> str:
+    """
+    Get the common name of the language an adapter class would read in, for a voice and/or
+    language, the same way configure_voice would pick it.
+    """
+    return adapter.get_profile(voice_name, language).language
+
+
+def _expand_abbreviations(text: str, family: str) -> str:
+    abbreviations = _ABBREVIATIONS.get(family)
+    if not abbreviations:
+        return text
+
+    pattern = _abbreviation_patterns.get(family)
+    if pattern is None:
+        # Longest first, so "Mmes" wins over "Mme"
+        alternatives = sorted(abbreviations, key=len, reverse=True)
+        pattern = _abbreviation_patterns[family] = re.compile(
+            "|".join(_abbreviation_regex(abbreviation) for abbreviation in alternatives))
+
+    def replace(match):
+        # Keep the expansion apart from words it was touching ("5%" -> "5 percent")
+        before = " " if match.start() > 0 and text[match.start() - 1].isalnum() else ""
+        after = " " if match.end() < len(text) and text[match.end()].isalnum() else ""
+        return before + abbreviations[match.group(0)] + after
+
+    return pattern.sub(replace, text)
+
+
+def _abbreviation_regex(abbreviation: str) -> str:
+    escaped = re.escape(abbreviation)
+    # Symbols can touch the words around them ("5%", "R&D"), but words must stand alone
+    if abbreviation[0].isalpha():
+        escaped = r"(?<!\w)" + escaped
+    if abbreviation[-1].isalpha():
+        escaped += r"(?!\w)"
+    return escaped
+
+
+def _expand_numbers(text: str, family: str) -> str:
+    number_format = _NUMBER_FORMATS.get(family)
+    if number_format is None:
+        return text
+    thousands, decimal, point = number_format
+
+    pattern = _number_patterns.get(family)
+    if pattern is None:
+        # Whole numbers, optionally grouped by the thousands separator, with an optional decimal part.
+        # Numbers touching letters ("5th", "v1.2") are left alone.
+        pattern = _number_patterns[family] = re.compile(
+            r"(?<!\w)(?<!\w\.)(\d{1,3}(?:" + re.escape(thousands) + r"\d{3})+|\d+)"
+            r"(?:" + re.escape(decimal) + r"(\d+))?(?![\w])"
+        )
+    spell = _SPELLERS[family]
+
+    def replace(match):
+        whole = int(match.group(1).replace(thousands, ""))
+        if whole >= 10 ** 12:
+            return match.group(0)
+        words = spell(whole)
+        if match.group(2):
+            # Digits after the decimal point are read one by one
+            words += f" {point} " + " ".join(spell(int(digit)) for digit in match.group(2))
+        return words
+
+    return pattern.sub(replace, text)
+
+
+def _english(number: int) -> str:
+    ones = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+            "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"]
+    tens = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+
+    def below_thousand(n):
+        words = []
+        if n >= 100:
+            words.append(ones[n // 100] + " hundred")
+            n %= 100
+        if n >= 20:
+            words.append(tens[n // 10] + ("-" + ones[n % 10] if n % 10 else ""))
+        elif n or not words:
+            words.append(ones[n])
+        return " ".join(words)
+
+    return _group_thousands(number, below_thousand, [(10 ** 9, "billion"), (10 ** 6, "million"), (1000, "thousand")])
+
+
+def _group_thousands(number: int, below_thousand, scales: list) -> str:
+    """
+    Spell a number by splitting it into groups of three digits, for languages that
+    simply put the scale word after each group.
+    """
+    if number < 1000:
+        return below_thousand(number)
+    words = []
+    for scale, name in scales:
+        if number >= scale:
+            words.append(f"{below_thousand(number // scale)} {name}")
+            number %= scale
+    if number:
+        words.append(below_thousand(number))
+    return " ".join(words)
+
+
+def _french(number: int) -> str:
+    ones = ["zéro", "un", "deux", "trois", "quatre", "cinq", "six", "sept", "huit", "neuf", "dix",
+            "onze", "douze", "treize", "quatorze", "quinze", "seize"]
+    tens = ["", "dix", "vingt", "trente", "quarante", "cinquante", "soixante"]
+
+    def below_hundred(n, final=True):
+        if n <= 16:
+            return ones[n]
+        if n < 20:
+            return "dix-" + ones[n - 10]
+        if n < 70:
+            ten, one = divmod(n, 10)
+            if one == 0:
+                return tens[ten]
+            return tens[ten] + (" et un" if one == 1 else "-" + ones[one])
+        if n < 80:
+            return "soixante" + (" et " if n == 71 else "-") + below_hundred(n - 60)
+        if n == 80:
+            # "vingts" takes an s only when nothing follows it, as "cents" does
+            return "quatre-vingts" if final else "quatre-vingt"
+        return "quatre-vingt-" + below_hundred(n - 80)
+
+    def below_thousand(n, final=True):
+        hundreds, rest = divmod(n, 100)
+        words = []
+        if hundreds:
+            if hundreds == 1:
+                words.append("cent")
+            else:
+                # "cents" takes an s only when nothing follows it
+                words.append(ones[hundreds] + (" cents" if rest == 0 and final else " cent"))
+        if rest or not words:
+            words.append(below_hundred(rest, final))
+        return " ".join(words)
+
+    if number < 1000:
+        return below_thousand(number)
+
+    words = []
+    for scale, singular, plural in [(10 ** 9, "milliard", "milliards"), (10 ** 6, "million", "millions")]:
+        if number >= scale:
+            count = number // scale
+            words.append(f"{below_thousand(count)} {singular if count == 1 else plural}")
+            number %= scale
+    if number >= 1000:
+        count = number // 1000
+        # "mille" is invariable, and never takes "un" in front of it
+        words.append("mille" if count == 1 else f"{below_thousand(count, final=False)} mille")
+        number %= 1000
+    if number:
+        words.append(below_thousand(number))
+    return " ".join(words)
+
+
+def _spanish(number: int) -> str:
+    ones = ["cero", "uno", "dos", "tres", "cuatro", "cinco", "seis", "siete", "ocho", "nueve", "diez",
+            "once", "doce", "trece", "catorce", "quince", "dieciséis", "diecisiete", "dieciocho", "diecinueve",
+            "veinte", "veintiuno", "veintidós", "veintitrés", "veinticuatro", "veinticinco", "veintiséis",
+            "veintisiete", "veintiocho", "veintinueve"]
+    tens = ["", "", "", "treinta", "cuarenta", "cincuenta", "sesenta", "setenta", "ochenta", "noventa"]
+    hundreds_words = ["", "ciento", "doscientos", "trescientos", "cuatrocientos", "quinientos",
+                      "seiscientos", "setecientos", "ochocientos", "novecientos"]
+
+    def below_thousand(n):
+        if n == 100:
+            return "cien"
+        hundreds, rest = divmod(n, 100)
+        words = []
+        if hundreds:
+            words.append(hundreds_words[hundreds])
+        if rest < 30:
+            if rest or not words:
+                words.append(ones[rest])
+        else:
+            ten, one = divmod(rest, 10)
+            words.append(tens[ten] + (" y " + ones[one] if one else ""))
+        return " ".join(words)
+
+    def before_noun(n):
+        # "uno" shortens to "un" in front of mil and millones ("veintiún mil")
+        words = below_thousand(n)
+        if words.endswith("veintiuno"):
+            return words[:-len("veintiuno")] + "veintiún"
+        if words.endswith("uno"):
+            return words[:-1]
+        return words
+
+    if number < 1000:
+        return below_thousand(number)
+
+    words = []
+    millions, number = divmod(number, 10 ** 6)
+    if millions:
+        words.append("un millón" if millions == 1 else f"{_spanish_thousands(millions, before_noun)} millones")
+    if number >= 1000:
+        thousands = number // 1000
+        words.append("mil" if thousands == 1 else f"{before_noun(thousands)} mil")
+        number %= 1000
+    if number:
+        words.append(below_thousand(number))
+    return " ".join(words)
+
+
+def _spanish_thousands(number: int, before_noun) -> str:
+    """
+    Spell a count of millions, which can itself be in the thousands.
+    """
+    thousands, rest = divmod(number, 1000)
+    words = []
+    if thousands:
+        words.append("mil" if thousands == 1 else f"{before_noun(thousands)} mil")
+    if rest:
+        words.append(before_noun(rest))
+    return " ".join(words)
+
+
+def _german(number: int) -> str:
+    ones = ["null", "eins", "zwei", "drei", "vier", "fünf", "sechs", "sieben", "acht", "neun", "zehn",
+            "elf", "zwölf", "dreizehn", "vierzehn", "fünfzehn", "sechzehn", "siebzehn", "achtzehn", "neunzehn"]
+    tens = ["", "", "zwanzig", "dreißig", "vierzig", "fünfzig", "sechzig", "siebzig", "achtzig", "neunzig"]
+
+    def below_thousand(n, final=True):
+        hundreds, rest = divmod(n, 100)
+        word = ""
+        if hundreds:
+            word += ("ein" if hundreds == 1 else ones[hundreds]) + "hundert"
+        if rest >= 20:
+            ten, one = divmod(rest, 10)
+            if one:
+                word += ("ein" if one == 1 else ones[one]) + "und"
+            word += tens[ten]
+        elif rest:
+            # "eins" is only used when it ends the number
+            word += "ein" if rest == 1 and not final else ones[rest]
+        elif not word:
+            word = ones[0]
+        return word
+
+    if number < 1000:
+        return below_thousand(number)
+
+    words = []
+    for scale, singular, plural in [(10 ** 9, "Milliarde", "Milliarden"), (10 ** 6, "Million", "Millionen")]:
+        if number >= scale:
+            count = number // scale
+            words.append("eine " + singular if count == 1 else f"{below_thousand(count)} {plural}")
+            number %= scale
+    # Thousands and the rest are written as one word
+    word = ""
+    if number >= 1000:
+        word += below_thousand(number // 1000, final=False) + "tausend"
+        number %= 1000
+    if number:
+        word += below_thousand(number)
+    if word:
+        words.append(word)
+    return " ".join(words)
+
+
+_SPELLERS = {
+    "English": _english,
+    "French": _french,
+    "Spanish": _spanish,
+    "German": _german,
+}
@@ -0,0 +1,44 @@
+import contextlib
+import os
+import uuid
+
+
+def with_format(filename: str, audio_format: str) -> str:
+    """
+    Get filename with its extension changed to an audio format, such as "hello.wav"
+    for "hello.mp3" and "wav". Returned as it is if the extension already matches.
+    """
+    root, extension = os.path.splitext(filename)
+    if extension.lower() == "." + audio_format:
+        return filename
+    return root + "." + audio_format
+
+
+@contextlib.contextmanager
+def output_path(filename: str):
+    """
+    Get a temporary path to write an output file to, next to filename. It is renamed
+    over filename once the block finishes, and removed if the block raises.
+
+    An existing file is replaced, never written in place. A DiskCache with link=True
+    hard-links its audio to output files, so writing into one would change the cached
+    audio too. A failed write also never leaves a truncated file behind.
+    """
+    temp_path = f"{filename}.{uuid.uuid4().hex[:12]}.tmp"
+    try:
+        yield temp_path
+        os.replace(temp_path, filename)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@contextlib.contextmanager
+def open_output(filename: str):
+    """
+    Open an output file for writing in binary mode. Same as output_path, but yields the open file.
+    """
+    with output_path(filename) as temp_path:
+        with open(temp_path, "wb") as f:
+            yield f
@@ -0,0 +1,262 @@
+import collections
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+
+from .adapters import APIAdapter
+from .batch import TTSJob
+from .cache import DiskCache
+from .chunking import needs_chunking, render_chunks
+from .failover import RoutingPolicy, synthesize_with_policy
+from .routing import select_adapter
+from .synthesis import synthesize_bytes
+
+
+# Priority classes. Lower runs first.
+_INTERACTIVE = 0
+_PREFETCH = 1
+
+# Sorts after every real task, so workers finish the queue before stopping
+_STOP = 2
+
+
+def _job_arguments(job) -> dict:
+    """
+    Convert a prefetch job into tts keyword arguments.
+    A job is the text alone, a dict of tts keyword arguments, or a TTSJob (whose filename is ignored).
+    """
+    if isinstance(job, str):
+        return {"text": job}
+    if isinstance(job, TTSJob):
+        return {"text": job.text, "voice_name": job.voice_name, "speed": job.speed,
+                "language": job.language, "specified_adapter": job.specified_adapter}
+    if isinstance(job, dict):
+        allowed = {"text", "voice_name", "speed", "language", "specified_adapter"}
+        unknown = set(job) - allowed
+        if unknown:
+            raise ValueError(f"Unknown prefetch job fields: {', '.join(sorted(unknown))}")
+        return dict(job)
+    raise TypeError(f"A prefetch job must be a str, dict or TTSJob, not {type(job).__name__}")
+
+
+class Prefetcher:
+    """
+    Synthesizes text in the background, ahead of when it is needed, so the audio is
+    already in the cache when it is asked for.
+
+    Work is done by a small pool of threads, in priority order: interactive requests
+    submitted with submit always run before prefetches. Prefetches wait in a bounded
+    queue; when it is full, the oldest waiting prefetch is dropped to make room, since
+    newer predictions are usually the better ones. Each scheduled job gets a
+    concurrent.futures.Future, which can be cancelled until the job starts.
+
+        cache = MemoryCache()
+        with Prefetcher(cache) as prefetcher:
+            prefetcher.prefetch(["Press one for sales.", "Press two for support."])
+            ...
+            audio = tts_bytes("Press two for support.", cache=cache)  # Usually a cache hit
+    """
+
+    def __init__(self,
+                 cache: DiskCache,
+                 max_workers: int=2,
+                 max_queue: int=64,
+                 debug: bool=False,
+                 policy: RoutingPolicy=None):
+        """
+        Args:
+        Required:
+            cache: The DiskCache or MemoryCache to fill. Pass the same cache to the tts
+                   functions. A MemoryCache also makes a request for text that is still
+                   being prefetched wait for that synthesis, instead of starting another.
+        Optional:
+            max_workers: How many syntheses to run at the same time.
+            max_queue: The most prefetches waiting to start.
+            debug: Whether or not to log debug messages.
+            policy: A RoutingPolicy that every synthesis follows, as in the tts function.
+        """
+        if cache is None:
+            raise ValueError("A Prefetcher needs a cache to fill")
+        if max_workers < 1 or max_queue < 1:
+            raise ValueError("max_workers and max_queue must be at least 1")
+
+        self.cache = cache
+        self.max_queue = max_queue
+        self.debug = debug
+        self.policy = policy
+
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        # Prefetches that haven't started, oldest first, and the same futures by job, to skip duplicates
+        self._waiting = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._workers = [threading.Thread(target=self._work, name=f"eztts-prefetch-{i}", daemon=True)
+                         for i in range(max_workers)]
+        for worker in self._workers:
+            worker.start()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def prefetch(self, jobs) -> list:
+        """
+        Schedule background synthesis of jobs into the cache, at prefetch priority.
+
+        Args:
+        Required:
+            jobs: An iterable of jobs. Each job is the text to synthesize, a dict of
+                  text, voice_name, speed, language and specified_adapter, or a TTSJob,
+                  whose filename is ignored. Adapter selection follows the same rules as
+                  the tts function, so the cache keys match what tts will look up.
+
+        Returns a Future per job, in order, that resolves to the audio bytes. A job that
+        is already waiting shares the existing Future.
+        """
+        futures = []
+        for job in jobs:
+            arguments = _job_arguments(job)
+            key = tuple(arguments.get(field) for field in
+                        ("text", "voice_name", "speed", "language", "specified_adapter"))
+            with self._lock:
+                self._check_open()
+                future = self._waiting.get(key)
+                if future is None or future.cancelled():
+                    future = Future()
+                    self._waiting.pop(key, None)
+                    self._waiting[key] = future
+                    self._queue.put((_PREFETCH, next(self._sequence), key, future, arguments))
+                    self._make_room()
+            futures.append(future)
+        return futures
+
+
+    def submit(self,
+               text: str,
+               specified_adapter: APIAdapter=None,
+               voice_name: str=None,
+               speed: str=None,
+               language: str=None) -> Future:
+        """
+        Schedule synthesis of text at interactive priority, ahead of every prefetch.
+        Takes the same arguments as the tts_bytes function, and returns a Future that
+        resolves to the audio bytes. Interactive requests are never dropped.
+        """
+        arguments = {"text": text, "voice_name": voice_name, "speed": speed,
+                     "language": language, "specified_adapter": specified_adapter}
+        future = Future()
+        with self._lock:
+            self._check_open()
+            self._queue.put((_INTERACTIVE, next(self._sequence), None, future, arguments))
+        return future
+
+
+    def cancel_pending(self) -> int:
+        """
+        Cancel every prefetch that hasn't started, such as when the predictions are stale.
+        Returns how many were cancelled.
+        """
+        with self._lock:
+            waiting, self._waiting = self._waiting, collections.OrderedDict()
+        return sum(1 for future in waiting.values() if future.cancel())
+
+
+    def stats(self) -> dict:
+        """
+        Get how many jobs are waiting, and how many completed, failed or were dropped.
+        """
+        with self._lock:
+            return {
+                "waiting": sum(1 for future in self._waiting.values() if not future.cancelled()),
+                "completed": self.completed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
+
+
+    def close(self, cancel_pending: bool=True) -> None:
+        """
+        Stop accepting jobs and wait for the workers to finish.
+
+        Args:
+        Optional:
+            cancel_pending: Whether to cancel the prefetches that haven't started, instead
+                            of running them first. Interactive requests always run.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if cancel_pending:
+            self.cancel_pending()
+        for _ in self._workers:
+            self._queue.put((_STOP, next(self._sequence), None, None, None))
+        for worker in self._workers:
+            worker.join()
+
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("Prefetcher is closed")
+
+
+    def _make_room(self) -> None:
+        """
+        Drop the oldest waiting prefetches until the queue is within max_queue.
+        Call with the lock held.
+        """
+        while len(self._waiting) > self.max_queue:
+            _, future = self._waiting.popitem(last=False)
+            if not future.cancelled() and future.cancel():
+                self.dropped += 1
+
+
+    def _work(self) -> None:
+        while True:
+            priority, _, key, future, arguments = self._queue.get()
+            if priority == _STOP:
+                return
+            if key is not None:
+                with self._lock:
+                    if self._waiting.get(key) is future:
+                        del self._waiting[key]
+            # Skips jobs that were cancelled or dropped while waiting
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                audio = self._render(**arguments)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                future.set_exception(e)
+                continue
+            with self._lock:
+                self.completed += 1
+            future.set_result(audio)
+
+
+    def _render(self, text: str, specified_adapter: APIAdapter=None, voice_name: str=None,
+                speed: str=None, language: str=None) -> bytes:
+        """
+        Synthesize through the cache the same way tts_bytes would, and return the audio.
+        """
+        if self.policy is not None:
+            _, audio = synthesize_with_policy(self.policy, text, specified_adapter, voice_name, speed, language,
+                                              self.debug, self.cache)
+            return audio
+        adapter = select_adapter(specified_adapter, voice_name, language)
+        if needs_chunking(adapter, text):
+            return b"".join(render_chunks(adapter, text, voice_name, speed, language, self.debug, self.cache))
+        return synthesize_bytes(adapter, text, voice_name, speed, language, self.debug, self.cache)
@@ -0,0 +1,50 @@
+import copy
+
+from .adapters import APIAdapter
+from .audio import PostProcessor
+from .cache import DiskCache
+from .chunking import needs_chunking, render_chunks
+from .failover import RoutingPolicy, synthesize_with_policy
+from .routing import select_adapter
+from .synthesis import synthesize_bytes
+
+
+def synthesize_processed(postprocess: PostProcessor,
+                         text: str,
+                         specified_adapter: APIAdapter=None,
+                         voice_name: str=None,
+                         speed: str=None,
+                         language: str=None,
+                         debug: bool=False,
+                         cache: DiskCache=None,
+                         policy: RoutingPolicy=None) -> tuple:
+    """
+    Synthesize text and run the audio through a PostProcessor, all in memory.
+
+    Args:
+    Required:
+        postprocess: The PostProcessor to run the audio through.
+        text: The text to get TTS from.
+    Optional:
+        The rest of the arguments are the same as for the tts function.
+
+    Returns a tuple of (adapter class that generated the audio, processed audio bytes).
+    The chunks of long text are handed to the PostProcessor separately, so silence can
+    be trimmed at every chunk boundary. The cache always holds the unprocessed audio.
+    Raises a ValueError if the adapter doesn't make mp3 audio.
+    """
+    if policy is not None:
+        postprocess.check_adapter(select_adapter(specified_adapter, voice_name, language))
+        if policy.any_format:
+            # Only mp3 audio can be processed, so don't fail over to other formats
+            policy = copy.copy(policy)
+            policy.any_format = False
+        adapter, audio = synthesize_with_policy(policy, text, specified_adapter, voice_name, speed, language, debug, cache)
+        return adapter, postprocess.process(audio)
+
+    adapter = select_adapter(specified_adapter, voice_name, language)
+    postprocess.check_adapter(adapter)
+    if needs_chunking(adapter, text):
+        parts = list(render_chunks(adapter, text, voice_name, speed, language, debug, cache))
+        return adapter, postprocess.process(parts)
+    return adapter, postprocess.process(synthesize_bytes(adapter, text, voice_name, speed, language, debug, cache))
@@ -0,0 +1,364 @@
+import collections
+import contextlib
+import math
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket.
+
+    Tokens are added at rate per second, up to burst tokens. Each acquire takes one
+    token, waiting for it if the bucket is empty, so callers never go over rate on
+    average, or over burst at once.
+    """
+
+    def __init__(self, rate: float, burst: int=None):
+        """
+        Args:
+        Required:
+            rate: Tokens added per second.
+        Optional:
+            burst: The most tokens the bucket holds. Defaults to rate, rounded up, and at least 1.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, math.ceil(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def acquire(self) -> None:
+        """
+        Take a token, waiting until one is available.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+
+    async def aacquire(self) -> None:
+        """
+        Async version of acquire. Waits with asyncio.sleep, so the event loop is not blocked.
+        """
+        import asyncio
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait_for)
+
+
+    def try_acquire(self) -> bool:
+        """
+        Take a token if one is available, without waiting.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class AdaptiveConcurrency:
+    """
+    A concurrency limit that adapts to the provider with additive increase,
+    multiplicative decrease (AIMD).
+
+    Every success raises the limit by 1 / limit, so it grows by about one per round
+    of requests, up to maximum. Every throttled request halves it, down to minimum.
+    Callers over the limit wait in acquire until a slot frees up.
+    """
+
+    def __init__(self, maximum: int, minimum: int=1):
+        """
+        Args:
+        Required:
+            maximum: The highest the limit can go, and the limit to start at.
+        Optional:
+            minimum: The lowest the limit can go.
+        """
+        if maximum < 1 or minimum < 1 or minimum > maximum:
+            raise ValueError("Concurrency limits must be at least 1, and minimum can't be above maximum")
+        self.maximum = maximum
+        self.minimum = minimum
+        self._limit = float(maximum)
+        self._active = 0
+        self._condition = threading.Condition()
+        # (event loop, future) of every coroutine waiting in aacquire
+        self._async_waiters = collections.deque()
+
+
+    @property
+    def limit(self) -> int:
+        """
+        The number of calls currently allowed at once.
+        """
+        return int(self._limit)
+
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+
+    def acquire(self) -> None:
+        """
+        Wait for a slot under the current limit, and take it.
+        """
+        with self._condition:
+            while self._active >= int(self._limit):
+                self._condition.wait()
+            self._active += 1
+
+
+    async def aacquire(self) -> None:
+        """
+        Async version of acquire. Waits on a future of the running event loop, so no
+        thread is held while waiting. A coroutine cancelled while waiting takes no slot.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._active < int(self._limit):
+                    self._active += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            finally:
+                with self._condition:
+                    try:
+                        self._async_waiters.remove((loop, waiter))
+                    except ValueError:
+                        pass
+
+
+    def release(self, throttled: bool=False, adjust: bool=True) -> None:
+        """
+        Give a slot back, and adjust the limit by how the call went.
+        Pass adjust=False for a call that was cancelled, and says nothing about the provider.
+        """
+        with self._condition:
+            self._active -= 1
+            if adjust:
+                if throttled:
+                    self._limit = max(self.minimum, self._limit / 2)
+                else:
+                    self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+            for loop, waiter in self._async_waiters:
+                try:
+                    loop.call_soon_threadsafe(_wake, waiter)
+                except RuntimeError:
+                    # The waiter's event loop is closed
+                    pass
+
+
+def _wake(waiter) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """
+    Check whether an exception means the provider is throttling us (HTTP 429).
+    Understands requests' HTTPError, and gTTSError, which keeps the response as rsp.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        response = getattr(error, "rsp", None)
+    return getattr(response, "status_code", None) == 429
+
+
+class AdapterLimits:
+    """
+    The rate limit and adaptive concurrency limit shared by every user of one adapter class.
+    Get it with limits_for, rather than creating it directly.
+    """
+
+    def __init__(self, rate: float=None, burst: int=None, max_concurrency: int=None):
+        """
+        Args:
+        Optional:
+            rate: Syntheses per second. Unlimited if not passed.
+            burst: Syntheses allowed at once after an idle period. Defaults to rate.
+            max_concurrency: The most syntheses at the same time. Unlimited if not passed.
+        """
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency) if max_concurrency else None
+
+
+    def acquire(self) -> None:
+        """
+        Wait until a synthesis is allowed to start.
+        """
+        if self.concurrency is not None:
+            self.concurrency.acquire()
+        if self.bucket is not None:
+            try:
+                self.bucket.acquire()
+            except BaseException:
+                self.cancel()
+                raise
+
+
+    async def aacquire(self) -> None:
+        """
+        Async version of acquire, which waits without blocking the event loop or holding a thread.
+        """
+        if self.concurrency is not None:
+            await self.concurrency.aacquire()
+        if self.bucket is not None:
+            try:
+                await self.bucket.aacquire()
+            except BaseException:
+                self.cancel()
+                raise
+
+
+    def release(self, error: BaseException=None) -> None:
+        """
+        Mark a synthesis as finished. error is the exception it raised, if any.
+        """
+        if self.concurrency is not None:
+            self.concurrency.release(throttled=error is not None and is_throttle_error(error))
+
+
+    def cancel(self) -> None:
+        """
+        Give back the slot of a synthesis that was cancelled, without adjusting the limit.
+        """
+        if self.concurrency is not None:
+            self.concurrency.release(adjust=False)
+
+
+    @contextlib.contextmanager
+    def slot(self):
+        """
+        A context manager that holds a synthesis slot for its body.
+        """
+        self.acquire()
+        try:
+            yield
+        except BaseException as e:
+            self.release(e)
+            raise
+        self.release()
+
+
+    @contextlib.asynccontextmanager
+    async def aslot(self):
+        """
+        Async version of slot. Waiting for the slot doesn't block the event loop, or hold
+        a thread of its executor. The slot is given back if the body is cancelled.
+        """
+        import asyncio
+        await self.aacquire()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+        except BaseException as e:
+            self.release(e)
+            raise
+        self.release()
+
+
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+def limits_for(adapter) -> AdapterLimits:
+    """
+    Get the process-wide limits for an adapter class (or the class of an adapter instance).
+
+    Limits are built on first use from the class's RATE_LIMIT, RATE_BURST and
+    MAX_CONCURRENCY, unless they were set with set_rate_limit.
+    Returns None if the adapter has no limits.
+    """
+    if not isinstance(adapter, type):
+        adapter = type(adapter)
+    try:
+        return _limits[adapter]
+    except KeyError:
+        pass
+
+    with _limits_lock:
+        if adapter not in _limits:
+            if adapter.RATE_LIMIT or adapter.MAX_CONCURRENCY:
+                _limits[adapter] = AdapterLimits(adapter.RATE_LIMIT, adapter.RATE_BURST, adapter.MAX_CONCURRENCY)
+            else:
+                _limits[adapter] = None
+        return _limits[adapter]
+
+
+def set_rate_limit(adapter: type, rate: float=None, burst: int=None, max_concurrency: int=None) -> None:
+    """
+    Replace an adapter class's limits for the rest of the process.
+
+    Args:
+    Required:
+        adapter: The adapter class.
+    Optional:
+        rate: Syntheses per second. Unlimited if not passed.
+        burst: Syntheses allowed at once after an idle period. Defaults to rate.
+        max_concurrency: The most syntheses at the same time. Unlimited if not passed.
+
+    Calling it with only an adapter removes that adapter's limits.
+    Syntheses already waiting for a slot keep the limits they started with.
+    """
+    with _limits_lock:
+        _limits[adapter] = AdapterLimits(rate, burst, max_concurrency) if rate or max_concurrency else None
+
+
+def reset_rate_limits() -> None:
+    """
+    Forget runtime overrides, so every adapter goes back to the limits declared on its class.
+    """
+    with _limits_lock:
+        _limits.clear()
+
+
+def limited(adapter):
+    """
+    A context manager that holds a synthesis slot for an adapter, if it has limits.
+    """
+    limits = limits_for(adapter)
+    if limits is None:
+        return contextlib.nullcontext()
+    return limits.slot()
+
+
+@contextlib.asynccontextmanager
+async def alimited(adapter):
+    """
+    Async version of limited.
+    """
+    limits = limits_for(adapter)
+    if limits is None:
+        yield
+        return
+    async with limits.aslot():
+        yield
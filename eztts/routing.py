@@ -0,0 +1,169 @@
+import threading
+
+from .adapters import APIAdapter
+from .adapter_importer import valid_adapters
+from .adapter_manifest import ADAPTER_MANIFEST
+
+
+class RoutingIndex:
+    """
+    Lookup tables from voices and languages to the adapter classes that support them.
+
+    Built from the class-level VOICES and LANGUAGES dictionaries, so no adapter
+    instances are created. Adapters are kept in the order they were given, so the
+    first adapter in a list is the one the tts function picks.
+    """
+
+    def __init__(self, adapters: list):
+        """
+        Args:
+        Required:
+            adapters: The adapter classes to index, in order of preference.
+        """
+        self.adapters = tuple(adapters)
+        self._by_voice = {}
+        self._by_language = {}
+        self._by_voice_and_language = {}
+
+        for adapter in self.adapters:
+            for voice in adapter.VOICES:
+                self._by_voice.setdefault(voice, []).append(adapter)
+            for language in adapter.LANGUAGES:
+                self._by_language.setdefault(language, []).append(adapter)
+            for voice in adapter.VOICES:
+                for language in adapter.LANGUAGES:
+                    self._by_voice_and_language.setdefault((voice, language), adapter)
+
+
+    def adapters_for_voice(self, voice: str) -> list:
+        """
+        Get the adapters that have a voice.
+        """
+        return list(self._by_voice.get(voice, ()))
+
+
+    def adapters_for_language(self, language: str) -> list:
+        """
+        Get the adapters that support a language.
+        """
+        return list(self._by_language.get(language, ()))
+
+
+    def adapter_for(self, voice: str=None, language: str=None) -> type:
+        """
+        Get the first adapter that has the voice and/or supports the language.
+        Returns None if there is no such adapter, or if neither voice nor language is passed.
+        """
+        if voice is not None and language is not None:
+            return self._by_voice_and_language.get((voice, language))
+        if voice is not None:
+            adapters = self._by_voice.get(voice)
+        elif language is not None:
+            adapters = self._by_language.get(language)
+        else:
+            return None
+        return adapters[0] if adapters else None
+
+
+    def voices(self) -> list:
+        """
+        Get every voice supported by at least one adapter.
+        """
+        return list(self._by_voice)
+
+
+    def languages(self) -> list:
+        """
+        Get every language supported by at least one adapter.
+        """
+        return list(self._by_language)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_routing_index() -> RoutingIndex:
+    """
+    Get the routing index for the current valid adapters.
+    The index is built on first use, and rebuilt if valid_adapters has changed since.
+    """
+    global _index
+    index = _index
+    if index is not None and index.adapters == tuple(valid_adapters):
+        return index
+
+    with _index_lock:
+        if _index is None or _index.adapters != tuple(valid_adapters):
+            _index = RoutingIndex(valid_adapters)
+        return _index
+
+
+def adapters_for_voice(voice: str) -> list:
+    """
+    Get the valid adapters that have a voice, in order of preference.
+    """
+    return get_routing_index().adapters_for_voice(voice)
+
+
+def adapters_for_language(language: str) -> list:
+    """
+    Get the valid adapters that support a language, in order of preference.
+    """
+    return get_routing_index().adapters_for_language(language)
+
+
+def adapter_by_name(name: str) -> type:
+    """
+    Get a valid adapter class by its manifest name (such as "ftts") or class name (such as "FTTSAdapter").
+    Raises a ValueError if there is no such adapter, or its dependencies aren't installed.
+    """
+    class_name = ADAPTER_MANIFEST[name]["class_name"] if name in ADAPTER_MANIFEST else name
+    for adapter in valid_adapters:
+        if adapter.__name__ == class_name:
+            return adapter
+    raise ValueError(f"Unknown adapter: {name}. This could mean an optional dependency is not installed.")
+
+
+def _unsupported_adapter_error():
+    """Used to raise error of unsupported adapter."""
+    raise ValueError("Language and voice combination not supported by any adapters. This could mean an optional dependency is not installed.")
+
+
+def select_adapter(specified_adapter: APIAdapter=None,
+                   voice_name: str=None,
+                   language: str=None) -> type:
+    """
+    Pick the adapter class that should handle a voice/language combination.
+
+    Args:
+    Optional:
+        specified_adapter: The adapter to use, if a specific adapter is desired.
+        voice_name: The name of the voice to use.
+        language: The language of the text.
+
+    Returns the adapter class (not an instance). Follows the same rules as the
+    tts function: a specified adapter is validated and used as is, otherwise the
+    first valid adapter that supports the voice and/or language is picked.
+    """
+    if specified_adapter is not None:
+        if not issubclass(specified_adapter, APIAdapter):
+            raise TypeError("Adapter must be an instance of APIAdapter")
+
+        if voice_name is not None:
+            if not specified_adapter.supports(voice_name):
+                raise ValueError("Specified voice name not found in specified adapter")
+        if language is not None:
+            if not specified_adapter.supports(language):
+                raise ValueError("Specified language not found in specified adapter")
+
+        return specified_adapter
+
+    if voice_name is None and language is None:
+        # If no adapter or language is specified, use the first adapter
+        return valid_adapters[0]
+
+    adapter = get_routing_index().adapter_for(voice_name, language)
+    if adapter is None:
+        _unsupported_adapter_error()
+    return adapter
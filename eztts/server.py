@@ -0,0 +1,371 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from .cache import DiskCache, MemoryCache
+from .client import DEFAULT_PORT, Client, default_socket_path
+from .instrumentation import configure_logging
+from .routing import adapter_by_name
+from .synthesizer import Synthesizer
+
+logger = logging.getLogger(__name__)
+
+# The most bytes a request body may have
+MAX_REQUEST_SIZE = 1024 * 1024
+
+# The Content-Type of each audio format
+CONTENT_TYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "aiff": "audio/aiff",
+    "pcm": "audio/L16",
+    "mulaw": "audio/basic",
+}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers synthesis requests for a SynthesisDaemon.
+
+        GET /health  the daemon's status, as JSON
+        POST /tts    a JSON object (Content-Type application/json) of text, voice,
+                     speed, language and adapter;
+                     answered with the audio (mp3, unless the adapter or the daemon's
+                     PostProcessor makes another format), streamed with chunked encoding
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "eztts"
+
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "unix socket"
+
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        status = {"status": "ok"}
+        cache = self.server.synthesis_daemon.synthesizer.cache
+        if cache is not None:
+            status["cache"] = cache.stats()
+        self._send_json(200, status)
+
+
+    def do_POST(self):
+        if self.path != "/tts":
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        # Web pages can send form and text/plain bodies to any address without asking first,
+        # but not JSON, so only JSON is accepted
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            # Read the body, so the client has finished sending before the answer
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(min(length, MAX_REQUEST_SIZE))
+            self.close_connection = True
+            self._send_json(415, {"error": "The request must have Content-Type application/json"})
+            return
+        try:
+            arguments = self._read_arguments()
+            synthesizer = self.server.synthesis_daemon.synthesizer
+            audio_format = synthesizer.audio_format(arguments["voice_name"], arguments["language"], arguments["specified_adapter"])
+            audio = synthesizer.stream(**arguments)
+            # Synthesize the first chunk before answering, so errors such as unknown voices get a proper status
+            first = next(audio, b"")
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            logger.exception("Synthesis failed")
+            self._send_json(500, {"error": str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES.get(audio_format, "application/octet-stream"))
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            self._write_chunk(first)
+            for chunk in audio:
+                self._write_chunk(chunk)
+        except Exception:
+            # The status has been sent, so all that can be done is to end the response without
+            # its final chunk, which the client sees as an incomplete read
+            logger.exception("Synthesis failed partway through")
+            audio.close()
+            self.close_connection = True
+            return
+        self.wfile.write(b"0\r\n\r\n")
+
+
+    def _read_arguments(self) -> dict:
+        """
+        Read a synthesis request's JSON body into Synthesizer.stream arguments.
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_SIZE:
+            raise ValueError(f"The request is larger than {MAX_REQUEST_SIZE} bytes")
+        try:
+            body = json.loads(self.rfile.read(length))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"The request is not valid JSON: {e}") from None
+        if not isinstance(body, dict) or not isinstance(body.get("text"), str):
+            raise ValueError("The request must be a JSON object with text")
+
+        unknown = set(body) - {"text", "voice", "voice_name", "speed", "language", "adapter"}
+        if unknown:
+            raise ValueError(f"Unknown request fields: {', '.join(sorted(unknown))}")
+        adapter = body.get("adapter")
+        return {
+            "text": body["text"],
+            "voice_name": body.get("voice", body.get("voice_name")),
+            "speed": body.get("speed"),
+            "language": body.get("language"),
+            "specified_adapter": adapter_by_name(adapter) if adapter else None,
+        }
+
+
+    def _write_chunk(self, data: bytes) -> None:
+        if data:
+            self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+
+
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _PooledServerMixIn:
+    """
+    Handles each connection on the daemon's worker pool, instead of a new thread.
+    The pool's threads live as long as the daemon, so the Synthesizer's per-thread
+    adapters stay warm between requests.
+    """
+
+    def process_request(self, request, client_address):
+        self.synthesis_daemon.pool.submit(self._process_pooled, request, client_address)
+
+
+    def _process_pooled(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class _TCPServer(_PooledServerMixIn, HTTPServer):
+    pass
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _UnixServer(_PooledServerMixIn, socketserver.UnixStreamServer):
+        pass
+
+
+class SynthesisDaemon:
+    """
+    A long-running synthesis service, with an HTTP front end on a Unix domain socket,
+    and optionally one on a TCP port.
+
+    Requests are run on a fixed pool of worker threads by one shared Synthesizer, so
+    adapters, their HTTP sessions and the cache stay warm between requests. Talk to it
+    with eztts.client.Client, or any HTTP client. Start it from the command line with
+    "python -m eztts serve".
+    """
+
+    def __init__(self,
+                 host: str="127.0.0.1",
+                 port: int=None,
+                 socket_path: str=None,
+                 workers: int=8,
+                 cache: DiskCache=None,
+                 synthesizer: Synthesizer=None,
+                 debug: bool=False):
+        """
+        Args:
+        Optional:
+            host: The address to serve HTTP on, if port is passed.
+            port: The TCP port to serve HTTP on, such as DEFAULT_PORT. Not served over TCP if not passed.
+                  Any user on the machine can connect to it, as requests are not authenticated,
+                  so only use it where the Unix socket can't be.
+            socket_path: The Unix socket to serve on, which only this user can connect to.
+                         Uses default_socket_path() if not passed. Pass "" to only serve over TCP.
+            workers: How many requests to handle at the same time.
+            cache: The cache for the synthesizer. A MemoryCache is used if not passed.
+            synthesizer: The Synthesizer to run requests with. Built from cache and debug if not passed.
+            debug: Whether or not to log debug messages.
+        """
+        if socket_path is None:
+            socket_path = default_socket_path() if hasattr(socket, "AF_UNIX") else ""
+        if port is None and socket_path == "":
+            # Such as on Windows, which has no Unix sockets
+            raise ValueError("The daemon needs a TCP port or a Unix socket to serve on. Pass a port to serve over TCP")
+
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.synthesizer = synthesizer if synthesizer is not None else Synthesizer(
+            cache=cache if cache is not None else MemoryCache(), debug=debug)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eztts-serve")
+
+        self._servers = []
+        self._threads = []
+        self._stopped = threading.Event()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+    @property
+    def url(self) -> str:
+        """
+        The URL of the HTTP front end, or None if there isn't one.
+        """
+        for server in self._servers:
+            if isinstance(server, _TCPServer):
+                host, port = server.server_address[:2]
+                return f"http://{host}:{port}"
+        return None
+
+
+    def start(self) -> "SynthesisDaemon":
+        """
+        Start serving in background threads.
+        Raises a RuntimeError if another daemon is already serving on the Unix socket.
+        """
+        if self.socket_path:
+            self._claim_socket()
+            # Only this user can connect. The socket is created with these permissions,
+            # rather than changed afterwards, so there is no moment anyone else could connect.
+            umask = os.umask(0o177)
+            try:
+                server = _UnixServer(self.socket_path, _RequestHandler)
+            finally:
+                os.umask(umask)
+            self._add_server(server)
+        if self.port is not None:
+            self._add_server(_TCPServer((self.host, self.port), _RequestHandler))
+
+        for server in self._servers:
+            thread = threading.Thread(target=server.serve_forever, name="eztts-serve-accept", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Serving on %s", ", ".join(filter(None, [self.url, self.socket_path])))
+        return self
+
+
+    def serve_forever(self) -> None:
+        """
+        Start serving, and block until shutdown is called, or the process is interrupted.
+        """
+        self.start()
+        try:
+            self._stopped.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+
+    def shutdown(self) -> None:
+        """
+        Stop accepting requests, finish the ones in progress, and close the synthesizer.
+        """
+        if self._stopped.is_set() and not self._servers:
+            return
+        self._stopped.set()
+        servers, self._servers = self._servers, []
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        self.pool.shutdown(wait=True)
+        self.synthesizer.close()
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+    def _add_server(self, server) -> None:
+        server.synthesis_daemon = self
+        self._servers.append(server)
+
+
+    def _claim_socket(self) -> None:
+        """
+        Remove a Unix socket left behind by a daemon that is no longer running.
+        """
+        if not os.path.exists(self.socket_path):
+            return
+        if Client(socket_path=self.socket_path, timeout=1.0).is_running():
+            raise RuntimeError(f"An eztts daemon is already serving on {self.socket_path}")
+        os.remove(self.socket_path)
+
+
+def main(argv: list=None) -> int:
+    """
+    Entry point for "python -m eztts serve".
+    """
+    parser = argparse.ArgumentParser(prog="python -m eztts serve",
+                                     description="Run a long-lived eztts daemon that keeps adapters and caches warm.")
+    parser.add_argument("--host", help="The address to serve HTTP on, with --port.", default="127.0.0.1")
+    parser.add_argument("--port", help=f"Also serve HTTP on this TCP port, such as {DEFAULT_PORT}. "
+                                       "Any local user can connect to it.", type=int)
+    parser.add_argument("--socket", help="The Unix socket to serve on. Defaults to $EZTTS_SOCKET, or eztts-<uid>.sock in the runtime directory.")
+    parser.add_argument("--no-socket", help="If passed, only serve HTTP.", action="store_true")
+    parser.add_argument("-w", "--workers", help="How many requests to handle at the same time.", type=int, default=8)
+    parser.add_argument("--cache-dir", help="A directory for a disk cache behind the in-memory cache.")
+    parser.add_argument("--cache-size", help="The in-memory cache size, in megabytes.", type=int, default=64)
+    parser.add_argument("-q", "--quiet", help="If passed, only log warnings and errors.", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.port is None and (args.no_socket or not hasattr(socket, "AF_UNIX")):
+        parser.error("there is nothing to serve on: pass --port" +
+                     (", as Unix sockets aren't available here" if not args.no_socket else ", or drop --no-socket"))
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.cache_size < 0:
+        parser.error("--cache-size can't be negative")
+
+    configure_logging(logging.WARNING if args.quiet else logging.INFO)
+
+    try:
+        backing = DiskCache(args.cache_dir) if args.cache_dir else None
+        daemon = SynthesisDaemon(
+            host=args.host,
+            port=args.port,
+            socket_path="" if args.no_socket else args.socket,
+            workers=args.workers,
+            cache=MemoryCache(max_bytes=args.cache_size * 1024 * 1024, backing=backing),
+        )
+        daemon.serve_forever()
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Could not start the eztts daemon: {e}")
+        return 1
+    return 0
@@ -0,0 +1,181 @@
+import io
+
+from .adapters import APIAdapter
+from .cache import DiskCache
+from .instrumentation import instrumentation
+from .output import output_path
+from .ratelimit import alimited, limited
+
+
+def usable_cache(adapter: APIAdapter, cache: DiskCache) -> DiskCache:
+    """
+    Get the cache to use with an adapter. Caches only hold mp3 audio, so adapters
+    that make another format get None.
+    """
+    return cache if adapter.AUDIO_FORMAT == "mp3" else None
+
+
+def synthesize(adapter: APIAdapter,
+               text: str,
+               filename: str,
+               voice_name: str=None,
+               speed: str=None,
+               language: str=None,
+               debug: bool=False,
+               cache: DiskCache=None) -> None:
+    """
+    Run a single synthesis with an adapter class: initialize, configure,
+    generate, save and finish. Generating and saving wait for the adapter's
+    rate and concurrency limits, if it has any.
+
+    Args:
+    Required:
+        adapter: The adapter class (not an instance) to synthesize with.
+        text: The text to get TTS from.
+        filename: The output mp3 file.
+    Optional:
+        voice_name: The name of the voice to use.
+        speed: The speed to read the text.
+        language: The language of the text.
+        debug: Whether or not to log debug messages.
+        cache: A DiskCache or MemoryCache to look the audio up in before generating it,
+               and to store it in after.
+    """
+    tts_adapter = adapter(debug)
+    try:
+        tts_adapter.configure_voice(voice=voice_name, language=language, speed=speed)
+        cache = usable_cache(tts_adapter, cache)
+        if cache is None:
+            with limited(tts_adapter):
+                with instrumentation.phase("generate_tts", tts_adapter):
+                    tts_adapter.generate_tts(text)
+                with instrumentation.phase("save_tts", tts_adapter), output_path(filename) as temp_path:
+                    tts_adapter.save_tts(temp_path)
+            return
+
+        key = cache.make_key(tts_adapter, text)
+        if cache.fetch(key, filename):
+            return
+        try:
+            with limited(tts_adapter):
+                with instrumentation.phase("generate_tts", tts_adapter):
+                    tts_adapter.generate_tts(text)
+                with instrumentation.phase("save_tts", tts_adapter), output_path(filename) as temp_path:
+                    tts_adapter.save_tts(temp_path)
+            cache.store(key, filename)
+        except BaseException:
+            # Let anyone waiting on this key know it isn't coming
+            cache.abandon(key)
+            raise
+    finally:
+        tts_adapter.finish()
+
+
+def synthesize_to(adapter: APIAdapter,
+                  text: str,
+                  fileobj,
+                  voice_name: str=None,
+                  speed: str=None,
+                  language: str=None,
+                  debug: bool=False,
+                  cache: DiskCache=None) -> None:
+    """
+    Same as synthesize, but writes the audio into a writable binary file-like
+    object instead of a file with a filename.
+    """
+    tts_adapter = adapter(debug)
+    try:
+        tts_adapter.configure_voice(voice=voice_name, language=language, speed=speed)
+        render_to(tts_adapter, text, fileobj, cache)
+    finally:
+        tts_adapter.finish()
+
+
+def render_to(tts_adapter: APIAdapter, text: str, fileobj, cache: DiskCache=None) -> None:
+    """
+    Generate TTS with an already configured adapter instance and write it into fileobj.
+    The adapter is not finished, so it can be configured and used again.
+    """
+    cache = usable_cache(tts_adapter, cache)
+    if cache is None:
+        with limited(tts_adapter):
+            with instrumentation.phase("generate_tts", tts_adapter):
+                tts_adapter.generate_tts(text)
+            with instrumentation.phase("save_tts", tts_adapter):
+                tts_adapter.save_tts_to(fileobj)
+        return
+
+    key = cache.make_key(tts_adapter, text)
+    if cache.fetch_to(key, fileobj):
+        return
+    try:
+        with limited(tts_adapter):
+            with instrumentation.phase("generate_tts", tts_adapter):
+                tts_adapter.generate_tts(text)
+            # The audio has to be kept to store it in the cache, so buffer it once
+            with instrumentation.phase("save_tts", tts_adapter):
+                audio = tts_adapter.get_tts_bytes()
+        fileobj.write(audio)
+        cache.store_bytes(key, audio)
+    except BaseException:
+        cache.abandon(key)
+        raise
+
+
+def synthesize_bytes(adapter: APIAdapter,
+                     text: str,
+                     voice_name: str=None,
+                     speed: str=None,
+                     language: str=None,
+                     debug: bool=False,
+                     cache: DiskCache=None) -> bytes:
+    """
+    Same as synthesize, but returns the audio as bytes instead of saving it.
+    """
+    buffer = io.BytesIO()
+    synthesize_to(adapter, text, buffer, voice_name, speed, language, debug, cache)
+    return buffer.getvalue()
+
+
+async def asynthesize(adapter: APIAdapter,
+                      text: str,
+                      filename: str,
+                      voice_name: str=None,
+                      speed: str=None,
+                      language: str=None,
+                      debug: bool=False,
+                      cache: DiskCache=None) -> None:
+    """
+    Async version of synthesize.
+    Uses the adapter's agenerate_tts and asave_tts, so the event loop is not blocked
+    while the adapter waits on the TTS service.
+    """
+    tts_adapter = adapter(debug)
+    try:
+        tts_adapter.configure_voice(voice=voice_name, language=language, speed=speed)
+        cache = usable_cache(tts_adapter, cache)
+        if cache is None:
+            async with alimited(tts_adapter):
+                with instrumentation.phase("generate_tts", tts_adapter):
+                    await tts_adapter.agenerate_tts(text)
+                with instrumentation.phase("save_tts", tts_adapter), output_path(filename) as temp_path:
+                    await tts_adapter.asave_tts(temp_path)
+            return
+
+        # Looking the key up can wait on disk, or on another caller generating the same audio
+        import asyncio
+        key = cache.make_key(tts_adapter, text)
+        if await asyncio.get_running_loop().run_in_executor(None, cache.fetch, key, filename):
+            return
+        try:
+            async with alimited(tts_adapter):
+                with instrumentation.phase("generate_tts", tts_adapter):
+                    await tts_adapter.agenerate_tts(text)
+                with instrumentation.phase("save_tts", tts_adapter), output_path(filename) as temp_path:
+                    await tts_adapter.asave_tts(temp_path)
+            cache.store(key, filename)
+        except BaseException:
+            cache.abandon(key)
+            raise
+    finally:
+        tts_adapter.finish()
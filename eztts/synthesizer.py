@@ -0,0 +1,266 @@
+import contextlib
+import io
+import threading
+import time
+from dataclasses import dataclass
+
+from .adapters import APIAdapter, VoiceProfile
+from .audio import PostProcessor
+from .cache import DiskCache
+from .chunking import needs_chunking, render_chunks
+from .output import open_output
+from .routing import select_adapter
+from .synthesis import render_to
+
+
+@dataclass(frozen=True)
+class SynthesisResult:
+    """
+    The outcome of Synthesizer.synthesize.
+
+    audio is the generated audio: mp3, unless the synthesizer's PostProcessor converts it. voice, language and speed are the common names
+    the adapter actually used, after defaults and fallbacks were applied. filename is
+    set if the audio was also saved to a file. elapsed is in seconds.
+    """
+    text: str
+    audio: bytes
+    adapter: type
+    voice: str
+    language: str
+    speed: str
+    filename: str = None
+    elapsed: float = 0.0
+
+
+class Synthesizer:
+    """
+    A reusable, thread-safe object for generating TTS many times.
+
+    Adapter instances are kept in a pool per adapter class, and reused for later calls,
+    so resources they hold (such as HTTP sessions) stay warm. A call takes an idle
+    instance, or creates one if every instance is in use, so there are never more
+    instances of a class than the most calls that used it at once, and two calls never
+    share an instance at the same time. Adapters are
+    finished when the synthesizer is closed, which happens automatically when it is
+    used as a context manager. Instances that calls are still using are finished when
+    those calls return:
+
+        with Synthesizer(voice_name="Harry") as synthesizer:
+            result = synthesizer.synthesize("Hello, world!")
+    """
+
+    def __init__(self,
+                 specified_adapter: APIAdapter=None,
+                 voice_name: str=None,
+                 speed: str=None,
+                 language: str=None,
+                 debug: bool=False,
+                 cache: DiskCache=None,
+                 max_workers: int=4,
+                 postprocess: PostProcessor=None):
+        """
+        Args:
+        Optional:
+            specified_adapter: The adapter to use by default, if a specific adapter is desired.
+            voice_name: The voice to use by default.
+            speed: The speed to use by default.
+            language: The language to use by default.
+            debug: Whether or not to log debug messages.
+            cache: A DiskCache or MemoryCache to reuse previously generated audio from.
+            max_workers: How many chunks of long text to synthesize at the same time.
+            postprocess: A PostProcessor that the audio of every call is run through.
+
+        The defaults can be overridden for each call to synthesize.
+        """
+        self.specified_adapter = specified_adapter
+        self.voice_name = voice_name
+        self.speed = speed
+        self.language = language
+        self.debug = debug
+        self.cache = cache
+        self.max_workers = max_workers
+        self.postprocess = postprocess
+
+        # Idle adapter instances, by adapter class
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def synthesize(self,
+                   text: str,
+                   voice_name: str=None,
+                   speed: str=None,
+                   language: str=None,
+                   specified_adapter: APIAdapter=None,
+                   filename: str=None) -> SynthesisResult:
+        """
+        Generate TTS for text.
+
+        Args:
+        Required:
+            text: The text to get TTS from.
+        Optional:
+            voice_name: The voice to use, instead of the synthesizer's default.
+            speed: The speed to use, instead of the synthesizer's default.
+            language: The language to use, instead of the synthesizer's default.
+            specified_adapter: The adapter to use, instead of the synthesizer's default.
+            filename: If passed, the audio is also saved to this file.
+
+        Adapter selection follows the same rules as the tts function.
+        Returns a SynthesisResult holding the audio.
+        """
+        if self._closed:
+            raise RuntimeError("Synthesizer is closed")
+
+        start = time.perf_counter()
+
+        voice_name = voice_name if voice_name is not None else self.voice_name
+        speed = speed if speed is not None else self.speed
+        language = language if language is not None else self.language
+        specified_adapter = specified_adapter if specified_adapter is not None else self.specified_adapter
+
+        adapter = select_adapter(specified_adapter, voice_name, language)
+        if self.postprocess is not None:
+            self.postprocess.check_adapter(adapter)
+
+        if needs_chunking(adapter, text):
+            render = lambda chunk: self._render(adapter, chunk, voice_name, speed, language)[0]
+            parts = list(render_chunks(adapter, text, max_workers=self.max_workers, render=render))
+            audio = self.postprocess.process(parts) if self.postprocess is not None else b"".join(parts)
+            configuration = self._describe(adapter.get_profile(voice_name, language, speed))
+        else:
+            audio, configuration = self._render(adapter, text, voice_name, speed, language)
+            if self.postprocess is not None:
+                audio = self.postprocess.process(audio)
+        voice, resolved_language, resolved_speed = configuration
+
+        if filename is not None:
+            with open_output(filename) as f:
+                f.write(audio)
+
+        return SynthesisResult(text, audio, adapter, voice, resolved_language, resolved_speed,
+                               filename, time.perf_counter() - start)
+
+
+    def audio_format(self,
+                     voice_name: str=None,
+                     language: str=None,
+                     specified_adapter: APIAdapter=None) -> str:
+        """
+        Get the format of the audio a call with these arguments makes, such as "mp3" or "wav":
+        the PostProcessor's output format if there is one, or else the selected adapter's.
+        """
+        if self.postprocess is not None:
+            return self.postprocess.output_format
+        voice_name = voice_name if voice_name is not None else self.voice_name
+        language = language if language is not None else self.language
+        specified_adapter = specified_adapter if specified_adapter is not None else self.specified_adapter
+        return select_adapter(specified_adapter, voice_name, language).AUDIO_FORMAT
+
+
+    def stream(self,
+               text: str,
+               voice_name: str=None,
+               speed: str=None,
+               language: str=None,
+               specified_adapter: APIAdapter=None):
+        """
+        Generate TTS for text one chunk at a time.
+
+        Takes the same arguments as synthesize, except filename. This is a generator that
+        yields the audio of each chunk of the text, in order, as soon as it is ready,
+        like the tts_stream function. Text short enough for one request is a single chunk.
+        With a PostProcessor, the whole audio is processed and yielded at once.
+        """
+        if self._closed:
+            raise RuntimeError("Synthesizer is closed")
+        if self.postprocess is not None:
+            yield self.synthesize(text, voice_name, speed, language, specified_adapter).audio
+            return
+
+        voice_name = voice_name if voice_name is not None else self.voice_name
+        speed = speed if speed is not None else self.speed
+        language = language if language is not None else self.language
+        specified_adapter = specified_adapter if specified_adapter is not None else self.specified_adapter
+
+        adapter = select_adapter(specified_adapter, voice_name, language)
+
+        if needs_chunking(adapter, text):
+            render = lambda chunk: self._render(adapter, chunk, voice_name, speed, language)[0]
+            yield from render_chunks(adapter, text, max_workers=self.max_workers, render=render)
+        else:
+            yield self._render(adapter, text, voice_name, speed, language)[0]
+
+
+    def close(self) -> None:
+        """
+        Finish every adapter this synthesizer created. Adapters that calls are still using
+        are finished when those calls return, not underneath them.
+        The synthesizer can't be used after it is closed.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, {}
+        for instances in idle.values():
+            for tts_adapter in instances:
+                tts_adapter.finish()
+
+
+    @contextlib.contextmanager
+    def _checkout(self, adapter: type):
+        """
+        Take an idle instance of an adapter class from the pool for the body, creating one if there is none.
+        Raises a RuntimeError if the synthesizer is closed. If it is closed while the body
+        runs, the instance is finished afterwards instead of going back in the pool.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Synthesizer is closed")
+            idle = self._idle.get(adapter)
+            tts_adapter = idle.pop() if idle else None
+        if tts_adapter is None:
+            tts_adapter = adapter(self.debug)
+        try:
+            yield tts_adapter
+        finally:
+            with self._lock:
+                closed = self._closed
+                if not closed:
+                    self._idle.setdefault(adapter, []).append(tts_adapter)
+            if closed:
+                tts_adapter.finish()
+
+
+    def _render(self, adapter: type, text: str, voice_name: str, speed: str, language: str) -> tuple:
+        """
+        Generate text with a pooled instance of an adapter class.
+        Returns the audio, and the voice, language and speed that were used.
+        """
+        with self._checkout(adapter) as tts_adapter:
+            # Every call is configured from scratch, so nothing carries over from the last call on this adapter
+            if voice_name is None and language is None:
+                voice_name = adapter.get_default_voice()
+            if speed is None:
+                speed = adapter.get_default_speed()
+            tts_adapter.configure_voice(voice=voice_name, language=language, speed=speed)
+
+            buffer = io.BytesIO()
+            render_to(tts_adapter, text, buffer, self.cache)
+            return buffer.getvalue(), self._describe(tts_adapter._profile)
+
+
+    @staticmethod
+    def _describe(profile: VoiceProfile) -> tuple:
+        """
+        Get the voice, language and speed of a voice profile.
+        """
+        return profile.voice, profile.language, profile.speed
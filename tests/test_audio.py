@@ -0,0 +1,105 @@
+from eztts.audio import _crc16, _read_bits, _write_bits, adjust_gain, concat_mp3, iter_frames, loudness
+
+
+# MPEG 1 Layer III, 128 kbps, 44.1 kHz, mono: 417 byte frames with 17 bytes of side info
+FRAME_LENGTH = 417
+SIDE_INFO_LENGTH = 17
+
+
+def make_frame(gains=(100, 120), protected=False) -> bytes:
+    """
+    Make a Layer III frame with two granules of the given global gains.
+    Protected frames get a valid CRC.
+    """
+    header = bytes([0xFF, 0xFA if protected else 0xFB, 0x90, 0xC0])
+    frame = bytearray(header + bytes(2 if protected else 0) + bytes(FRAME_LENGTH - 4 - (2 if protected else 0)))
+    side_info = (6 if protected else 4) * 8
+    # main_data_begin (9 bits), private bits (5) and scfsi (4), then one granule after another
+    position = side_info + 9 + 5 + 4
+    for gain in gains:
+        _write_bits(frame, position, 12, 200)  # part2_3_length, so the granule carries audio
+        _write_bits(frame, position + 12 + 9, 8, gain)
+        position += 59
+    if protected:
+        frame[4:6] = _crc16(bytes(frame[2:4]) + bytes(frame[6:6 + SIDE_INFO_LENGTH])).to_bytes(2, "big")
+    return bytes(frame)
+
+
+def make_info_frame(tag: bytes) -> bytes:
+    """
+    Make an encoder information frame: Xing or Info after the side info, or VBRI at byte 36.
+    """
+    frame = bytearray(bytes([0xFF, 0xFB, 0x90, 0xC0]) + bytes(FRAME_LENGTH - 4))
+    offset = 36 if tag == b"VBRI" else 4 + SIDE_INFO_LENGTH
+    frame[offset:offset + 4] = tag
+    return bytes(frame)
+
+
+def gains_of(data) -> list:
+    gains = []
+    for frame in iter_frames(data):
+        side_info = (frame.offset + (6 if frame.protected else 4)) * 8
+        gains.append([_read_bits(data, side_info + 18 + 21 + 59 * granule, 8) for granule in range(2)])
+    return gains
+
+
+def crc_is_valid(data, frame) -> bool:
+    side_info = frame.offset + 6
+    expected = _crc16(bytes(data[frame.offset + 2:frame.offset + 4]) + bytes(data[side_info:side_info + SIDE_INFO_LENGTH]))
+    return data[frame.offset + 4:frame.offset + 6] == expected.to_bytes(2, "big")
+
+
+def test_adjust_gain_shifts_every_granule():
+    data = make_frame((100, 120)) + make_frame((90, 80))
+    assert gains_of(adjust_gain(data, 4)) == [[104, 124], [94, 84]]
+    assert gains_of(adjust_gain(data, -4)) == [[96, 116], [86, 76]]
+
+
+def test_adjust_gain_round_trip():
+    data = make_frame((100, 120), protected=True) + make_frame((90, 80))
+    assert adjust_gain(adjust_gain(data, 7), -7) == data
+    assert adjust_gain(data, 0) == data
+
+
+def test_adjust_gain_recalculates_crc():
+    data = make_frame((100, 120), protected=True) * 3
+    louder = adjust_gain(data, 5)
+    frames = list(iter_frames(louder))
+    assert len(frames) == 3
+    assert all(frame.protected and crc_is_valid(louder, frame) for frame in frames)
+    assert louder[4:6] != data[4:6]
+
+
+def test_adjust_gain_clamps():
+    data = make_frame((250, 3))
+    assert gains_of(adjust_gain(data, 10)) == [[255, 13]]
+    assert gains_of(adjust_gain(data, -10)) == [[240, 0]]
+
+
+def test_adjust_gain_leaves_info_frames_alone():
+    info = make_info_frame(b"Xing")
+    data = adjust_gain(info + make_frame((100, 120)), 3)
+    assert data[:FRAME_LENGTH] == info
+    assert gains_of(data[FRAME_LENGTH:]) == [[103, 123]]
+
+
+def test_loudness_is_the_mean_gain():
+    data = make_info_frame(b"Info") + make_frame((100, 120)) + make_frame((90, 90))
+    assert loudness(data) == 100.0
+    assert loudness(adjust_gain(data, 2)) == 102.0
+    assert loudness(b"") == 0.0
+
+
+def test_concat_strips_info_frames():
+    first = make_frame((100, 100))
+    second = make_frame((110, 110))
+    for tag in (b"Xing", b"Info", b"VBRI"):
+        info = make_info_frame(tag)
+        assert concat_mp3([info + first, info + second]) == first + second
+
+
+def test_concat_keeps_audio_frames_that_only_look_like_info():
+    # "Xing" somewhere other than right after the side info is just audio data
+    frame = bytearray(make_frame((100, 100)))
+    frame[100:104] = b"Xing"
+    assert concat_mp3([bytes(frame)]) == bytes(frame)
@@ -0,0 +1,100 @@
+import os
+import time
+
+from eztts.distributed import JobQueue
+
+
+def make_queue(tmp_path, count=1, **kwargs) -> JobQueue:
+    queue = JobQueue(str(tmp_path / "queue.db"), **kwargs)
+    queue.add({"text": f"Job {i}", "filename": str(tmp_path / f"{i}.mp3")} for i in range(count))
+    return queue
+
+
+def write_part(tmp_path, name: str, content: bytes) -> str:
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_lease_expires_and_goes_to_another_worker(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.2)
+    job_id, job = queue.lease("a")
+    assert queue.lease("b") is None
+
+    time.sleep(0.3)
+    assert queue.lease("b")[0] == job_id
+
+    # The first worker lost the lease, so its output is discarded
+    late = write_part(tmp_path, "a.part", b"late")
+    assert not queue.commit(job_id, "a", late, job.filename)
+    assert not os.path.exists(late)
+    assert not os.path.exists(job.filename)
+
+    part = write_part(tmp_path, "b.part", b"audio")
+    assert queue.commit(job_id, "b", part, job.filename)
+    with open(job.filename, "rb") as f:
+        assert f.read() == b"audio"
+    assert queue.stats() == {"pending": 0, "leased": 0, "done": 1, "failed": 0}
+
+
+def test_heartbeat_keeps_the_lease(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.3)
+    job_id, _ = queue.lease("a")
+    for _ in range(3):
+        time.sleep(0.15)
+        assert queue.heartbeat("a") == 1
+    assert queue.lease("b") is None
+
+
+def test_commit_can_be_retried(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id, job = queue.lease("a")
+    part = write_part(tmp_path, "a.part", b"audio")
+
+    # As if the output was moved into place, but the database failed before the job was marked done
+    os.replace(part, job.filename)
+    assert queue.commit(job_id, "a", part, job.filename)
+    with open(job.filename, "rb") as f:
+        assert f.read() == b"audio"
+    assert queue.stats()["done"] == 1
+
+
+def test_commit_replaces_existing_output(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id, job = queue.lease("a")
+    with open(job.filename, "wb") as f:
+        f.write(b"old")
+    assert queue.commit(job_id, "a", write_part(tmp_path, "a.part", b"new"), job.filename)
+    with open(job.filename, "rb") as f:
+        assert f.read() == b"new"
+
+
+def test_failed_jobs_are_retried_until_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    job_id, job = queue.lease("a")
+    queue.fail(job_id, "a", OSError("first"))
+    assert queue.stats()["pending"] == 1
+
+    assert queue.lease("b")[0] == job_id
+    queue.fail(job_id, "b", OSError("second"))
+    assert queue.lease("c") is None
+    assert queue.failures() == [(job.filename, "OSError: second")]
+    assert queue.unfinished() == 0
+
+
+def test_expired_leases_count_as_attempts(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.1, max_attempts=2)
+    job_id, job = queue.lease("a")
+    time.sleep(0.15)
+    assert queue.lease("b")[0] == job_id
+    time.sleep(0.15)
+    assert queue.lease("c") is None
+    assert queue.failures() == [(job.filename, "The lease expired on every attempt")]
+
+
+def test_release_does_not_count_the_attempt(tmp_path):
+    queue = make_queue(tmp_path, count=2, max_attempts=1)
+    first, _ = queue.lease("a")
+    assert queue.release("a") == 1
+    assert queue.lease("b")[0] == first
+    assert queue.stats()["leased"] == 1
@@ -0,0 +1,53 @@
+import pytest
+
+from eztts.normalization import normalize_text, strip_markup
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("80", "quatre-vingts"),
+    ("80 000", "quatre-vingt mille"),
+    ("81 000", "quatre-vingt-un mille"),
+    ("200", "deux cents"),
+    ("200 000", "deux cent mille"),
+    ("1 000", "mille"),
+    ("71", "soixante et onze"),
+    ("2 000 000", "deux millions"),
+    ("3,5", "trois virgule cinq"),
+])
+def test_french_numbers(text, expected):
+    assert normalize_text(text, "French") == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("100", "cien"),
+    ("21.000", "veintiún mil"),
+    ("1.000.000", "un millón"),
+])
+def test_spanish_numbers(text, expected):
+    assert normalize_text(text, "Spanish") == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1001", "eintausendeins"),
+    ("1.001", "eintausendeins"),
+    ("1.000.000", "eine Million"),
+])
+def test_german_numbers(text, expected):
+    assert normalize_text(text, "German") == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1,234,567", "one million two hundred thirty-four thousand five hundred sixty-seven"),
+    ("3.5", "three point five"),
+    ("version 5th v1.2", "version 5th v1.2"),
+    ("10000000000000", "10000000000000"),
+])
+def test_english_numbers(text, expected):
+    assert normalize_text(text) == expected
+
+
+def test_strip_markup_only_strips_tags():
+    assert strip_markup("<speak><b>Hi</b> there</speak>").split() == ["Hi", "there"]
+    assert strip_markup("<!-- note --><?xml version=\"1.0\"?>Hi").strip() == "Hi"
+    assert strip_markup("if x < 5 and y > 3") == "if x < 5 and y > 3"
+    assert normalize_text("if x < 5 and y > 3") == "if x < five and y > three"